@@ -1,41 +1,196 @@
-from typing import List, Dict, Any
+import asyncio
+import time
+from typing import List, Dict, Any, Optional, Set
 from langchain.agents import AgentExecutor, initialize_agent, AgentType
-from langchain.memory import ConversationBufferMemory
-from langchain.callbacks.streaming_stdout import StreamingStdOutCallbackHandler
+from langchain_core.agents import AgentAction, AgentFinish
+from langchain_core.callbacks import BaseCallbackHandler
 from tools.base_tools import get_tools
+from agents.parallel import ParallelToolAgent
+from inference.scheduler import QueueFullError, QueueTimeoutError
+from memory.session_memory import SessionMemory
+from memory.session_store import SessionStore
+from utils.logger import setup_logger
+from utils.metrics import metrics
+
+logger = setup_logger("agent")
+
+AGENT_RUNS = metrics.counter("llmagent_agent_runs_total", "Agent runs by the mode that produced the answer.", ["mode"])
+AGENT_STEP_SECONDS = metrics.histogram("llmagent_agent_step_seconds", "Agent step latency (plan, tool, answer, react) and whole runs (total).", ["mode", "step"])
+
+class AgentRun:
+    """An agent answer plus where its time went."""
+
+    def __init__(self, response: str, mode: str, steps: List[Dict[str, Any]], started: float):
+        self.response = response
+        self.mode = mode
+        self.steps = steps
+        self.total_ms = (time.perf_counter() - started) * 1000
+
+    def trace(self) -> Dict[str, Any]:
+        return {"mode": self.mode, "steps": self.steps, "total_ms": round(self.total_ms, 1)}
+
+class AgentLogHandler(BaseCallbackHandler):
+    """Logs the ReAct agent's steps at DEBUG instead of printing the whole chain to stdout.
+
+    Debug records are sampled by the log pipeline, so enabling them under load stays cheap.
+    """
+
+    # Only enqueues a log record, so there is no need to hop to a thread
+    run_inline = True
+
+    def on_agent_action(self, action: AgentAction, **kwargs: Any) -> None:
+        logger.debug("Agent action: %s(%.200r)", action.tool, action.tool_input)
+
+    def on_tool_end(self, output: Any, **kwargs: Any) -> None:
+        logger.debug("Agent observation: %.200r", output)
+
+    def on_agent_finish(self, finish: AgentFinish, **kwargs: Any) -> None:
+        logger.debug("Agent finished: %.200r", finish.return_values.get("output"))
 
 class AgentManager:
-    def __init__(self, llm):
+    # Where the conversational agent's prompt stops repeating: after the static
+    # instructions and tool list, and after the session's history. The prefix
+    # cache snapshots the KV state at these points.
+    PREFIX_MARKERS = ("Previous conversation history:", "\nNew input:")
+
+    def __init__(self, llm, sessions: SessionStore, mode: str = "parallel"):
         self.llm = llm
         self.tools = get_tools()
-        self.memory = ConversationBufferMemory(memory_key="chat_history")
+        self.sessions = sessions
+        # "parallel" plans tool calls in one pass and runs them concurrently; "react" is the step-by-step agent
+        self.mode = mode
+        self.parallel_agent = ParallelToolAgent(llm, self.tools)
+        self.log_handler = AgentLogHandler()
+        # Background summaries in flight; the loop only keeps weak references to tasks
+        self._summaries: Set[asyncio.Task] = set()
         
+        # Built once without memory; each call gets an executor bound to its session's memory
         self.agent_executor = initialize_agent(
             tools=self.tools,
             llm=self.llm,
             agent=AgentType.CONVERSATIONAL_REACT_DESCRIPTION,
-            memory=self.memory,
-            verbose=True,
+            verbose=False,
             handle_parsing_errors=True,
-            system_message="""You are a helpful AI assistant with access to various tools. Follow these guidelines:
+            # The conversational agent ignores ``system_message``; its prompt prefix is the
+            # static head every call shares, so it is what the KV prefix cache keeps warm
+            agent_kwargs={"prefix": """You are a helpful AI assistant with access to various tools. Follow these guidelines:
 
 1. When you receive a question, decide ONCE if you need a tool.
 2. If you use a tool and get a response, provide that response to the user directly without further thinking.
 3. For web searches about general topics, animals, history, etc., use the web_search tool immediately.
 4. For weather queries, use the weather tool immediately.
 5. For calculations, use the calculator tool immediately.
-6. Never reconsider your tool choice after getting a response.
-7. Always provide the tool's response directly to the user.
+6. For questions about the user's uploaded documents, use the document_search tool.
+7. Never reconsider your tool choice after getting a response.
+8. Always provide the tool's response directly to the user.
+
+Remember: One decision, one tool use, direct response.
+
+TOOLS:
+------
 
-Remember: One decision, one tool use, direct response."""
+Assistant has access to the following tools:"""}
         )
 
-    async def process_message(self, message: str) -> str:
-        """Process a message using the agent."""
+    def executor_for(self, session_id: str) -> AgentExecutor:
+        return AgentExecutor.from_agent_and_tools(
+            agent=self.agent_executor.agent,
+            tools=self.tools,
+            memory=SessionMemory(store=self.sessions, session_id=session_id),
+            callbacks=[self.log_handler],
+            verbose=False,
+            handle_parsing_errors=True,
+        )
+
+    async def run(
+        self,
+        message: str,
+        session_id: str,
+        callbacks: Optional[List[BaseCallbackHandler]] = None,
+    ) -> AgentRun:
+        """Answer ``message`` in the given session, timing each step.
+
+        ``callbacks`` are attached to the answer-producing LLM call only, e.g. to stream the final answer.
+        """
+        started = time.perf_counter()
         try:
-            response = await self.agent_executor.arun(
-                input=message
-            )
-            return response
+            if self.mode == "parallel":
+                result = await self._run_parallel(message, session_id, callbacks, started)
+            else:
+                result = await self._run_react(message, session_id, callbacks, started, [])
+            if self.sessions.needs_summary(session_id):
+                # Fold old turns into the summary in the background, off the response path
+                task = asyncio.ensure_future(self.sessions.summarize(session_id))
+                self._summaries.add(task)
+                task.add_done_callback(self._summary_done)
+            self.record(result)
+            return result
+        except (QueueFullError, QueueTimeoutError):
+            # Let the API turn overload into a 429/503 instead of a chat reply
+            raise
         except Exception as e:
-            return f"Error processing message: {str(e)}"
\ No newline at end of file
+            return AgentRun(f"Error processing message: {str(e)}", self.mode, [], started)
+
+    def _summary_done(self, task: asyncio.Task):
+        self._summaries.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Session summary failed: %s", task.exception(), exc_info=task.exception())
+
+    def record(self, run: AgentRun):
+        AGENT_RUNS.inc(mode=run.mode)
+        for step in run.steps:
+            if not step.get("skipped"):
+                AGENT_STEP_SECONDS.observe(step["ms"] / 1000, mode=run.mode, step=step["step"])
+        AGENT_STEP_SECONDS.observe(run.total_ms / 1000, mode=run.mode, step="total")
+
+    async def _run_react(
+        self,
+        message: str,
+        session_id: str,
+        callbacks: Optional[List[BaseCallbackHandler]],
+        started: float,
+        steps: List[Dict[str, Any]],
+    ) -> AgentRun:
+        step_started = time.perf_counter()
+        response = await self.executor_for(session_id).arun(input=message, callbacks=callbacks)
+        steps.append({"step": "react", "ms": round((time.perf_counter() - step_started) * 1000, 1)})
+        return AgentRun(response, "react", steps, started)
+
+    async def _run_parallel(
+        self,
+        message: str,
+        session_id: str,
+        callbacks: Optional[List[BaseCallbackHandler]],
+        started: float,
+    ) -> AgentRun:
+        history = self.sessions.render(session_id)
+        steps: List[Dict[str, Any]] = []
+
+        step_started = time.perf_counter()
+        calls = await self.parallel_agent.plan(message, history)
+        steps.append({"step": "plan", "calls": len(calls) if calls is not None else None, "ms": round((time.perf_counter() - step_started) * 1000, 1)})
+        if calls is None:
+            # The plan could not be parsed; let the ReAct agent work it out step by step
+            return await self._run_react(message, session_id, callbacks, started, steps)
+
+        await self.parallel_agent.execute(calls, started)
+        steps.extend(call.step() for call in calls)
+
+        response = self.parallel_agent.direct_answer(calls)
+        if response is not None:
+            steps.append({"step": "answer", "skipped": True, "ms": 0.0})
+        else:
+            step_started = time.perf_counter()
+            response = await self.parallel_agent.answer(message, history, calls, callbacks)
+            steps.append({"step": "answer", "skipped": False, "ms": round((time.perf_counter() - step_started) * 1000, 1)})
+        self.sessions.append(session_id, message, response)
+        return AgentRun(response, "parallel", steps, started)
+
+    async def process_message(
+        self,
+        message: str,
+        session_id: str,
+        callbacks: Optional[List[BaseCallbackHandler]] = None,
+    ) -> str:
+        """Process a message using the agent with the given session's history."""
+        return (await self.run(message, session_id, callbacks)).response
@@ -0,0 +1,156 @@
+import asyncio
+import json
+import time
+from typing import Any, Dict, List, Optional, Sequence
+from langchain.tools import BaseTool
+from langchain_core.callbacks import BaseCallbackHandler
+from tools.base_tools import TOOL_CALLS
+from utils.logger import setup_logger
+
+logger = setup_logger("agent.parallel")
+
+# Tags the LLM call whose tokens are the final answer, so streaming handlers forward all of it
+FINAL_ANSWER_TAG = "final_answer"
+
+MAX_CALLS = 4
+
+# Seconds each tool may take before its call is abandoned
+TOOL_TIMEOUTS = {
+    "calculator": 2.0,
+    "weather_search": 10.0,
+    "document_search": 10.0,
+    "web_search": 15.0,
+    "api_documentation": 15.0,
+}
+DEFAULT_TOOL_TIMEOUT = 15.0
+
+PLAN_PROMPT = """You plan tool calls for an assistant. Available tools:
+{tools}
+
+Previous conversation history:
+{chat_history}
+New input: {input}
+
+List every tool call needed to answer the new input. Independent lookups (for example the weather in two cities) are separate calls. Respond with JSON only:
+{{"calls": [{{"tool": "<tool name>", "input": "<tool input>"}}]}}
+Respond with {{"calls": []}} if no tool is needed.
+JSON:"""
+
+ANSWER_PROMPT = """You are a helpful AI assistant. Answer the new input, using the tool results if there are any. Be concise and do not mention the tools.
+
+Previous conversation history:
+{chat_history}
+New input: {input}
+
+Tool results:
+{results}
+
+Answer:"""
+
+class ToolCall:
+    def __init__(self, tool: str, tool_input: str):
+        self.tool = tool
+        self.input = tool_input
+        self.output: Optional[str] = None
+        self.status = "pending"
+        self.ms = 0.0
+        self.started_ms = 0.0
+
+    def step(self) -> Dict[str, Any]:
+        return {
+            "step": "tool",
+            "tool": self.tool,
+            "input": self.input,
+            "status": self.status,
+            "started_ms": round(self.started_ms, 1),
+            "ms": round(self.ms, 1),
+        }
+
+def parse_plan(text: str, tool_names: Sequence[str]) -> Optional[List[ToolCall]]:
+    """Tool calls from the planner's JSON, or None when the output is not a usable plan."""
+    start = text.find("{")
+    if start == -1:
+        return None
+    try:
+        plan, _ = json.JSONDecoder().raw_decode(text[start:])
+        calls = plan["calls"]
+    except (ValueError, KeyError, TypeError):
+        return None
+    if not isinstance(calls, list):
+        return None
+    parsed, seen = [], set()
+    for call in calls[:MAX_CALLS]:
+        if not isinstance(call, dict) or call.get("tool") not in tool_names:
+            return None
+        key = (call["tool"], str(call.get("input", "")).strip())
+        # The model sometimes repeats a call; run it once
+        if key not in seen:
+            seen.add(key)
+            parsed.append(ToolCall(*key))
+    return parsed
+
+class ParallelToolAgent:
+    """Plans all tool calls in one LLM pass, runs them concurrently, then answers.
+
+    When every call succeeds and each tool is marked ``return_direct``, the
+    tool outputs are the answer and the synthesis call is skipped. A tool
+    output starting with "Error" is a failed call and always goes through
+    synthesis.
+    """
+
+    def __init__(self, llm: Any, tools: Sequence[BaseTool], timeouts: Optional[Dict[str, float]] = None):
+        self.llm = llm
+        self.tools = {tool.name: tool for tool in tools}
+        self.timeouts = dict(TOOL_TIMEOUTS, **(timeouts or {}))
+        self.tool_list = "\n".join(f"{tool.name}: {tool.description}" for tool in tools)
+
+    async def plan(self, message: str, history: str) -> Optional[List[ToolCall]]:
+        prompt = PLAN_PROMPT.format(tools=self.tool_list, chat_history=history, input=message)
+        text = await self.llm.ainvoke(prompt, max_tokens=256)
+        calls = parse_plan(text, list(self.tools))
+        if calls is None:
+            logger.warning("Unusable tool plan: %r", text[:200])
+        return calls
+
+    async def _call(self, call: ToolCall, started: float):
+        call.started_ms = (time.perf_counter() - started) * 1000
+        try:
+            call.output = await asyncio.wait_for(
+                self.tools[call.tool].arun(call.input),
+                timeout=self.timeouts.get(call.tool, DEFAULT_TOOL_TIMEOUT),
+            )
+            # The tools report failures as text, as ToolMetricsHandler counts them
+            call.status = "error" if str(call.output).startswith("Error") else "ok"
+        except asyncio.TimeoutError:
+            # A cancelled tool never reports back to its callbacks, so count it here
+            TOOL_CALLS.inc(tool=call.tool, status="timeout")
+            call.status = "timeout"
+            call.output = f"{call.tool} did not respond in time."
+        except Exception as e:
+            call.status = "error"
+            call.output = f"{call.tool} failed: {str(e)}"
+        call.ms = (time.perf_counter() - started) * 1000 - call.started_ms
+
+    async def execute(self, calls: List[ToolCall], started: float):
+        await asyncio.gather(*(self._call(call, started) for call in calls))
+
+    def direct_answer(self, calls: List[ToolCall]) -> Optional[str]:
+        if calls and all(call.status == "ok" and self.tools[call.tool].return_direct for call in calls):
+            return "\n\n".join(call.output for call in calls)
+        return None
+
+    async def answer(
+        self,
+        message: str,
+        history: str,
+        calls: List[ToolCall],
+        callbacks: Optional[List[BaseCallbackHandler]] = None,
+    ) -> str:
+        results = "\n\n".join(f"[{call.tool}: {call.input}]\n{call.output}" for call in calls) or "(none)"
+        prompt = ANSWER_PROMPT.format(chat_history=history, input=message, results=results)
+        text = await self.llm.ainvoke(
+            prompt,
+            config={"callbacks": callbacks, "tags": [FINAL_ANSWER_TAG]},
+            stop=["\nHuman:", "\nNew input:"],
+        )
+        return text.strip()
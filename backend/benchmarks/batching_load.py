@@ -0,0 +1,178 @@
+"""Load test for continuous batching: tokens/sec and latency against the serial path.
+
+Runs the same concurrent workload through the scheduler and registry twice,
+once with ``max_batch_size=1`` (one sequence per llama.cpp call, as before)
+and once with the batch engine. By default the model is simulated with a
+memory-bound cost model (each decode step pays for reading the weights once,
+plus a small cost per token in the batch); pass ``--model`` to load a real
+GGUF from ``AVAILABLE_MODELS`` instead.
+
+Usage (from ``backend/``):
+    python -m benchmarks.batching_load [--requests 32] [--concurrency 8] [--max-batch-size 4] [--model code]
+"""
+import argparse
+import asyncio
+import copy
+import json
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+import numpy as np
+from benchmarks.router_eval import percentile
+from inference.batching import BatchEngine, create_batch_engine
+from inference.registry import ModelRegistry, create_llm
+from inference.scheduler import InferenceScheduler
+from models.configs.model_config import AVAILABLE_MODELS, ModelConfig, ModelType
+
+PROMPTS = [
+    "Write a Python function that reverses a linked list.",
+    "Explain the difference between a process and a thread.",
+    "Write a SQL query that returns the ten most recent orders per customer.",
+    "What does the yield keyword do in Python?",
+]
+
+class SimulatedBackend:
+    """Byte-level stand-in for ``LlamaBatchBackend`` whose decode cost grows slowly with batch size."""
+
+    def __init__(self, step_ms: float, token_ms: float, n_ctx_per_seq: int = 4096, n_batch: int = 512):
+        self.step = step_ms / 1000
+        self.per_token = token_ms / 1000
+        self.n_ctx_per_seq = n_ctx_per_seq
+        self.n_batch = n_batch
+        self.eos = 0
+
+    def tokenize(self, text: str) -> List[int]:
+        return list(text.encode("utf-8"))
+
+    def detokenize(self, token: int) -> bytes:
+        return bytes([token])
+
+    def decode(self, entries) -> List[np.ndarray]:
+        time.sleep(self.step + self.per_token * sum(len(tokens) for _, tokens, _ in entries))
+        logits = []
+        for _, tokens, start in entries:
+            row = np.zeros(256, dtype=np.float32)
+            row[97 + (start + len(tokens)) % 26] = 10.0  # deterministic lowercase text, never EOS
+            logits.append(row)
+        return logits
+
+    def release(self, seq_id: int):
+        pass
+
+    def close(self):
+        pass
+
+class SimulatedLLM:
+    """The serial path on the same cost model: one sequence per call, like ``LlamaCpp.invoke``."""
+
+    def __init__(self, backend: SimulatedBackend, max_tokens: int):
+        self.backend = backend
+        self.max_tokens = max_tokens
+
+    def stream(self, prompt: str, max_tokens: Optional[int] = None, **kwargs):
+        tokens = self.backend.tokenize(prompt)
+        logits = self.backend.decode([(0, tokens, 0)])[0]
+        for position in range(len(tokens), len(tokens) + (max_tokens or self.max_tokens)):
+            token = int(np.argmax(logits))
+            yield self.backend.detokenize(token).decode("utf-8")
+            logits = self.backend.decode([(0, [token], position)])[0]
+
+    def invoke(self, prompt: str, **kwargs) -> str:
+        return "".join(self.stream(prompt, **kwargs))
+
+async def run_load(
+    registry: ModelRegistry,
+    scheduler: InferenceScheduler,
+    model_type: ModelType,
+    requests: int,
+    concurrency: int,
+    count_tokens: Callable[[str], int],
+) -> Dict[str, Any]:
+    latencies: List[float] = []
+    tokens = 0
+    gate = asyncio.Semaphore(concurrency)
+
+    async def one(index: int):
+        nonlocal tokens
+        async with gate:
+            started = time.perf_counter()
+            text = await scheduler.run(model_type.value, registry.invoke, model_type, PROMPTS[index % len(PROMPTS)])
+            latencies.append(time.perf_counter() - started)
+            tokens += count_tokens(text)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": requests,
+        "tokens": tokens,
+        "seconds": round(elapsed, 3),
+        "tokens_per_sec": round(tokens / elapsed, 2),
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 1),
+            "p95": round(percentile(latencies, 95) * 1000, 1),
+            "max": round(max(latencies) * 1000, 1),
+        },
+    }
+
+def run_mode(config: ModelConfig, args: argparse.Namespace, batch_size: int) -> Dict[str, Any]:
+    config = copy.copy(config)
+    config.max_batch_size = batch_size
+    config.batch_window_ms = args.window_ms
+    config.max_tokens = args.max_tokens
+    config.max_queue = args.requests
+
+    if args.model:
+        llm_factory, engine_factory = create_llm, create_batch_engine
+        count_tokens = lambda text: len(text) // 4 + 1  # noqa: E731 (same estimate as the session store)
+    else:
+        backend = SimulatedBackend(args.step_ms, args.token_ms)
+        llm_factory = lambda c: SimulatedLLM(backend, c.max_tokens)  # noqa: E731
+        engine_factory = lambda c, llm: BatchEngine(backend, c.name, c.max_batch_size, c.batch_window_ms / 1000)  # noqa: E731
+        count_tokens = len
+
+    registry = ModelRegistry({config.model_type: config}, memory_budget_bytes=2**62, llm_factory=llm_factory, engine_factory=engine_factory)
+    scheduler = InferenceScheduler()
+    scheduler.register(config.model_type.value, max_concurrency=max(1, batch_size), max_queue=args.requests, queue_timeout=600.0)
+    try:
+        registry.load(config.model_type)
+        report = asyncio.run(run_load(registry, scheduler, config.model_type, args.requests, args.concurrency, count_tokens))
+        batching = registry.stats()["models"][config.model_type.value]["batching"]
+        if batching:
+            report["avg_batch"] = batching["avg_batch"]
+        return report
+    finally:
+        registry.unload(config.model_type, reason="benchmark finished")
+        scheduler.shutdown()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", choices=[t.value for t in ModelType], help="Benchmark a real model instead of the simulation")
+    parser.add_argument("--requests", type=int, default=32)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--max-batch-size", type=int, default=4)
+    parser.add_argument("--window-ms", type=float, default=10.0)
+    parser.add_argument("--max-tokens", type=int, default=64)
+    parser.add_argument("--step-ms", type=float, default=20.0, help="Simulated cost of one decode step")
+    parser.add_argument("--token-ms", type=float, default=0.5, help="Simulated extra cost per token in a step")
+    parser.add_argument("--output", type=Path, help="Also write the report as JSON")
+    args = parser.parse_args()
+
+    model_type = ModelType(args.model) if args.model else ModelType.CODE
+    config = AVAILABLE_MODELS[model_type]
+    serial = run_mode(config, args, 1)
+    batched = run_mode(config, args, args.max_batch_size)
+    report = {
+        "model": config.name if args.model else "simulated",
+        "concurrency": args.concurrency,
+        "serial": serial,
+        "batched": batched,
+        "throughput_gain": round(batched["tokens_per_sec"] / serial["tokens_per_sec"], 2),
+        "p95_latency_ratio": round(batched["latency_ms"]["p95"] / serial["latency_ms"]["p95"], 2),
+    }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,364 @@
+"""Load test for ``/api/chat``: throughput, latency percentiles and event-loop lag.
+
+Serves the real app with uvicorn on a background thread. Both models are
+replaced by ``FakeLLM`` (fixed prefill and per-token cost), and the tools
+talk to local stub upstreams. Concurrent clients then send a weighted mix
+of requests: greetings, thanks, general (blocking and streamed), code, and
+agent requests that go through the weather, search and calculator tools.
+
+While the load runs, a probe task on the server's event loop measures how
+late its timer wakes up. The report covers:
+- overall and per-scenario latency
+- time to first token for streamed requests
+- event-loop lag
+- server-side queue stats
+
+It is printed and written as JSON. Pass ``--baseline`` with an earlier report
+to print the deltas.
+
+The client shares the process (and the GIL) with the server, so absolute
+numbers are a floor; compare runs made on the same machine.
+
+With ``--workers N`` the app is served instead by the multi-worker
+supervisor (``serving.supervisor``): N processes behind its sticky proxy,
+each serving ``benchmarks.fake_app`` with the same fakes. Event-loop lag is
+then not measured. Compare ``--workers 1`` against ``--workers 4`` to see
+how throughput scales.
+
+Usage (from ``backend/``):
+    python -m benchmarks.chat_load [--requests 400] [--concurrency 16] [--general-token-ms 20] [--code-token-ms 25]
+                                   [--upstream-ms 50] [--mix greeting=1,general=3] [--output report.json] [--baseline old.json]
+                                   [--workers 4]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+import aiohttp
+from benchmarks.fakes import FakeLLM, StubUpstreams, fake_llm_factory
+from benchmarks.router_eval import percentile
+
+# Scenario: (prompts, request fields)
+SCENARIOS: Dict[str, Tuple[List[str], Dict[str, Any]]] = {
+    "greeting": (["hi", "hello there", "good morning"], {}),
+    "thanks": (["thanks!", "thank you so much"], {}),
+    "general": ([
+        "Tell me a fun fact about octopuses",
+        "Summarize the plot of Hamlet in two sentences",
+        "Why is the sky blue?",
+        "Give me three tips for better sleep",
+    ], {}),
+    "general_stream": ([
+        "Explain how rainbows form",
+        "Suggest a name for a grey cat",
+    ], {"stream": True}),
+    "code": ([
+        "Write a Python function that reverses a linked list",
+        "Fix this bug: my SQL query returns duplicate rows",
+    ], {}),
+    "weather": ([
+        "What's the weather in Paris?",
+        "What is the weather in Tokyo and Berlin?",
+        "weather in Lisbon",
+    ], {"use_agent": True}),
+    "search": (["Who was Ada Lovelace?", "What is the history of the printing press?"], {"use_agent": True}),
+    "calculator": (["What is 17 * 23 + 4?", "Calculate (2 + 3) ** 4 / 5"], {"use_agent": True}),
+}
+DEFAULT_MIX = {"greeting": 10, "thanks": 5, "general": 25, "general_stream": 15, "code": 15, "weather": 10, "search": 10, "calculator": 10}
+
+def summarize(latencies: List[float]) -> Dict[str, float]:
+    if not latencies:
+        return {}
+    return {
+        "p50": round(percentile(latencies, 50) * 1000, 1),
+        "p95": round(percentile(latencies, 95) * 1000, 1),
+        "p99": round(percentile(latencies, 99) * 1000, 1),
+        "max": round(max(latencies) * 1000, 1),
+        "mean": round(sum(latencies) / len(latencies) * 1000, 1),
+    }
+
+class LagProbe:
+    """Measures how late ``asyncio.sleep(interval)`` wakes up on the loop it runs on."""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples: List[float] = []
+        self.recording = False
+
+    async def run(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            if self.recording:
+                self.samples.append(max(0.0, time.perf_counter() - started - self.interval))
+
+class ServerThread:
+    """The app under uvicorn on its own thread and event loop, with a lag probe on that loop."""
+
+    def __init__(self, app: Any, probe: LagProbe):
+        import uvicorn
+
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            self.port = sock.getsockname()[1]
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=self.port, log_level="warning", lifespan="on"))
+        self.probe = probe
+        self.thread = threading.Thread(target=self._run, name="api-server", daemon=True)
+
+    def _run(self):
+        async def serve():
+            probe = asyncio.create_task(self.probe.run())
+            try:
+                await self.server.serve()
+            finally:
+                probe.cancel()
+
+        asyncio.run(serve())
+
+    def start(self) -> str:
+        self.thread.start()
+        while not self.server.started:
+            if not self.thread.is_alive():
+                raise RuntimeError("API server failed to start")
+            time.sleep(0.05)
+        return f"http://127.0.0.1:{self.port}"
+
+    def stop(self):
+        self.server.should_exit = True
+        self.thread.join()
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def start_supervisor(args: argparse.Namespace) -> Tuple[subprocess.Popen, str]:
+    """Serve ``benchmarks.fake_app`` from ``args.workers`` processes; returns the supervisor and its proxy URL."""
+    state = tempfile.mkdtemp(prefix="chat_load_state_")
+    env = dict(
+        os.environ,
+        BENCH_GENERAL_TOKEN_MS=str(args.general_token_ms),
+        BENCH_CODE_TOKEN_MS=str(args.code_token_ms),
+        BENCH_PREFILL_MS=str(args.prefill_ms),
+        BENCH_ANSWER_TOKENS=str(args.answer_tokens),
+        SESSION_DB=os.path.join(state, "sessions.sqlite"),
+        RESPONSE_CACHE_DB=os.path.join(state, "response_cache.sqlite"),
+    )
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "serving.supervisor", "--workers", str(args.workers), "--port", str(port),
+         "--worker-port", str(free_port()), "--app", "benchmarks.fake_app:app", "--preload", "", "--stagger", "0"],
+        env=env,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("Supervisor exited during startup")
+        try:
+            if asyncio.run(fetch_json(f"{url}/api/health")).get("status") == "healthy":
+                return process, url
+        except (aiohttp.ClientError, ValueError):
+            pass
+        time.sleep(0.25)
+    process.terminate()
+    raise RuntimeError("Workers did not become ready")
+
+async def send(session: aiohttp.ClientSession, url: str, scenario: str, text: str) -> Dict[str, Any]:
+    body = dict(SCENARIOS[scenario][1], text=text)
+    started = time.perf_counter()
+    result: Dict[str, Any] = {"scenario": scenario, "status": 0, "ttft": None}
+    try:
+        async with session.post(f"{url}/api/chat", json=body) as response:
+            result["status"] = response.status
+            if body.get("stream"):
+                async for line in response.content:
+                    if line.startswith(b"event: token") and result["ttft"] is None:
+                        result["ttft"] = time.perf_counter() - started
+                    elif line.startswith(b"event: error"):
+                        result["status"] = 599
+            else:
+                await response.read()
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        result["status"] = -1
+    result["latency"] = time.perf_counter() - started
+    return result
+
+async def drive(url: str, mix: Dict[str, int], requests: int, concurrency: int, unique: bool, seed: int) -> Tuple[List[Dict[str, Any]], float]:
+    rng = random.Random(seed)
+    names = list(mix)
+    plan = rng.choices(names, weights=[mix[name] for name in names], k=requests)
+    results: List[Dict[str, Any]] = []
+    jobs: asyncio.Queue = asyncio.Queue()
+    for index, scenario in enumerate(plan):
+        text = rng.choice(SCENARIOS[scenario][0])
+        # Distinct prompts keep the response cache from answering most of the load
+        jobs.put_nowait((scenario, f"{text} (#{index})" if unique else text))
+
+    async def client(session: aiohttp.ClientSession):
+        while not jobs.empty():
+            scenario, text = jobs.get_nowait()
+            results.append(await send(session, url, scenario, text))
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=300)) as session:
+        started = time.perf_counter()
+        await asyncio.gather(*(client(session) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return results, elapsed
+
+async def warm_up(url: str):
+    # Load both (fake) models and the router before timing anything
+    async with aiohttp.ClientSession() as session:
+        for scenario in ("general", "code"):
+            await send(session, url, scenario, SCENARIOS[scenario][0][0] + " (warm-up)")
+
+async def fetch_json(url: str) -> Dict[str, Any]:
+    async with aiohttp.ClientSession() as session:
+        async with session.get(url) as response:
+            return await response.json()
+
+def build_report(args: argparse.Namespace, mix: Dict[str, int], results: List[Dict[str, Any]], elapsed: float, lag: List[float], health: Dict[str, Any], upstream: Dict[str, int]) -> Dict[str, Any]:
+    ok = [r for r in results if r["status"] == 200]
+    statuses: Dict[str, int] = {}
+    for r in results:
+        statuses[str(r["status"])] = statuses.get(str(r["status"]), 0) + 1
+    scenarios = {}
+    for name in mix:
+        runs = [r for r in results if r["scenario"] == name]
+        if not runs:
+            continue
+        scenarios[name] = {
+            "requests": len(runs),
+            "errors": sum(r["status"] != 200 for r in runs),
+            "latency_ms": summarize([r["latency"] for r in runs if r["status"] == 200]),
+        }
+        ttfts = [r["ttft"] for r in runs if r["ttft"] is not None]
+        if ttfts:
+            scenarios[name]["ttft_ms"] = summarize(ttfts)
+    return {
+        "benchmark": "chat_load",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "general_token_ms": args.general_token_ms,
+            "code_token_ms": args.code_token_ms,
+            "prefill_ms": args.prefill_ms,
+            "answer_tokens": args.answer_tokens,
+            "upstream_ms": args.upstream_ms,
+            "unique_prompts": not args.repeat_prompts,
+            "mix": mix,
+            "seed": args.seed,
+            "workers": args.workers,
+        },
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(len(ok) / elapsed, 2),
+        "statuses": statuses,
+        "latency_ms": summarize([r["latency"] for r in ok]),
+        "scenarios": scenarios,
+        "event_loop_lag_ms": dict(summarize(lag), samples=len(lag)),
+        "server": {"queues": health.get("queues"), "router": health.get("router"), "tools_http": health.get("tools_http"), "workers": health.get("workers")},
+        "upstream_requests": upstream,
+    }
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any]) -> Dict[str, Any]:
+    """Relative change against an earlier report (positive is more; lower latency and lag are better)."""
+    def change(new: Optional[float], old: Optional[float]) -> Optional[float]:
+        if not new or not old:
+            return None
+        return round((new - old) / old * 100, 1)
+
+    rows = {"throughput_rps": change(report["throughput_rps"], baseline.get("throughput_rps"))}
+    for pct in ("p50", "p95", "p99"):
+        rows[f"latency_{pct}"] = change(report["latency_ms"].get(pct), baseline.get("latency_ms", {}).get(pct))
+        rows[f"event_loop_lag_{pct}"] = change(report["event_loop_lag_ms"].get(pct), baseline.get("event_loop_lag_ms", {}).get(pct))
+    for name, scenario in report["scenarios"].items():
+        old = baseline.get("scenarios", {}).get(name)
+        if old:
+            rows[f"{name}_p95"] = change(scenario["latency_ms"].get("p95"), old.get("latency_ms", {}).get("p95"))
+    return {"baseline": baseline.get("timestamp"), "percent_change": rows}
+
+def parse_mix(text: Optional[str]) -> Dict[str, int]:
+    if not text:
+        return dict(DEFAULT_MIX)
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name not in SCENARIOS:
+            raise SystemExit(f"Unknown scenario '{name}' (choose from {', '.join(SCENARIOS)})")
+        mix[name] = int(weight or 1)
+    return mix
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--general-token-ms", type=float, default=20.0, help="Fake general model: time per generated token")
+    parser.add_argument("--code-token-ms", type=float, default=25.0, help="Fake code model: time per generated token")
+    parser.add_argument("--prefill-ms", type=float, default=50.0, help="Fake models: time before the first token")
+    parser.add_argument("--answer-tokens", type=int, default=48)
+    parser.add_argument("--upstream-ms", type=float, default=50.0, help="Stub Nominatim/Open-Meteo/Wikipedia response delay")
+    parser.add_argument("--mix", help="Scenario weights, e.g. 'greeting=1,general=3' (default: a realistic mix)")
+    parser.add_argument("--repeat-prompts", action="store_true", help="Reuse prompts verbatim so the response cache can answer them")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=0, help="Serve from this many worker processes via serving.supervisor (0: in-process)")
+    parser.add_argument("--output", type=Path, default=Path("benchmarks/results/chat_load.json"))
+    parser.add_argument("--baseline", type=Path, help="An earlier report to compare against")
+    args = parser.parse_args()
+    mix = parse_mix(args.mix)
+
+    upstreams = StubUpstreams(args.upstream_ms)
+    os.environ.update(upstreams.start())
+    # Isolated state, and quiet logs so log I/O doesn't dominate the measurement
+    os.environ.setdefault("RAG_DIR", tempfile.mkdtemp(prefix="chat_load_rag_"))
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+    probe = LagProbe()
+    if args.workers:
+        supervisor, url = start_supervisor(args)
+
+        def stop_server():
+            supervisor.terminate()
+            supervisor.wait()
+    else:
+        # Imported only now: the tools read the upstream URLs at import time
+        import main as api
+        from models.configs.model_config import ModelType
+
+        fakes = {
+            ModelType.GENERAL: FakeLLM("fake-general", args.general_token_ms, args.prefill_ms, args.answer_tokens),
+            ModelType.CODE: FakeLLM("fake-code", args.code_token_ms, args.prefill_ms, args.answer_tokens, code=True),
+        }
+        api.registry.llm_factory = fake_llm_factory(fakes)
+        server = ServerThread(api.app, probe)
+        url = server.start()
+        stop_server = server.stop
+    try:
+        asyncio.run(warm_up(url))
+        probe.recording = True
+        results, elapsed = asyncio.run(drive(url, mix, args.requests, args.concurrency, not args.repeat_prompts, args.seed))
+        probe.recording = False
+        health = asyncio.run(fetch_json(f"{url}/api/health"))
+    finally:
+        stop_server()
+        upstreams.stop()
+
+    report = build_report(args, mix, results, elapsed, probe.samples, health, dict(upstreams.requests))
+    if args.baseline:
+        report["comparison"] = compare(report, json.loads(args.baseline.read_text()))
+    print(json.dumps(report, indent=2))
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
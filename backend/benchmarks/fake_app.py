@@ -0,0 +1,19 @@
+"""The API with ``FakeLLM`` models, for load-testing multi-worker deployments.
+
+``chat_load --workers N`` has each supervisor worker serve ``benchmarks.fake_app:app``.
+The fakes' cost model comes from the ``BENCH_*`` environment variables, which
+``chat_load`` sets from its own options.
+"""
+import os
+from benchmarks.fakes import FakeLLM, fake_llm_factory
+import main
+from models.configs.model_config import ModelType
+
+prefill_ms = float(os.getenv("BENCH_PREFILL_MS", "50"))
+answer_tokens = int(os.getenv("BENCH_ANSWER_TOKENS", "48"))
+main.registry.llm_factory = fake_llm_factory({
+    ModelType.GENERAL: FakeLLM("fake-general", float(os.getenv("BENCH_GENERAL_TOKEN_MS", "20")), prefill_ms, answer_tokens),
+    ModelType.CODE: FakeLLM("fake-code", float(os.getenv("BENCH_CODE_TOKEN_MS", "25")), prefill_ms, answer_tokens, code=True),
+})
+
+app = main.app
@@ -0,0 +1,207 @@
+"""Deterministic stand-ins for the models and upstream APIs, for benchmarking the API offline.
+
+``FakeLLM`` replaces a llama.cpp model behind the registry: it recognises
+the prompts the app sends (classification, tool plan, tool answer, ReAct
+agent) and answers them the way a well-behaved model would, spending a fixed
+prefill time plus a fixed time per generated token. ``StubUpstreams`` serves
+Nominatim, Open-Meteo and Wikipedia look-alikes on localhost with a fixed
+network delay.
+"""
+import asyncio
+import hashlib
+import re
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional
+from aiohttp import web
+
+WORDS = (
+    "the answer depends on a few things but in short it works like this and "
+    "you can find more detail in the documentation for each part of the system"
+).split()
+
+CODE_LINES = [
+    "def solve(items):",
+    "    result = []",
+    "    for item in items:",
+    "        result.append(item)",
+    "    return result",
+]
+
+def _digest(text: str) -> int:
+    return int(hashlib.sha1(text.encode("utf-8")).hexdigest()[:8], 16)
+
+def _new_input(prompt: str) -> str:
+    """The user's message inside an app prompt (the text after the last ``New input:`` or ``Query:``)."""
+    for marker in ("New input:", "Query:"):
+        index = prompt.rfind(marker)
+        if index != -1:
+            return prompt[index + len(marker):].strip().splitlines()[0].strip()
+    return prompt.strip()
+
+class FakeLLM:
+    """A model with the registry's ``invoke``/``stream`` surface and a fixed cost model.
+
+    Every call costs ``prefill_ms`` before the first token and ``token_ms``
+    per token after it. Output only depends on the prompt, so runs repeat.
+    """
+
+    def __init__(self, name: str, token_ms: float = 20.0, prefill_ms: float = 50.0, answer_tokens: int = 48, code: bool = False):
+        self.name = name
+        self.token_ms = token_ms
+        self.prefill_ms = prefill_ms
+        self.answer_tokens = answer_tokens
+        self.code = code
+        self.calls = 0
+
+    def respond(self, prompt: str, max_tokens: Optional[int] = None) -> List[str]:
+        """The tokens this model generates for ``prompt``."""
+        if "Analyze the following query and classify it" in prompt:
+            text = _new_input(prompt).lower()
+            if any(word in text for word in ("code", "function", "python", "bug", "sql")):
+                category = "CODE"
+            elif any(word in text for word in ("weather", "calculate", "search", "latest")):
+                category = "TOOL"
+            else:
+                category = "GENERAL"
+            return [f'{{"category": "{category}", "reason": "benchmark"}}']
+        if "List every tool call needed" in prompt:
+            return [plan_for(_new_input(prompt))]
+        if "TOOLS:\n------" in prompt:
+            # The ReAct agent: answer without a tool so a fallback run terminates
+            return ["Thought: Do I need to use a tool? No\n", "AI: "] + self._words(prompt, max_tokens)
+        if self.code:
+            lines = CODE_LINES * (1 + self.answer_tokens // len(CODE_LINES))
+            return [line + "\n" for line in lines[:min(self.answer_tokens, max_tokens or self.answer_tokens)]]
+        return self._words(prompt, max_tokens)
+
+    def _words(self, prompt: str, max_tokens: Optional[int]) -> List[str]:
+        start = _digest(prompt) % len(WORDS)
+        count = min(self.answer_tokens, max_tokens or self.answer_tokens)
+        return [WORDS[(start + i) % len(WORDS)] + " " for i in range(count)]
+
+    def stream(self, prompt: str, max_tokens: Optional[int] = None, **kwargs) -> Iterator[str]:
+        self.calls += 1
+        time.sleep(self.prefill_ms / 1000)
+        for index, token in enumerate(self.respond(prompt, max_tokens)):
+            if index:
+                time.sleep(self.token_ms / 1000)
+            yield token
+
+    def invoke(self, prompt: str, **kwargs) -> str:
+        return "".join(self.stream(prompt, **kwargs))
+
+def plan_for(message: str) -> str:
+    """The tool plan a good model would write for ``message``."""
+    lower = message.lower()
+    calls = []
+    if "weather" in lower:
+        for city in re.findall(r"\b(?:in|and) ([A-Z][a-z]+(?: [A-Z][a-z]+)?)", message) or ["New York"]:
+            calls.append(f'{{"tool": "weather_search", "input": "{city}"}}')
+    elif re.search(r"\d", message) and re.search(r"[-+*/^]", message):
+        expression = "".join(re.findall(r"[\d+\-*/^(). ]", message)).strip()
+        calls.append(f'{{"tool": "calculator", "input": "{expression}"}}')
+    elif any(word in lower for word in ("who", "what is", "search", "history")):
+        calls.append(f'{{"tool": "web_search", "input": "{message.rstrip("?")}"}}')
+    return '{"calls": [' + ", ".join(calls) + "]}"
+
+class StubUpstreams:
+    """Local look-alikes of the weather and search APIs, served on their own thread and event loop.
+
+    Responses are derived from the request parameters, and each one waits
+    ``delay_ms`` first to stand in for the network. ``urls`` maps the tools'
+    environment variables to the stub endpoints.
+    """
+
+    def __init__(self, delay_ms: float = 50.0, host: str = "127.0.0.1"):
+        self.delay = delay_ms / 1000
+        self.host = host
+        self.requests: Dict[str, int] = {"nominatim": 0, "open_meteo": 0, "wikipedia": 0}
+        self.urls: Dict[str, str] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._runners: List[web.AppRunner] = []
+        self._thread: Optional[threading.Thread] = None
+
+    async def _nominatim(self, request: web.Request) -> web.Response:
+        self.requests["nominatim"] += 1
+        await asyncio.sleep(self.delay)
+        query = request.query.get("q", "")
+        seed = _digest(query.lower())
+        return web.json_response([{"lat": f"{(seed % 1400) / 10 - 70:.4f}", "lon": f"{(seed % 3600) / 10 - 180:.4f}", "display_name": query}])
+
+    async def _open_meteo(self, request: web.Request) -> web.Response:
+        self.requests["open_meteo"] += 1
+        await asyncio.sleep(self.delay)
+        seed = _digest(request.query.get("latitude", "") + request.query.get("longitude", ""))
+        return web.json_response({"current": {
+            "temperature_2m": round(seed % 350 / 10, 1),
+            "apparent_temperature": round(seed % 330 / 10, 1),
+            "relative_humidity_2m": seed % 100,
+            "precipitation": round(seed % 50 / 10, 1),
+            "weather_code": (0, 1, 2, 3, 61, 71)[seed % 6],
+            "wind_speed_10m": round(seed % 400 / 10, 1),
+            "wind_direction_10m": seed % 360,
+        }})
+
+    async def _wikipedia(self, request: web.Request) -> web.Response:
+        self.requests["wikipedia"] += 1
+        await asyncio.sleep(self.delay)
+        if request.query.get("list") == "search":
+            query = request.query.get("srsearch", "")
+            return web.json_response({"query": {"search": [{"title": f"{query} ({i + 1})"} for i in range(3)]}})
+        titles = request.query.get("titles", "").split("|")
+        pages = {
+            str(i): {"title": title, "extract": f"{title} is a topic with a long history. " * 12}
+            for i, title in enumerate(titles)
+        }
+        return web.json_response({"query": {"pages": pages}})
+
+    async def _serve(self, handler, path: str) -> str:
+        app = web.Application()
+        app.router.add_get(path, handler)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, self.host, 0)
+        await site.start()
+        self._runners.append(runner)
+        port = site._server.sockets[0].getsockname()[1]
+        return f"http://{self.host}:{port}{path}"
+
+    async def _start(self):
+        # One server per upstream, so the tools see three hosts as they do in production
+        self.urls = {
+            "NOMINATIM_URL": await self._serve(self._nominatim, "/search"),
+            "OPEN_METEO_URL": await self._serve(self._open_meteo, "/v1/forecast"),
+            "WIKIPEDIA_API_URL": await self._serve(self._wikipedia, "/w/api.php"),
+        }
+
+    def start(self) -> Dict[str, str]:
+        """Start serving; returns the environment variables that point the tools here."""
+        ready = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            self._loop.run_until_complete(self._start())
+            ready.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run, name="stub-upstreams", daemon=True)
+        self._thread.start()
+        ready.wait()
+        return dict(self.urls)
+
+    def stop(self):
+        if self._loop is None:
+            return
+
+        async def cleanup():
+            for runner in self._runners:
+                await runner.cleanup()
+
+        asyncio.run_coroutine_threadsafe(cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+def fake_llm_factory(fakes: Dict[Any, FakeLLM]):
+    """A registry ``llm_factory`` that hands out the fake for each model type."""
+    return lambda config: fakes[config.model_type]
@@ -0,0 +1,101 @@
+"""Vector index benchmark: ingest throughput, query latency and recall at growing sizes.
+
+Index numbers use synthetic clustered vectors (so 1M chunks don't need 1M
+embeddings); recall@k is measured against an exact scan of the same index.
+Embedding throughput is measured separately with the configured embedder.
+
+Usage (from ``backend/``):
+    python -m benchmarks.rag_index [--sizes 10000 100000 1000000] [--queries 200] [--nprobe N]
+"""
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+import numpy as np
+from benchmarks.router_eval import percentile
+from models.configs.model_config import EMBEDDING_MODEL_PATH
+from rag.chunking import StreamingChunker
+from rag.embedder import create_embedder
+from rag.index import VectorIndex, _normalize
+
+BATCH = 10000
+
+def clustered(rng: np.random.Generator, centers: np.ndarray, n: int, noise: float = 0.35) -> np.ndarray:
+    picks = rng.integers(0, len(centers), n)
+    return _normalize(centers[picks] + noise * rng.standard_normal((n, centers.shape[1])).astype(np.float32) / np.sqrt(centers.shape[1]) * 4)
+
+def bench_index(size: int, dim: int, queries: int, k: int, nprobe: Any) -> Dict[str, Any]:
+    rng = np.random.default_rng(size)
+    centers = _normalize(rng.standard_normal((max(64, size // 500), dim)).astype(np.float32))
+    with tempfile.TemporaryDirectory() as path:
+        index = VectorIndex(path, dim, "synthetic")
+        started = time.perf_counter()
+        for start in range(0, size, BATCH):
+            n = min(BATCH, size - start)
+            index.add(clustered(rng, centers, n), f"doc-{start // BATCH}", [f"chunk {start + i}" for i in range(n)])
+        index.flush()
+        ingest_seconds = time.perf_counter() - started
+
+        probes = clustered(rng, centers, queries)
+        latencies: List[float] = []
+        hits = 0
+        for query in probes:
+            started = time.perf_counter()
+            approximate = index.search(query, k, nprobe)
+            latencies.append((time.perf_counter() - started) * 1000)
+            exact = index.search(query, k, nprobe=10**9) if index.centroids is not None else approximate
+            hits += len({row for row, _ in approximate} & {row for row, _ in exact})
+        report = {
+            "chunks": size,
+            "ingest_seconds": round(ingest_seconds, 2),
+            "ingest_chunks_per_sec": round(size / ingest_seconds, 1),
+            "index_mb": round(size * dim * 2 / 2**20, 1),
+            "ivf_lists": index.stats()["ivf_lists"],
+            "query_ms": {
+                "p50": round(percentile(latencies, 50), 3),
+                "p95": round(percentile(latencies, 95), 3),
+                "p99": round(percentile(latencies, 99), 3),
+            },
+            f"recall_at_{k}": round(hits / (queries * k), 4),
+        }
+        index.close()
+    return report
+
+def bench_embedder(samples: int) -> Dict[str, Any]:
+    embedder = create_embedder(EMBEDDING_MODEL_PATH)
+    chunker = StreamingChunker()
+    words = "the model index query vector chunk document memory retrieval latency throughput batch".split()
+    rng = np.random.default_rng(0)
+    chunks: List[str] = []
+    while len(chunks) < samples:
+        chunks.extend(chunker.feed((" ".join(rng.choice(words, 400)) + ". ").encode()))
+    chunks = chunks[:samples]
+    started = time.perf_counter()
+    for start in range(0, len(chunks), embedder.batch_size):
+        embedder.embed(chunks[start:start + embedder.batch_size])
+    elapsed = time.perf_counter() - started
+    return {"embedder": embedder.name, "dim": embedder.dim, "chunks": samples, "chunks_per_sec": round(samples / elapsed, 1)}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, help="IVF lists probed per query (default: index heuristic)")
+    parser.add_argument("--embed-samples", type=int, default=1000, help="Chunks to embed for the embedding throughput figure")
+    parser.add_argument("--output", type=Path, help="Also write the report as JSON")
+    args = parser.parse_args()
+
+    report = {
+        "embedding": bench_embedder(args.embed_samples),
+        "index": [bench_index(size, args.dim, args.queries, args.k, args.nprobe) for size in args.sizes],
+    }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
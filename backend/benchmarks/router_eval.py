@@ -0,0 +1,80 @@
+"""Offline evaluation of the query router: accuracy, LLM-fallback rate and routing latency.
+
+Usage (from ``backend/``):
+    python -m benchmarks.router_eval [--data routing/data/eval_queries.jsonl] [--threshold 0.6]
+"""
+import argparse
+import json
+import time
+from pathlib import Path
+from typing import Dict, List
+from routing.classifier import load_examples
+from routing.router import CONFIDENCE_THRESHOLD, DATA_DIR, QueryRouter, load_classifier
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def evaluate(router: QueryRouter, texts: List[str], labels: List[str]) -> Dict:
+    confusion: Dict[str, Dict[str, int]] = {}
+    per_source: Dict[str, Dict[str, float]] = {}
+    latencies: List[float] = []
+    confident = confident_correct = correct = 0
+
+    for text, label in zip(texts, labels):
+        started = time.perf_counter()
+        decision = router.route_local(text)
+        latencies.append((time.perf_counter() - started) * 1000)
+
+        hit = decision["category"] == label
+        correct += hit
+        if decision["confident"]:
+            confident += 1
+            confident_correct += hit
+        source = per_source.setdefault(decision["source"], {"count": 0, "correct": 0})
+        source["count"] += 1
+        source["correct"] += hit
+        row = confusion.setdefault(label, {})
+        row[decision["category"]] = row.get(decision["category"], 0) + 1
+
+    total = len(texts)
+    return {
+        "examples": total,
+        "threshold": router.threshold,
+        "accuracy": round(correct / total, 4),
+        "accuracy_when_confident": round(confident_correct / confident, 4) if confident else None,
+        "llm_fallback_rate": round(1 - confident / total, 4),
+        "by_source": {
+            name: {"count": s["count"], "accuracy": round(s["correct"] / s["count"], 4)}
+            for name, s in per_source.items()
+        },
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50), 4),
+            "p95": round(percentile(latencies, 95), 4),
+            "p99": round(percentile(latencies, 99), 4),
+            "mean": round(sum(latencies) / total, 4),
+        },
+        "confusion": confusion,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--data", type=Path, default=DATA_DIR / "eval_queries.jsonl", help="Labelled evaluation queries")
+    parser.add_argument("--threshold", type=float, default=CONFIDENCE_THRESHOLD)
+    parser.add_argument("--output", type=Path, help="Also write the report as JSON")
+    args = parser.parse_args()
+
+    texts, labels = load_examples([args.data])
+    if not texts:
+        raise SystemExit(f"No labelled queries in {args.data}")
+    router = QueryRouter(load_classifier(), threshold=args.threshold, query_log=None)
+    report = evaluate(router, texts, labels)
+    print(json.dumps(report, indent=2))
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""Speculative decoding benchmark: tokens/sec with and without the draft model on the same prompts.
+
+With ``--model`` the configured GGUF model (and its ``draft_model_path``, or
+``--draft``) is loaded through llama.cpp. Each prompt is decoded greedily
+twice, once plainly and once with the draft, and the benchmark checks that
+both runs produce the same text.
+
+Without ``--model`` the decode loop is simulated on a virtual clock, using
+the same cost model as ``batching_load``:
+- a target step pays for reading the weights once, plus a little per token in the batch
+- a draft token has a fixed cost
+
+The draft predicts the target's next token with a fixed probability, and one
+run is made per probability. The real adaptive ``SpeculativeDraft``
+controller picks the draft lengths, so the results show where speculation
+pays off and where it backs off.
+
+Usage (from ``backend/``):
+    python -m benchmarks.speculative [--model general] [--draft path/to/draft.gguf] [--max-tokens 128]
+    python -m benchmarks.speculative [--acceptance 0.9 0.7 0.5 0.2] [--step-ms 60] [--token-ms 3] [--draft-ms 9]
+"""
+import argparse
+import json
+import random
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import numpy as np
+from inference.speculative import LlamaDraft, SpeculativeDraft
+from models.configs.model_config import AVAILABLE_MODELS, ModelType
+
+PROMPTS = [
+    "Write a Python function that checks whether a string is a palindrome.",
+    "Explain in a few sentences how HTTP caching works.",
+    "List the steps to make a cup of tea.",
+]
+
+class SimulatedDraft(SpeculativeDraft):
+    """Proposes the target's true continuation, each token right with probability ``acceptance``."""
+
+    def __init__(self, truth: List[int], acceptance: float, clock: List[float], draft_ms: float, seed: int = 0, **kwargs: Any):
+        super().__init__(**kwargs)
+        self.truth = truth
+        self.acceptance = acceptance
+        self.clock = clock
+        self.draft_ms = draft_ms
+        self.rng = random.Random(seed)
+
+    def propose(self, input_ids: np.ndarray, n: int) -> np.ndarray:
+        position = len(input_ids)
+        proposal = []
+        for i in range(n):
+            expected = self.truth[position + i] if position + i < len(self.truth) else 0
+            proposal.append(expected if self.rng.random() < self.acceptance else expected + 1)
+        self.clock[0] += n * self.draft_ms / 1000
+        return np.array(proposal, dtype=np.intc)
+
+def simulate_generate(truth: List[int], prompt_len: int, max_tokens: int, step_ms: float, token_ms: float, clock: List[float], draft: Optional[SpeculativeDraft] = None) -> int:
+    """``Llama.generate``'s verify loop on a virtual clock; returns the number of tokens generated."""
+    sequence = truth[:prompt_len]
+    clock[0] += (step_ms + prompt_len * token_ms) / 1000  # prefill
+    generated = 0
+    while generated < max_tokens:
+        # The target samples its next token, then verifies the draft's proposal after it in the same batch
+        sequence.append(truth[len(sequence)])
+        generated += 1
+        proposal = draft(np.array(sequence, dtype=np.intc)) if draft is not None else []
+        clock[0] += (step_ms + (1 + len(proposal)) * token_ms) / 1000
+        for token in proposal:
+            if generated >= max_tokens or token != truth[len(sequence)]:
+                break
+            sequence.append(int(token))
+            generated += 1
+    return generated
+
+def run_simulated(args: argparse.Namespace) -> Dict[str, Any]:
+    prompt_len = 200
+    truth = list(range(prompt_len + args.max_tokens + args.max_draft + 2))
+    baseline_clock = [0.0]
+    baseline_tokens = sum(simulate_generate(truth, prompt_len, args.max_tokens, args.step_ms, args.token_ms, baseline_clock) for _ in PROMPTS)
+    baseline_rate = baseline_tokens / baseline_clock[0]
+    report: Dict[str, Any] = {
+        "model": "simulated",
+        "cost_model": {"step_ms": args.step_ms, "token_ms": args.token_ms, "draft_ms": args.draft_ms},
+        "baseline_tokens_per_sec": round(baseline_rate, 2),
+        "by_acceptance": {},
+    }
+    for acceptance in args.acceptance:
+        clock = [0.0]
+        draft = SimulatedDraft(truth, acceptance, clock, args.draft_ms, max_draft=args.max_draft)
+        tokens = sum(simulate_generate(truth, prompt_len, args.max_tokens, args.step_ms, args.token_ms, clock, draft) for _ in PROMPTS)
+        stats = draft.stats()
+        report["by_acceptance"][str(acceptance)] = {
+            "tokens_per_sec": round(tokens / clock[0], 2),
+            "speedup": round(tokens / clock[0] / baseline_rate, 2),
+            "acceptance_rate": stats["acceptance_rate"],
+            "avg_draft_length": stats["avg_draft_length"],
+            "final_draft_length": stats["draft_length"],
+        }
+    return report
+
+def decode(llama: Any, prompt: str, max_tokens: int) -> Dict[str, Any]:
+    started = time.perf_counter()
+    result = llama.create_completion(prompt, max_tokens=max_tokens, temperature=0.0)
+    elapsed = time.perf_counter() - started
+    return {"text": result["choices"][0]["text"], "tokens": result["usage"]["completion_tokens"], "seconds": elapsed}
+
+def run_real(args: argparse.Namespace) -> Dict[str, Any]:
+    from llama_cpp import Llama
+
+    config = AVAILABLE_MODELS[ModelType(args.model)]
+    draft_path = args.draft or config.draft_model_path
+    if not draft_path:
+        raise SystemExit(f"No draft model configured for '{args.model}'; pass --draft")
+
+    plain = Llama(model_path=config.model_path, n_ctx=config.context_window, verbose=False)
+    baseline = [decode(plain, prompt, args.max_tokens) for prompt in PROMPTS]
+    plain.close()
+
+    draft = LlamaDraft(draft_path, n_ctx=config.context_window, max_draft=args.max_draft)
+    if not draft.compatible_with(config.model_path):
+        raise SystemExit(f"{draft_path} does not share the tokenizer of {config.model_path}")
+    speculative_llama = Llama(model_path=config.model_path, n_ctx=config.context_window, draft_model=draft, verbose=False)
+    speculative = [decode(speculative_llama, prompt, args.max_tokens) for prompt in PROMPTS]
+
+    def rate(runs: List[Dict[str, Any]]) -> float:
+        return sum(run["tokens"] for run in runs) / sum(run["seconds"] for run in runs)
+
+    return {
+        "model": config.name,
+        "draft": draft_path,
+        "baseline_tokens_per_sec": round(rate(baseline), 2),
+        "speculative_tokens_per_sec": round(rate(speculative), 2),
+        "speedup": round(rate(speculative) / rate(baseline), 2),
+        "identical_output": all(a["text"] == b["text"] for a, b in zip(baseline, speculative)),
+        "draft_stats": draft.stats(),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", choices=[t.value for t in ModelType], help="Benchmark a real model and its draft instead of the simulation")
+    parser.add_argument("--draft", help="Draft GGUF (defaults to the model's draft_model_path)")
+    parser.add_argument("--max-tokens", type=int, default=128)
+    parser.add_argument("--max-draft", type=int, default=16)
+    parser.add_argument("--acceptance", type=float, nargs="+", default=[0.9, 0.8, 0.6, 0.4, 0.2], help="Simulated per-token draft accuracy")
+    parser.add_argument("--step-ms", type=float, default=60.0, help="Simulated cost of one target decode step")
+    parser.add_argument("--token-ms", type=float, default=3.0, help="Simulated extra cost per token in a target step")
+    parser.add_argument("--draft-ms", type=float, default=9.0, help="Simulated cost of one draft token")
+    parser.add_argument("--output", type=Path, help="Also write the report as JSON")
+    args = parser.parse_args()
+
+    report = run_real(args) if args.model else run_simulated(args)
+    print(json.dumps(report, indent=2))
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
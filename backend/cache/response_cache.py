@@ -0,0 +1,188 @@
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+from utils.logger import setup_logger
+
+logger = setup_logger("cache")
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+# Namespaces whose prompts are code: case and indentation change their meaning, so keys are exact
+EXACT_NAMESPACES = {"code"}
+
+def normalize_prompt(text: str, exact: bool = False) -> str:
+    """Canonical form used for keys: NFKC, lower case, single spaces, no trailing punctuation.
+
+    With ``exact``, only surrounding whitespace is dropped.
+    """
+    if exact:
+        return text.strip()
+    text = unicodedata.normalize("NFKC", text).lower()
+    text = _WHITESPACE_RE.sub(" ", text).strip()
+    return text.rstrip(" ?!.")
+
+def make_key(namespace: str, model: str, params: Dict[str, Any], prompt: str) -> str:
+    payload = json.dumps(
+        {"ns": namespace, "model": model, "params": params, "prompt": normalize_prompt(prompt, namespace in EXACT_NAMESPACES)},
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class MemoryBackend:
+    """Size-bounded LRU with per-entry expiry."""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any, ttl: float):
+        self._entries[key] = (time.time() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+class SQLiteBackend:
+    """On-disk LRU so cached answers survive restarts (and can be shared by processes)."""
+
+    # Inserts between size checks; the table may overshoot max_entries by this much meanwhile
+    PRUNE_EVERY = 256
+
+    def __init__(self, path: str, max_entries: int = 100000):
+        self.path = path
+        self.max_entries = max_entries
+        self._inserts = 0
+        self._lock = threading.Lock()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS response_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS response_cache_accessed ON response_cache (accessed_at)")
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM response_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                self._conn.execute("DELETE FROM response_cache WHERE key = ?", (key,))
+                return None
+            self._conn.execute("UPDATE response_cache SET accessed_at = ? WHERE key = ?", (now, key))
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Any, ttl: float):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO response_cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now + ttl, now),
+            )
+            self._inserts += 1
+            if self._inserts % self.PRUNE_EVERY:
+                return
+            count = self._conn.execute("SELECT COUNT(*) FROM response_cache").fetchone()[0]
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM response_cache WHERE key IN "
+                    "(SELECT key FROM response_cache ORDER BY accessed_at LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM response_cache").fetchone()[0]
+
+class ResponseCache:
+    """Caches model outputs keyed on model, sampling parameters and normalized prompt.
+
+    A small in-memory LRU always sits in front; when ``db_path`` is given,
+    entries are also written to SQLite and memory misses fall through to it.
+    Sampling at temperatures above ``max_temperature`` is not deterministic
+    enough to reuse, so those calls bypass the cache entirely.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl: float = 3600.0,
+        max_temperature: float = 0.5,
+        db_path: Optional[str] = None,
+        max_disk_entries: int = 100000,
+    ):
+        self.ttl = ttl
+        self.max_temperature = max_temperature
+        self.memory = MemoryBackend(max_entries)
+        self.disk = SQLiteBackend(db_path, max_disk_entries) if db_path else None
+        self.counts: Dict[str, Dict[str, int]] = {}
+
+    def _count(self, namespace: str, outcome: str):
+        counts = self.counts.setdefault(namespace, {"hit": 0, "miss": 0, "bypass": 0})
+        counts[outcome] += 1
+
+    def should_bypass(self, params: Dict[str, Any]) -> bool:
+        return params.get("temperature", 0.0) > self.max_temperature
+
+    def get(self, namespace: str, model: str, params: Dict[str, Any], prompt: str) -> Tuple[Optional[Any], str]:
+        """Return (value, outcome) where outcome is 'hit', 'miss' or 'bypass'."""
+        if self.should_bypass(params):
+            self._count(namespace, "bypass")
+            return None, "bypass"
+        key = make_key(namespace, model, params, prompt)
+        value = self.memory.get(key)
+        if value is None and self.disk is not None:
+            value = self.disk.get(key)
+            if value is not None:
+                self.memory.set(key, value, self.ttl)
+        outcome = "miss" if value is None else "hit"
+        self._count(namespace, outcome)
+        return value, outcome
+
+    def set(self, namespace: str, model: str, params: Dict[str, Any], prompt: str, value: Any, ttl: Optional[float] = None):
+        if self.should_bypass(params):
+            return
+        key = make_key(namespace, model, params, prompt)
+        ttl = self.ttl if ttl is None else ttl
+        self.memory.set(key, value, ttl)
+        if self.disk is not None:
+            try:
+                self.disk.set(key, value, ttl)
+            except sqlite3.Error as e:
+                logger.warning("Could not persist cache entry: %s", e)
+
+    def stats(self) -> Dict[str, Any]:
+        namespaces = {}
+        for namespace, counts in self.counts.items():
+            lookups = counts["hit"] + counts["miss"]
+            namespaces[namespace] = dict(counts, hit_ratio=round(counts["hit"] / lookups, 4) if lookups else 0.0)
+        return {
+            "memory_entries": len(self.memory),
+            "disk_entries": len(self.disk) if self.disk is not None else None,
+            "namespaces": namespaces,
+        }
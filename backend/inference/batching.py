@@ -0,0 +1,343 @@
+import codecs
+import ctypes
+import queue
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Iterator, List, Optional, Sequence, Tuple
+import numpy as np
+from utils.logger import setup_logger
+
+logger = setup_logger("batching")
+
+# Marks the end of a sequence's output queue
+_DONE = object()
+
+class BatchSequence:
+    """One generation request as it moves through the batch engine."""
+
+    def __init__(self, tokens: List[int], max_tokens: int, temperature: float, stop: Sequence[str]):
+        self.tokens = tokens
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.stop = [s for s in stop if s]
+        self.seq_id: Optional[int] = None
+        self.n_past = 0
+        self.generated: List[int] = []
+        self.text = ""
+        self.emitted = 0
+        self.decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self.output: "queue.Queue[Any]" = queue.Queue()
+        self.cancelled = threading.Event()
+        self.finish_reason: Optional[str] = None
+        self.enqueued = time.perf_counter()
+        self.admitted: Optional[float] = None
+
+    @property
+    def prefilling(self) -> bool:
+        return self.n_past < len(self.tokens)
+
+    def push(self, piece: bytes) -> bool:
+        """Append decoded bytes and emit whatever text can no longer turn into a stop sequence.
+
+        Returns True when a stop sequence was hit.
+        """
+        self.text += self.decoder.decode(piece)
+        for stop in self.stop:
+            index = self.text.find(stop, max(0, self.emitted - len(stop) + 1))
+            if index != -1:
+                self.text = self.text[:index]
+                self._emit(len(self.text))
+                return True
+        # Hold back a tail that could still be the start of a stop sequence
+        held = 0
+        for stop in self.stop:
+            for size in range(min(len(stop) - 1, len(self.text)), 0, -1):
+                if self.text.endswith(stop[:size]):
+                    held = max(held, size)
+                    break
+        self._emit(len(self.text) - held)
+        return False
+
+    def _emit(self, upto: int):
+        if upto > self.emitted:
+            self.output.put(self.text[self.emitted:upto])
+            self.emitted = upto
+
+    def finish(self, reason: str, error: Optional[Exception] = None):
+        self.finish_reason = reason
+        if error is None:
+            self.text += self.decoder.decode(b"", final=True)
+            self._emit(len(self.text))
+        self.output.put((_DONE, error))
+
+class LlamaBatchBackend:
+    """Multi-sequence decoding for a loaded ``llama_cpp.Llama``.
+
+    Uses a second llama.cpp context on the same model, so the weights stay
+    shared (and memory-mapped) while each sequence gets its own slice of KV
+    cache. The LangChain client's own context is left untouched.
+    """
+
+    def __init__(self, llama: Any, n_seq: int, n_ctx_per_seq: int, n_batch: int = 512):
+        from llama_cpp import llama_cpp as llama_lib
+        from llama_cpp._internals import LlamaBatch, LlamaContext
+
+        self._lib = llama_lib
+        self.llama = llama
+        self.n_seq = n_seq
+        self.n_ctx_per_seq = n_ctx_per_seq
+        self.n_batch = n_batch
+        self.eos = llama.token_eos()
+        self.n_vocab = llama.n_vocab()
+
+        params = type(llama.context_params).from_buffer_copy(llama.context_params)
+        params.n_ctx = n_ctx_per_seq * n_seq
+        params.n_batch = n_batch
+        params.n_seq_max = n_seq
+        self._ctx = LlamaContext(model=llama._model, params=params, verbose=llama.verbose)
+        self._batch = LlamaBatch(n_tokens=n_batch, embd=0, n_seq_max=n_seq, verbose=llama.verbose)
+
+    def tokenize(self, text: str) -> List[int]:
+        return self.llama.tokenize(text.encode("utf-8"), special=True)
+
+    def detokenize(self, token: int) -> bytes:
+        return self.llama.detokenize([token])
+
+    def decode(self, entries: List[Tuple[int, List[int], int]]) -> List[np.ndarray]:
+        """Decode ``(seq_id, tokens, start_pos)`` entries in one llama.cpp batch.
+
+        Returns the logits after each entry's last token.
+        """
+        batch = self._batch.batch
+        batch.n_tokens = 0
+        last = []
+        for seq_id, tokens, start in entries:
+            for offset, token in enumerate(tokens):
+                i = batch.n_tokens
+                batch.token[i] = token
+                batch.pos[i] = start + offset
+                batch.n_seq_id[i] = 1
+                batch.seq_id[i][0] = seq_id
+                batch.logits[i] = offset == len(tokens) - 1
+                batch.n_tokens += 1
+            last.append(batch.n_tokens - 1)
+        self._ctx.decode(self._batch)
+        logits = []
+        for i in last:
+            pointer = self._lib.llama_get_logits_ith(self._ctx.ctx, i)
+            logits.append(np.ctypeslib.as_array(ctypes.cast(pointer, ctypes.POINTER(ctypes.c_float)), shape=(self.n_vocab,)).copy())
+        return logits
+
+    def release(self, seq_id: int):
+        self._ctx.kv_cache_seq_rm(seq_id, -1, -1)
+
+    def close(self):
+        self._batch.close()
+        self._ctx.close()
+
+def sample(logits: np.ndarray, temperature: float, rng: np.random.Generator, top_k: int = 40, top_p: float = 0.95) -> int:
+    if temperature <= 0:
+        return int(np.argmax(logits))
+    top_k = min(top_k, len(logits))
+    candidates = np.argpartition(logits, -top_k)[-top_k:]
+    scores = logits[candidates].astype(np.float64) / temperature
+    order = np.argsort(scores)[::-1]
+    candidates, scores = candidates[order], scores[order]
+    probs = np.exp(scores - scores[0])
+    probs /= probs.sum()
+    keep = int(np.searchsorted(np.cumsum(probs), top_p)) + 1
+    probs = probs[:keep] / probs[:keep].sum()
+    return int(candidates[rng.choice(keep, p=probs)])
+
+class BatchEngine:
+    """Continuous batching: decodes every active sequence of a model in one batch per step.
+
+    Requests are queued by ``submit`` from any thread. A single engine thread
+    owns the backend; each step it admits waiting requests into free sequence
+    slots, decodes one token for every running sequence (plus a chunk of
+    prompt for sequences still prefilling) and retires finished sequences,
+    so requests join and leave mid-flight. When the engine is idle the first
+    request waits up to ``batch_window`` seconds for others to batch with.
+    """
+
+    def __init__(self, backend: Any, name: str, max_batch_size: int = 4, batch_window: float = 0.01, seed: Optional[int] = None):
+        self.backend = backend
+        self.name = name
+        self.max_batch_size = max_batch_size
+        self.batch_window = batch_window
+        self._rng = np.random.default_rng(seed)
+        self._pending: Deque[BatchSequence] = deque()
+        self._active: List[BatchSequence] = []
+        self._free = list(range(max_batch_size))
+        self._cond = threading.Condition()
+        self._closed = False
+        self.counts = {
+            "submitted": 0,
+            "completed": 0,
+            "cancelled": 0,
+            "failed": 0,
+            "steps": 0,
+            "decode_tokens": 0,
+            "prefill_tokens": 0,
+        }
+        self.total_batch = 0
+        self.max_batch_seen = 0
+        self.total_wait = 0.0
+        self._thread = threading.Thread(target=self._loop, name=f"batch-{name}", daemon=True)
+        self._thread.start()
+
+    def submit(self, prompt: str, max_tokens: int, temperature: float, stop: Optional[Sequence[str]] = None) -> BatchSequence:
+        tokens = self.backend.tokenize(prompt)
+        if not tokens:
+            raise ValueError("Cannot generate from an empty prompt")
+        room = self.backend.n_ctx_per_seq - len(tokens)
+        if room <= 0:
+            raise ValueError(f"Requested tokens ({len(tokens)}) exceed context window of {self.backend.n_ctx_per_seq}")
+        sequence = BatchSequence(tokens, min(max_tokens, room), temperature, stop or [])
+        with self._cond:
+            if self._closed:
+                raise RuntimeError(f"Batch engine for '{self.name}' is closed")
+            self._pending.append(sequence)
+            self.counts["submitted"] += 1
+            self._cond.notify()
+        return sequence
+
+    def stream(self, prompt: str, max_tokens: int, temperature: float, stop: Optional[Sequence[str]] = None) -> Iterator[str]:
+        sequence = self.submit(prompt, max_tokens, temperature, stop)
+        try:
+            while True:
+                item = sequence.output.get()
+                if isinstance(item, tuple) and item[0] is _DONE:
+                    if item[1] is not None:
+                        raise item[1]
+                    return
+                yield item
+        finally:
+            # Consumer went away early: free the slot at the next step
+            if sequence.finish_reason is None:
+                sequence.cancelled.set()
+
+    def generate(self, prompt: str, max_tokens: int, temperature: float, stop: Optional[Sequence[str]] = None) -> str:
+        return "".join(self.stream(prompt, max_tokens, temperature, stop))
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+        self.backend.close()
+
+    def _wait_for_work(self) -> bool:
+        with self._cond:
+            while not self._pending and not self._active and not self._closed:
+                self._cond.wait()
+            if self._closed:
+                return False
+            if not self._active:
+                # Idle start: give concurrent requests a moment to arrive and share the first batch
+                deadline = time.perf_counter() + self.batch_window
+                while len(self._pending) < self.max_batch_size and not self._closed:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+            while self._pending and self._free:
+                sequence = self._pending.popleft()
+                if sequence.cancelled.is_set():
+                    self.counts["cancelled"] += 1
+                    sequence.finish("cancelled")
+                    continue
+                sequence.seq_id = self._free.pop()
+                sequence.admitted = time.perf_counter()
+                self.total_wait += sequence.admitted - sequence.enqueued
+                self._active.append(sequence)
+            return True
+
+    def _retire(self, sequence: BatchSequence, reason: str, error: Optional[Exception] = None):
+        self._active.remove(sequence)
+        self.backend.release(sequence.seq_id)
+        self._free.append(sequence.seq_id)
+        sequence.finish(reason, error)
+        if error is not None:
+            self.counts["failed"] += 1
+        elif reason == "cancelled":
+            self.counts["cancelled"] += 1
+        else:
+            self.counts["completed"] += 1
+
+    def _loop(self):
+        while self._wait_for_work():
+            for sequence in [s for s in self._active if s.cancelled.is_set()]:
+                self._retire(sequence, "cancelled")
+            if not self._active:
+                continue
+            try:
+                self._step()
+            except Exception as e:
+                logger.error("Batch step failed for '%s': %s", self.name, e, exc_info=True)
+                for sequence in list(self._active):
+                    self._retire(sequence, "error", e)
+        with self._cond:
+            for sequence in self._active + list(self._pending):
+                sequence.finish("error", RuntimeError(f"Batch engine for '{self.name}' is closed"))
+
+    def _step(self):
+        # Decoding sequences go first (one token each); prefill chunks share what is left of the batch
+        budget = self.backend.n_batch
+        entries, scheduled = [], []
+        for sequence in self._active:
+            if not sequence.prefilling:
+                entries.append((sequence.seq_id, [sequence.generated[-1]], sequence.n_past))
+                scheduled.append(sequence)
+                budget -= 1
+        for sequence in self._active:
+            if sequence.prefilling and budget > 0:
+                chunk = sequence.tokens[sequence.n_past:sequence.n_past + budget]
+                entries.append((sequence.seq_id, chunk, sequence.n_past))
+                scheduled.append(sequence)
+                budget -= len(chunk)
+
+        logits = self.backend.decode(entries)
+        self.counts["steps"] += 1
+        self.total_batch += len(entries)
+        self.max_batch_seen = max(self.max_batch_seen, len(entries))
+
+        for sequence, (_, tokens, _), row in zip(scheduled, entries, logits):
+            was_prefilling = sequence.prefilling
+            sequence.n_past += len(tokens)
+            self.counts["prefill_tokens" if was_prefilling else "decode_tokens"] += len(tokens)
+            if sequence.prefilling:
+                continue  # Mid-prompt chunk; nothing to sample yet
+            token = sample(row, sequence.temperature, self._rng)
+            if token == self.backend.eos:
+                self._retire(sequence, "stop")
+                continue
+            sequence.generated.append(token)
+            if sequence.push(self.backend.detokenize(token)):
+                self._retire(sequence, "stop")
+            elif len(sequence.generated) >= sequence.max_tokens:
+                self._retire(sequence, "length")
+
+    def stats(self) -> Dict[str, Any]:
+        steps = self.counts["steps"]
+        admitted = self.counts["submitted"] - len(self._pending)
+        return dict(
+            self.counts,
+            active=len(self._active),
+            pending=len(self._pending),
+            max_batch_size=self.max_batch_size,
+            batch_window_ms=round(self.batch_window * 1000, 2),
+            avg_batch=round(self.total_batch / steps, 2) if steps else 0.0,
+            max_batch=self.max_batch_seen,
+            avg_admit_wait_ms=round(self.total_wait / admitted * 1000, 2) if admitted else 0.0,
+        )
+
+def create_batch_engine(config: Any, llm: Any) -> Optional[BatchEngine]:
+    """Default factory: a batch engine over the LangChain LlamaCpp model's llama.cpp client."""
+    client = getattr(llm, "client", None)
+    if client is None or not hasattr(client, "context_params"):
+        return None
+    backend = LlamaBatchBackend(client, n_seq=config.max_batch_size, n_ctx_per_seq=config.context_window)
+    logger.info("Batching '%s' (max_batch_size=%d, window=%sms)", config.name, config.max_batch_size, config.batch_window_ms)
+    return BatchEngine(backend, config.name, config.max_batch_size, config.batch_window_ms / 1000)
@@ -0,0 +1,144 @@
+import json
+import re
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from utils.metrics import current_trace, metrics
+
+WASTED_TOKENS = metrics.counter("llmagent_wasted_decode_tokens_total", "Decoded tokens that were discarded (trailing chatter, truncated fragments) by call kind.", ["kind"])
+TRUNCATED = metrics.counter("llmagent_generation_truncated_total", "Generations that hit their token budget by call kind.", ["kind"])
+
+# Fallback when a model exposes no tokenizer (e.g. the benchmark fakes)
+CHARS_PER_TOKEN = 4
+
+class GenerationProfile(NamedTuple):
+    """Decoding settings for one kind of model call."""
+    max_tokens: int
+    temperature: Optional[float] = None
+    stop: Optional[List[str]] = None
+    grammar: Optional[str] = None  # GBNF; ignored by models without grammar support
+
+    def params(self, model_temperature: float) -> Dict[str, Any]:
+        """Sampling parameters that change the output, for response cache keys."""
+        temperature = self.temperature if self.temperature is not None else model_temperature
+        return {"temperature": temperature, "max_tokens": self.max_tokens, "grammar": bool(self.grammar)}
+
+    def kwargs(self) -> Dict[str, Any]:
+        """Keyword arguments for ``ModelRegistry.invoke``/``stream``."""
+        kwargs: Dict[str, Any] = {"max_tokens": self.max_tokens}
+        if self.temperature is not None:
+            kwargs["temperature"] = self.temperature
+        if self.stop:
+            kwargs["stop"] = self.stop
+        if self.grammar:
+            kwargs["grammar"] = self.grammar
+        return kwargs
+
+# One-line {"category": ..., "reason": ...}; the reason is capped so the object always fits the budget
+CLASSIFICATION_GRAMMAR = r'''
+root ::= "{" ws "\"category\":" ws category "," ws "\"reason\":" ws reason ws "}"
+category ::= "\"CODE\"" | "\"TOOL\"" | "\"GENERAL\""
+reason ::= "\"" [^"\\\n]{0,120} "\""
+ws ::= " "?
+'''
+
+PROFILES: Dict[str, GenerationProfile] = {
+    "classification": GenerationProfile(max_tokens=64, temperature=0.0, stop=["\n\n"], grammar=CLASSIFICATION_GRAMMAR),
+}
+
+# Answer budgets per route: (brief, default, detailed); always capped by the model's max_tokens
+ROUTE_BUDGETS: Dict[str, Tuple[int, int, int]] = {
+    "general": (128, 320, 500),
+    "code": (384, 1024, 4000),
+}
+
+BRIEF_REQUEST = re.compile(
+    r"\b(brief(ly)?|short|concise(ly)?|quick(ly)?|one (word|line|sentence)|in (a|one) (word|line|sentence)"
+    r"|in a few words|yes or no|tl;?dr|just (the|a) (answer|name|number))\b", re.I)
+DETAILED_REQUEST = re.compile(
+    r"\b(in detail|detailed|in depth|step[- ]by[- ]step|thorough(ly)?|comprehensive|essay|tutorial|walk me through"
+    r"|full (program|implementation|example|code)|complete (program|implementation|example|guide)|explain (everything|all))\b"
+    r"|```", re.I)
+
+def answer_profile(route: str, text: str, model_max_tokens: int) -> Tuple[str, int]:
+    """The answer size the query asks for ("brief", "default" or "detailed") and its token budget."""
+    brief, default, detailed = ROUTE_BUDGETS.get(route, (model_max_tokens,) * 3)
+    if DETAILED_REQUEST.search(text):
+        name, budget = "detailed", detailed
+    elif BRIEF_REQUEST.search(text):
+        name, budget = "brief", brief
+    else:
+        name, budget = "default", default
+    return name, min(budget, model_max_tokens)
+
+def route_budget(route: str, text: str, model_max_tokens: int) -> int:
+    """Answer token budget sized to what the query asks for."""
+    return answer_profile(route, text, model_max_tokens)[1]
+
+class GenerationUsage:
+    """Token accounting for one model call, filled in by the registry on the model's worker."""
+
+    def __init__(self):
+        self.max_tokens = 0
+        self.prompt_tokens = 0
+        self.prompt_trimmed_tokens = 0
+        self.completion_tokens = 0
+        self.truncated = False
+        self.wasted_tokens = 0
+
+    def discard(self, kind: str, dropped: str, output: str):
+        """Account for ``dropped``, the part of ``output`` nobody will read, as wasted decode tokens."""
+        if not dropped or not output:
+            return
+        tokens = round(self.completion_tokens * len(dropped) / len(output)) if self.completion_tokens else len(dropped) // CHARS_PER_TOKEN
+        if tokens <= 0:
+            return
+        self.wasted_tokens += tokens
+        WASTED_TOKENS.inc(tokens, kind=kind)
+        trace = current_trace.get()
+        if trace is not None:
+            trace.wasted_tokens += tokens
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "max_tokens": self.max_tokens,
+            "prompt_tokens": self.prompt_tokens,
+            "prompt_trimmed_tokens": self.prompt_trimmed_tokens,
+            "completion_tokens": self.completion_tokens,
+            "truncated": self.truncated,
+            "wasted_tokens": self.wasted_tokens,
+        }
+
+def parse_json_object(text: str, usage: Optional[GenerationUsage] = None, kind: str = "classification") -> Dict[str, Any]:
+    """The first JSON object in ``text`` (code fences and surrounding chatter are skipped).
+
+    Raises ``ValueError`` when there is none. Whatever follows the object
+    was decoded for nothing and is counted as waste on ``usage``.
+    """
+    start = text.find("{")
+    if start == -1:
+        raise ValueError(f"No JSON object in {text[:80]!r}")
+    value, end = json.JSONDecoder().raw_decode(text, start)
+    if not isinstance(value, dict):
+        raise ValueError(f"Expected a JSON object, got {type(value).__name__}")
+    trailing = text[end:].strip()
+    if trailing.startswith("```"):
+        trailing = trailing[3:].strip()
+    if usage is not None:
+        usage.discard(kind, trailing, text)
+    return value
+
+SENTENCE_END = re.compile(r"[.!?:;)\]](?=\s|$)|\n")
+
+def finish_truncated(route: str, text: str, usage: GenerationUsage) -> str:
+    """Tidy an answer that ran out of budget: close an open code fence, or drop the unfinished sentence."""
+    if not usage.truncated:
+        return text
+    TRUNCATED.inc(kind=route)
+    if text.count("```") % 2:
+        return text.rstrip() + "\n```"
+    ends = [match.end() for match in SENTENCE_END.finditer(text)]
+    # Only cut back when most of the answer survives; otherwise the fragment is better than nothing
+    if ends and ends[-1] >= len(text) * 0.6:
+        kept = text[:ends[-1]].rstrip()
+        usage.discard(route, text[len(kept):].strip(), text)
+        return kept
+    return text
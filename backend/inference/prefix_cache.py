@@ -0,0 +1,129 @@
+import hashlib
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from utils.logger import setup_logger
+
+logger = setup_logger("prefix_cache")
+
+def prefix_key(tokens: Sequence[int]) -> Tuple[int, str]:
+    digest = hashlib.blake2b(np.asarray(tokens, dtype=np.int32).tobytes(), digest_size=16).hexdigest()
+    return len(tokens), digest
+
+class PrefixStateCache:
+    """Reuses llama.cpp KV state for prompt prefixes that repeat across requests.
+
+    Snapshots are taken at ``markers`` (e.g. the end of the agent's static
+    system prompt and tool list, and the end of a session's history) and
+    kept in an LRU bounded by ``capacity_bytes``, keyed by a hash of the
+    token prefix. Before a generation the longest stored prefix of the
+    prompt is restored, so llama.cpp only prefills the remainder.
+
+    Must only be used from the model's own worker thread.
+    """
+
+    def __init__(self, capacity_bytes: int, markers: Sequence[str] = ()):
+        self.capacity_bytes = capacity_bytes
+        self.markers = list(markers)
+        self._states: "OrderedDict[Tuple[int, str], Any]" = OrderedDict()
+        self._bytes = 0
+        self.counts = {
+            "requests": 0,
+            "hits": 0,
+            "prompt_tokens": 0,
+            "prefill_tokens_saved": 0,
+            "snapshots": 0,
+            "evictions": 0,
+        }
+        self.last_saved = 0
+
+    def clear(self):
+        self._states.clear()
+        self._bytes = 0
+
+    def _lookup(self, tokens: Sequence[int]) -> Tuple[Optional[Any], int]:
+        # Probe each stored prefix length, longest first; only a handful exist
+        for length in sorted({length for length, _ in self._states}, reverse=True):
+            if length > len(tokens):
+                continue
+            key = prefix_key(tokens[:length])
+            if key in self._states:
+                self._states.move_to_end(key)
+                return self._states[key], length
+        return None, 0
+
+    def _store(self, tokens: Sequence[int], state: Any):
+        key = prefix_key(tokens)
+        size = getattr(state, "llama_state_size", 0)
+        if size > self.capacity_bytes:
+            return
+        if key in self._states:
+            self._bytes -= getattr(self._states.pop(key), "llama_state_size", 0)
+        self._states[key] = state
+        self._bytes += size
+        self.counts["snapshots"] += 1
+        while self._bytes > self.capacity_bytes and self._states:
+            _, evicted = self._states.popitem(last=False)
+            self._bytes -= getattr(evicted, "llama_state_size", 0)
+            self.counts["evictions"] += 1
+
+    def _boundaries(self, client: Any, prompt: str, tokens: List[int]) -> List[int]:
+        """Token counts at which to snapshot: each marker found in the prompt, if it tokenizes cleanly."""
+        boundaries = []
+        for marker in self.markers:
+            index = prompt.find(marker)
+            if index <= 0:
+                continue
+            prefix = client.tokenize(prompt[:index].encode("utf-8"), special=True)
+            # BPE can merge across the cut; only snapshot when the prefix is a true token prefix
+            if 0 < len(prefix) < len(tokens) and list(tokens[:len(prefix)]) == list(prefix):
+                boundaries.append(len(prefix))
+        return sorted(set(boundaries))
+
+    def prepare(self, client: Any, prompt: str) -> int:
+        """Restore the best cached prefix into ``client`` (a ``llama_cpp.Llama``) and snapshot new boundaries.
+
+        Returns the number of prompt tokens that will not need prefill.
+        """
+        tokens = client.tokenize(prompt.encode("utf-8"), special=True)
+        self.counts["requests"] += 1
+        self.counts["prompt_tokens"] += len(tokens)
+
+        # Tokens already live in the context (e.g. the previous ReAct step) are reused by llama.cpp itself
+        live = 0
+        if client.n_tokens > 0:
+            live = client.longest_token_prefix(client.input_ids[:client.n_tokens].tolist(), tokens)
+
+        state, cached = self._lookup(tokens)
+        if state is not None and cached > live:
+            client.load_state(state)
+            self.counts["hits"] += 1
+            live = cached
+
+        reused = live
+        # Prefill up to each new boundary now and snapshot it; generate() then continues from here
+        client.n_tokens = live
+        for boundary in self._boundaries(client, prompt, tokens):
+            if boundary <= live:
+                continue
+            if prefix_key(tokens[:boundary]) in self._states:
+                continue
+            client.eval(tokens[live:boundary])
+            live = boundary
+            self._store(tokens[:boundary], client.save_state())
+
+        self.counts["prefill_tokens_saved"] += reused
+        self.last_saved = reused
+        logger.debug("Reusing %d/%d prompt tokens from cached state", reused, len(tokens))
+        return reused
+
+    def stats(self) -> Dict[str, Any]:
+        requests = self.counts["requests"]
+        return dict(
+            self.counts,
+            entries=len(self._states),
+            bytes=self._bytes,
+            capacity_bytes=self.capacity_bytes,
+            avg_prefill_tokens_saved=round(self.counts["prefill_tokens_saved"] / requests, 1) if requests else 0.0,
+            last_prefill_tokens_saved=self.last_saved,
+        )
@@ -0,0 +1,377 @@
+import gc
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from langchain_community.llms import LlamaCpp
+from langchain.callbacks.manager import CallbackManager
+from langchain.callbacks.streaming_stdout import StreamingStdOutCallbackHandler
+from inference.batching import BatchEngine, create_batch_engine
+from inference.budget import CHARS_PER_TOKEN, GenerationUsage
+from inference.prefix_cache import PrefixStateCache
+from inference.speculative import SpeculativeDraft, create_draft
+from models.configs.model_config import LLAMA_THREADS, LLAMA_VERBOSE, ModelConfig, ModelType
+from utils.logger import setup_logger
+from utils.metrics import RATE_BUCKETS, metrics
+
+logger = setup_logger("registry")
+
+LLM_CALLS = metrics.counter("llmagent_llm_calls_total", "Model calls by model, call kind and outcome.", ["model", "kind", "status"])
+LLM_GENERATION_SECONDS = metrics.histogram("llmagent_llm_generation_seconds", "Wall time of a model call on its worker, including prefill.", ["model", "kind"])
+LLM_TTFT_SECONDS = metrics.histogram("llmagent_llm_ttft_seconds", "Time from the start of a streamed model call to its first token.", ["model"])
+LLM_TOKENS_PER_SECOND = metrics.histogram("llmagent_llm_tokens_per_second", "Decode rate of streamed model calls, excluding the first token.", ["model"], buckets=RATE_BUCKETS)
+LLM_TOKENS = metrics.counter("llmagent_llm_streamed_tokens_total", "Tokens streamed per model.", ["model"])
+MODEL_LOAD_SECONDS = metrics.histogram("llmagent_model_load_seconds", "Time to load a model's weights.", ["model"])
+PROMPT_TRIMMED_TOKENS = metrics.counter("llmagent_prompt_trimmed_tokens_total", "Prompt tokens cut so a prompt fits the model's context window.", ["model"])
+
+# A prompt is trimmed rather than leave less than this much room to answer
+MIN_REPLY_TOKENS = 64
+
+def create_llm(config: ModelConfig) -> Any:
+    """Default factory: a LlamaCpp model with weights memory-mapped from the GGUF file."""
+    # Batched models decode in the batch engine, which does not speculate
+    draft = create_draft(config) if config.max_batch_size == 1 else None
+    return LlamaCpp(
+        model_path=config.model_path,
+        callback_manager=CallbackManager([StreamingStdOutCallbackHandler()] if LLAMA_VERBOSE else []),
+        temperature=config.temperature,
+        max_tokens=config.max_tokens,
+        n_ctx=config.context_window,
+        n_threads=LLAMA_THREADS,
+        # mmap lets the OS share weight pages (and drop them under pressure) instead of copying into the heap
+        use_mmap=True,
+        use_mlock=False,
+        verbose=LLAMA_VERBOSE,
+        # llama.cpp verifies the draft's proposals in one batch per step
+        model_kwargs={"draft_model": draft} if draft is not None else {},
+    )
+
+def process_rss_bytes() -> Optional[int]:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+class LoadedModel:
+    def __init__(self, llm: Any, size_bytes: int, load_seconds: float, engine: Optional[BatchEngine] = None):
+        self.llm = llm
+        self.engine = engine
+        self.size_bytes = size_bytes
+        self.load_seconds = load_seconds
+        self.loaded_at = time.time()
+        self.last_used = time.time()
+        self.in_use = 0
+
+class ModelRegistry:
+    """Loads models on first use and unloads them when idle or over the memory budget.
+
+    Loading happens on whichever thread first leases the model, which in the
+    API is that model's scheduler worker, so the event loop never blocks on
+    reading weights. A model is never unloaded while a lease is held.
+    """
+
+    def __init__(
+        self,
+        configs: Dict[ModelType, ModelConfig],
+        memory_budget_bytes: int,
+        llm_factory: Callable[[ModelConfig], Any] = create_llm,
+        prefix_caches: Optional[Dict[ModelType, PrefixStateCache]] = None,
+        engine_factory: Callable[[ModelConfig, Any], Optional[BatchEngine]] = create_batch_engine,
+    ):
+        self.configs = configs
+        self.memory_budget_bytes = memory_budget_bytes
+        self.llm_factory = llm_factory
+        self.engine_factory = engine_factory
+        self.prefix_caches = prefix_caches or {}
+        self._loaded: Dict[ModelType, LoadedModel] = {}
+        self._lock = threading.Lock()
+        self._load_locks = {model_type: threading.Lock() for model_type in configs}
+        self.loads = {model_type: 0 for model_type in configs}
+        self.unloads = {model_type: 0 for model_type in configs}
+        self._grammars: Dict[str, Any] = {}
+
+    def model_size(self, model_type: ModelType) -> int:
+        """Resident size estimate: the GGUF files (model and draft), which is what mmap pages in,
+        plus the KV cache of each llama.cpp context and the prefix cache's snapshot memory."""
+        config = self.configs[model_type]
+        size = 0
+        for path in (config.model_path, config.draft_model_path):
+            try:
+                size += os.path.getsize(path) if path else 0
+            except OSError:
+                pass
+        # The batch engine decodes on its own context of max_batch_size sequences next to the serial one
+        context_tokens = config.context_window * (1 + (config.max_batch_size if config.max_batch_size > 1 else 0))
+        size += context_tokens * config.kv_bytes_per_token
+        if model_type in self.prefix_caches:
+            size += self.prefix_caches[model_type].capacity_bytes
+        return size
+
+    @contextmanager
+    def lease(self, model_type: ModelType) -> Iterator[Any]:
+        """Yield the loaded model, loading it first if needed, and pin it for the duration."""
+        with self._lease_entry(model_type) as entry:
+            yield entry.llm
+
+    @contextmanager
+    def _lease_entry(self, model_type: ModelType) -> Iterator[LoadedModel]:
+        entry = self._acquire(model_type)
+        try:
+            yield entry
+        finally:
+            with self._lock:
+                entry.in_use -= 1
+                entry.last_used = time.time()
+
+    def invoke(self, model_type: ModelType, prompt: str, usage: Optional[GenerationUsage] = None, **kwargs) -> str:
+        """Generate a completion; ``usage``, if given, receives the call's token accounting."""
+        started = time.perf_counter()
+        status = "error"
+        usage = usage if usage is not None else GenerationUsage()
+        try:
+            with self._lease_entry(model_type) as entry:
+                prompt, kwargs = self._fit(model_type, entry, prompt, kwargs, usage)
+                if entry.engine is not None:
+                    result = entry.engine.generate(prompt, **self._generation_args(model_type, kwargs))
+                else:
+                    self._restore_prefix(model_type, entry.llm, prompt)
+                    result = entry.llm.invoke(prompt, **kwargs)
+                usage.completion_tokens = self._count_tokens(entry.llm, result)
+            # Re-tokenizing the output can merge a token or two, so allow for that at the limit
+            usage.truncated = usage.completion_tokens >= usage.max_tokens - 1
+            status = "ok"
+            return result
+        finally:
+            LLM_CALLS.inc(model=model_type.value, kind="invoke", status=status)
+            LLM_GENERATION_SECONDS.observe(time.perf_counter() - started, model=model_type.value, kind="invoke")
+
+    def stream(self, model_type: ModelType, prompt: str, usage: Optional[GenerationUsage] = None, **kwargs) -> Iterator[str]:
+        """Stream a completion token by token; ``usage``, if given, receives the call's token accounting."""
+        started = time.perf_counter()
+        first_token_at = None
+        tokens = 0
+        status = "error"
+        usage = usage if usage is not None else GenerationUsage()
+        try:
+            with self._lease_entry(model_type) as entry:
+                prompt, kwargs = self._fit(model_type, entry, prompt, kwargs, usage)
+                if entry.engine is not None:
+                    chunks = entry.engine.stream(prompt, **self._generation_args(model_type, kwargs))
+                else:
+                    self._restore_prefix(model_type, entry.llm, prompt)
+                    chunks = entry.llm.stream(prompt, **kwargs)
+                for chunk in chunks:
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                        LLM_TTFT_SECONDS.observe(first_token_at - started, model=model_type.value)
+                    tokens += 1
+                    usage.completion_tokens = tokens
+                    yield chunk
+            usage.truncated = tokens >= usage.max_tokens
+            status = "ok"
+        except GeneratorExit:
+            # The consumer stopped early (e.g. the client disconnected)
+            status = "cancelled"
+            raise
+        finally:
+            finished = time.perf_counter()
+            LLM_CALLS.inc(model=model_type.value, kind="stream", status=status)
+            LLM_GENERATION_SECONDS.observe(finished - started, model=model_type.value, kind="stream")
+            LLM_TOKENS.inc(tokens, model=model_type.value)
+            if tokens > 1 and finished > first_token_at:
+                LLM_TOKENS_PER_SECOND.observe((tokens - 1) / (finished - first_token_at), model=model_type.value)
+
+    def _generation_args(self, model_type: ModelType, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        config = self.configs[model_type]
+        return {
+            "max_tokens": kwargs.get("max_tokens", config.max_tokens),
+            "temperature": kwargs.get("temperature", config.temperature),
+            "stop": kwargs.get("stop"),
+        }
+
+    @staticmethod
+    def _tokenizer(llm: Any) -> Optional[Any]:
+        """The llama.cpp client, for models that have one."""
+        client = getattr(llm, "client", None)
+        return client if client is not None and hasattr(client, "tokenize") else None
+
+    def _count_tokens(self, llm: Any, text: str) -> int:
+        client = self._tokenizer(llm)
+        if client is None:
+            return -(-len(text) // CHARS_PER_TOKEN)
+        return len(client.tokenize(text.encode("utf-8"), add_bos=False, special=True))
+
+    def _fit(self, model_type: ModelType, entry: LoadedModel, prompt: str, kwargs: Dict[str, Any], usage: GenerationUsage) -> Tuple[str, Dict[str, Any]]:
+        """Make prompt plus answer fit the context window, and resolve per-call decoding options.
+
+        The answer budget shrinks to the room left after the prompt. If that
+        would leave less than ``MIN_REPLY_TOKENS``, the middle of the prompt
+        is cut instead: the start holds the instructions and the end holds
+        the question, while the middle is usually old history or long
+        documents.
+        """
+        config = self.configs[model_type]
+        client = self._tokenizer(entry.llm)
+        max_tokens = kwargs.get("max_tokens", config.max_tokens)
+        if client is not None:
+            tokens = client.tokenize(prompt.encode("utf-8"), add_bos=False, special=True)
+            n_prompt = len(tokens) + 1  # BOS
+        else:
+            tokens = None
+            n_prompt = -(-len(prompt) // CHARS_PER_TOKEN)
+        reply_floor = min(max_tokens, MIN_REPLY_TOKENS)
+        if config.context_window - n_prompt < reply_floor:
+            keep = config.context_window - reply_floor - 8  # room for the elision marker
+            head = keep // 4
+            tail = keep - head
+            if tokens is not None:
+                text = lambda part: client.detokenize(part).decode("utf-8", errors="ignore")
+                prompt = text(tokens[:head]) + "\n...\n" + text(tokens[len(tokens) - tail:])
+            else:
+                prompt = prompt[:head * CHARS_PER_TOKEN] + "\n...\n" + prompt[len(prompt) - tail * CHARS_PER_TOKEN:]
+            usage.prompt_trimmed_tokens = n_prompt - keep
+            PROMPT_TRIMMED_TOKENS.inc(usage.prompt_trimmed_tokens, model=model_type.value)
+            logger.warning("Prompt of %d tokens exceeds the context window of '%s'; cut %d tokens from the middle", n_prompt, config.name, usage.prompt_trimmed_tokens)
+            n_prompt = keep + 8
+        usage.prompt_tokens = n_prompt
+        usage.max_tokens = max(1, min(max_tokens, config.context_window - n_prompt))
+
+        kwargs = dict(kwargs, max_tokens=usage.max_tokens)
+        grammar = kwargs.pop("grammar", None)
+        if grammar and client is not None and entry.engine is None:
+            kwargs["grammar"] = self._grammar(grammar)
+        return prompt, kwargs
+
+    def _grammar(self, source: str) -> Any:
+        from llama_cpp import LlamaGrammar
+
+        with self._lock:
+            grammar = self._grammars.get(source)
+            if grammar is None:
+                grammar = self._grammars[source] = LlamaGrammar.from_string(source, verbose=LLAMA_VERBOSE)
+        return grammar
+
+    def _restore_prefix(self, model_type: ModelType, llm: Any, prompt: str):
+        cache = self.prefix_caches.get(model_type)
+        client = getattr(llm, "client", None)
+        # Only llama.cpp models expose KV state; anything else just prefills as usual
+        if cache is not None and client is not None and hasattr(client, "save_state"):
+            cache.prepare(client, prompt)
+
+    def load(self, model_type: ModelType):
+        with self.lease(model_type):
+            pass
+
+    def _acquire(self, model_type: ModelType) -> LoadedModel:
+        # Per-model lock so two callers never load the same weights twice
+        with self._load_locks[model_type]:
+            with self._lock:
+                entry = self._loaded.get(model_type)
+                if entry is not None:
+                    entry.in_use += 1
+                    return entry
+
+            size = self.model_size(model_type)
+            self._make_room(size, exclude=model_type)
+            config = self.configs[model_type]
+            logger.info("Loading model '%s' from %s", config.name, config.model_path)
+            started = time.perf_counter()
+            llm = self.llm_factory(config)
+            engine = self.engine_factory(config, llm) if config.max_batch_size > 1 else None
+            entry = LoadedModel(llm, size, time.perf_counter() - started, engine)
+            entry.in_use = 1
+            with self._lock:
+                self._loaded[model_type] = entry
+                self.loads[model_type] += 1
+            MODEL_LOAD_SECONDS.observe(entry.load_seconds, model=model_type.value)
+            logger.info("Loaded model '%s' in %.2fs", config.name, entry.load_seconds)
+            return entry
+
+    def _make_room(self, needed: int, exclude: ModelType):
+        """Unload idle models, least recently used first, until ``needed`` fits the budget."""
+        with self._lock:
+            resident = sum(entry.size_bytes for entry in self._loaded.values())
+            candidates = sorted(
+                (t for t, e in self._loaded.items() if t != exclude and e.in_use == 0),
+                key=lambda t: self._loaded[t].last_used,
+            )
+        for model_type in candidates:
+            if resident + needed <= self.memory_budget_bytes:
+                break
+            freed = self.unload(model_type, reason="memory budget")
+            resident -= freed or 0
+        if resident + needed > self.memory_budget_bytes:
+            logger.warning(
+                "Loading past the memory budget: %.0f MB > %.0f MB (remaining models are in use)",
+                (resident + needed) / 2**20, self.memory_budget_bytes / 2**20,
+            )
+
+    def unload(self, model_type: ModelType, reason: str = "requested") -> Optional[int]:
+        """Drop a model if it is not in use; returns the bytes freed, or None if nothing was unloaded."""
+        with self._lock:
+            entry = self._loaded.get(model_type)
+            if entry is None or entry.in_use > 0:
+                return None
+            del self._loaded[model_type]
+            self.unloads[model_type] += 1
+        if model_type in self.prefix_caches:
+            # Snapshots belong to the freed context
+            self.prefix_caches[model_type].clear()
+        if entry.engine is not None:
+            entry.engine.close()
+        client = getattr(entry.llm, "client", None)
+        if client is not None and hasattr(client, "close"):
+            client.close()
+        del entry.llm
+        gc.collect()
+        logger.info("Unloaded model '%s' (%s)", self.configs[model_type].name, reason)
+        return entry.size_bytes
+
+    def unload_idle(self) -> List[ModelType]:
+        now = time.time()
+        with self._lock:
+            idle = [
+                t for t, e in self._loaded.items()
+                if e.in_use == 0
+                and self.configs[t].idle_timeout is not None
+                and now - e.last_used > self.configs[t].idle_timeout
+            ]
+        return [t for t in idle if self.unload(t, reason="idle") is not None]
+
+    def is_loaded(self, model_type: ModelType) -> bool:
+        return model_type in self._loaded
+
+    @staticmethod
+    def _draft_stats(entry: Optional[LoadedModel]) -> Optional[Dict[str, Any]]:
+        draft = getattr(getattr(entry.llm, "client", None), "draft_model", None) if entry else None
+        return draft.stats() if isinstance(draft, SpeculativeDraft) else None
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.time()
+        with self._lock:
+            models = {}
+            for model_type, config in self.configs.items():
+                entry = self._loaded.get(model_type)
+                models[model_type.value] = {
+                    "name": config.name,
+                    "loaded": entry is not None,
+                    "in_use": entry.in_use if entry else 0,
+                    "resident_bytes": entry.size_bytes if entry else 0,
+                    "load_seconds": round(entry.load_seconds, 3) if entry else None,
+                    "idle_seconds": round(now - entry.last_used, 1) if entry else None,
+                    "idle_timeout": config.idle_timeout,
+                    "loads": self.loads[model_type],
+                    "unloads": self.unloads[model_type],
+                    "prefix_cache": self.prefix_caches[model_type].stats() if model_type in self.prefix_caches else None,
+                    "batching": entry.engine.stats() if entry and entry.engine else None,
+                    "speculative": self._draft_stats(entry),
+                }
+            resident = sum(entry.size_bytes for entry in self._loaded.values())
+        return {
+            "models": models,
+            "resident_bytes": resident,
+            "memory_budget_bytes": self.memory_budget_bytes,
+            "process_rss_bytes": process_rss_bytes(),
+        }
@@ -0,0 +1,50 @@
+from typing import Any, List, Optional
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.llms import LLM
+
+class ScheduledLLM(LLM):
+    """LangChain LLM that runs a registry model on its scheduler worker.
+
+    Lets LangChain components (e.g. the agent executor) share a model with the
+    API handlers without blocking the event loop or touching the llama.cpp
+    context from two threads at once. The model itself is only loaded when
+    the first call reaches the worker.
+    """
+
+    registry: Any
+    scheduler: Any
+    model_type: Any
+
+    @property
+    def model(self) -> str:
+        return self.model_type.value
+
+    @property
+    def _llm_type(self) -> str:
+        return "scheduled"
+
+    def _call(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> str:
+        return self.scheduler.worker(self.model).run_sync(self.registry.invoke, self.model_type, prompt, stop=stop, **kwargs)
+
+    async def _acall(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> str:
+        if run_manager is None or not run_manager.handlers:
+            return await self.scheduler.run(self.model, self.registry.invoke, self.model_type, prompt, stop=stop, **kwargs)
+
+        # Stream from the worker so callbacks (e.g. SSE handlers) see tokens as they are decoded
+        chunks = []
+        async for chunk in self.scheduler.stream(self.model, self.registry.stream, self.model_type, prompt, stop=stop, **kwargs):
+            chunks.append(chunk)
+            await run_manager.on_llm_new_token(chunk)
+        return "".join(chunks)
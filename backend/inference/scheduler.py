@@ -0,0 +1,198 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, Optional
+from utils.logger import setup_logger
+from utils.metrics import metrics, observe_stage
+
+logger = setup_logger("scheduler")
+
+QUEUE_WAIT_SECONDS = metrics.histogram("llmagent_queue_wait_seconds", "Time a model call waited for a free slot on its worker.", ["model"])
+
+# Marks the end of a streamed generation
+_END = object()
+
+class QueueFullError(Exception):
+    """Raised when a model's admission queue cannot take another request."""
+
+    def __init__(self, model: str, depth: int):
+        super().__init__(f"Inference queue for '{model}' is full ({depth} requests waiting)")
+        self.model = model
+        self.depth = depth
+
+class QueueTimeoutError(Exception):
+    """Raised when a request waited too long for a free model slot."""
+
+    def __init__(self, model: str, waited: float):
+        super().__init__(f"Timed out after {waited:.1f}s waiting for model '{model}'")
+        self.model = model
+        self.waited = waited
+
+class ModelWorker:
+    """Dedicated executor plus bounded admission queue for a single model.
+
+    llama.cpp contexts are not thread-safe, so every call for a model runs on
+    that model's own executor. Requests wait on the event loop (not in a
+    thread) until a slot frees up, which keeps queue accounting lock-free.
+    """
+
+    def __init__(self, name: str, max_concurrency: int = 1, max_queue: int = 16, queue_timeout: float = 30.0):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix=f"llm-{name}")
+        self._slots: Optional[asyncio.Semaphore] = None
+
+        self.waiting = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.total_run = 0.0
+
+    async def _admit(self):
+        """Wait for a free slot, enforcing the queue bound and timeout."""
+        if self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise QueueFullError(self.name, self.waiting)
+
+        if self._slots is None:
+            # Created lazily so the semaphore binds to the serving event loop
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+
+        enqueued = time.perf_counter()
+        if self._slots.locked() or self.waiting:
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._slots.acquire(), timeout=self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.timed_out += 1
+                raise QueueTimeoutError(self.name, time.perf_counter() - enqueued)
+            finally:
+                self.waiting -= 1
+        else:
+            await self._slots.acquire()
+
+        waited = time.perf_counter() - enqueued
+        QUEUE_WAIT_SECONDS.observe(waited, model=self.name)
+        observe_stage("queue_wait", waited)
+        self.total_wait += waited
+        self.max_wait = max(self.max_wait, waited)
+        self.running += 1
+
+    def _release(self, started: float, failed: bool):
+        if failed:
+            self.failed += 1
+        else:
+            self.completed += 1
+        self.total_run += time.perf_counter() - started
+        self.running -= 1
+        self._slots.release()
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        await self._admit()
+        started = time.perf_counter()
+        failed = True
+        try:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self.executor, lambda: fn(*args, **kwargs))
+            failed = False
+            return result
+        finally:
+            self._release(started, failed)
+
+    async def stream(self, fn: Callable[..., Iterator[Any]], *args, **kwargs) -> AsyncIterator[Any]:
+        """Iterate a blocking generator on the executor, yielding items on the event loop.
+
+        If the consumer stops early (e.g. the client disconnected) the worker
+        thread stops after its current item, and the slot is only released
+        once the thread has actually finished.
+        """
+        await self._admit()
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        items: asyncio.Queue = asyncio.Queue()
+        stop = threading.Event()
+
+        def produce():
+            try:
+                for item in fn(*args, **kwargs):
+                    if stop.is_set():
+                        break
+                    loop.call_soon_threadsafe(items.put_nowait, (item, None))
+            except Exception as e:
+                loop.call_soon_threadsafe(items.put_nowait, (_END, e))
+                raise
+            loop.call_soon_threadsafe(items.put_nowait, (_END, None))
+
+        future = loop.run_in_executor(self.executor, produce)
+        future.add_done_callback(lambda f: self._release(started, f.cancelled() or f.exception() is not None))
+        try:
+            while True:
+                item, error = await items.get()
+                if error is not None:
+                    raise error
+                if item is _END:
+                    break
+                yield item
+        finally:
+            stop.set()
+
+    def run_sync(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run on the model's executor from synchronous code, bypassing admission."""
+        return self.executor.submit(fn, *args, **kwargs).result()
+
+    def stats(self) -> Dict[str, Any]:
+        finished = self.completed + self.failed
+        return {
+            "queue_depth": self.waiting,
+            "running": self.running,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "avg_wait_ms": round(self.total_wait / finished * 1000, 2) if finished else 0.0,
+            "max_wait_ms": round(self.max_wait * 1000, 2),
+            "avg_run_ms": round(self.total_run / finished * 1000, 2) if finished else 0.0,
+        }
+
+class InferenceScheduler:
+    """Routes blocking model calls to per-model workers off the event loop."""
+
+    def __init__(self):
+        self.workers: Dict[str, ModelWorker] = {}
+
+    def register(self, name: str, max_concurrency: int = 1, max_queue: int = 16, queue_timeout: float = 30.0) -> ModelWorker:
+        worker = ModelWorker(name, max_concurrency, max_queue, queue_timeout)
+        self.workers[name] = worker
+        logger.info("Registered inference worker '%s' (concurrency=%d, queue=%d)", name, max_concurrency, max_queue)
+        return worker
+
+    def worker(self, name: str) -> ModelWorker:
+        if name not in self.workers:
+            raise KeyError(f"No inference worker registered for '{name}'")
+        return self.workers[name]
+
+    async def run(self, name: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run ``fn`` on the named model's executor once a slot is free."""
+        return await self.worker(name).run(fn, *args, **kwargs)
+
+    def stream(self, name: str, fn: Callable[..., Iterator[Any]], *args, **kwargs) -> AsyncIterator[Any]:
+        """Stream items from a blocking generator run on the named model's executor."""
+        return self.worker(name).stream(fn, *args, **kwargs)
+
+    def stats(self, name: Optional[str] = None) -> Dict[str, Any]:
+        if name is not None:
+            return self.worker(name).stats()
+        return {worker_name: worker.stats() for worker_name, worker in self.workers.items()}
+
+    def shutdown(self):
+        for worker in self.workers.values():
+            worker.executor.shutdown(wait=False)
@@ -0,0 +1,159 @@
+import ctypes
+import os
+import time
+from typing import Any, Dict, Optional
+import numpy as np
+from models.configs.model_config import LLAMA_VERBOSE
+from utils.logger import setup_logger
+
+logger = setup_logger("speculative")
+
+class SpeculativeDraft:
+    """Draft-length control and acceptance accounting for llama.cpp speculative decoding.
+
+    ``llama_cpp.Llama.generate`` calls its ``draft_model`` with the tokens so
+    far, evaluates the returned proposal together with its own next token in
+    one batch, and keeps the proposal up to the first token it would not
+    have sampled itself. The next call's input therefore shows how much of
+    the previous proposal survived, which drives the draft length: all
+    accepted grows it by two, anything rejected shrinks it by one. At zero
+    the draft is paused, and every ``probe_every`` calls a single token is
+    proposed to check whether acceptance has recovered.
+
+    Subclasses implement ``propose``.
+    """
+
+    def __init__(self, max_draft: int = 16, initial_draft: int = 4, probe_every: int = 32):
+        self.max_draft = max_draft
+        self.n_draft = min(initial_draft, max_draft)
+        self.probe_every = probe_every
+        self._context_len = 0
+        self._last_token = -1
+        self._proposal = np.array([], dtype=np.intc)
+        self._paused_calls = 0
+        self.counts = {"calls": 0, "proposals": 0, "proposed_tokens": 0, "accepted_tokens": 0, "draft_seconds": 0.0}
+
+    def propose(self, input_ids: np.ndarray, n: int) -> np.ndarray:
+        """Up to ``n`` tokens the draft expects to follow ``input_ids``."""
+        raise NotImplementedError
+
+    def _settle(self, input_ids: np.ndarray):
+        """Count how much of the last proposal the target kept, and adapt the draft length."""
+        proposed = len(self._proposal)
+        if not proposed or len(input_ids) <= self._context_len or input_ids[self._context_len - 1] != self._last_token:
+            # Nothing proposed, or this is a new generation rather than a continuation
+            return
+        continued = input_ids[self._context_len:self._context_len + proposed]
+        mismatches = np.flatnonzero(continued != self._proposal[:len(continued)])
+        accepted = int(mismatches[0]) if len(mismatches) else len(continued)
+        self.counts["accepted_tokens"] += accepted
+        if accepted == proposed:
+            self.n_draft = min(self.max_draft, self.n_draft + 2)
+        else:
+            self.n_draft = max(0, self.n_draft - 1)
+
+    def __call__(self, input_ids: np.ndarray, /, **kwargs: Any) -> np.ndarray:
+        self.counts["calls"] += 1
+        self._settle(input_ids)
+        self._proposal = np.array([], dtype=np.intc)
+        self._context_len = len(input_ids)
+        self._last_token = int(input_ids[-1])
+
+        n = self.n_draft
+        if n == 0:
+            self._paused_calls += 1
+            if self._paused_calls < self.probe_every:
+                return self._proposal
+            self._paused_calls = 0
+            n = 1
+        started = time.perf_counter()
+        self._proposal = np.asarray(self.propose(input_ids, n), dtype=np.intc)[:n]
+        self.counts["draft_seconds"] += time.perf_counter() - started
+        if len(self._proposal):
+            self.counts["proposals"] += 1
+            self.counts["proposed_tokens"] += len(self._proposal)
+        return self._proposal
+
+    def stats(self) -> Dict[str, Any]:
+        proposed = self.counts["proposed_tokens"]
+        return dict(
+            self.counts,
+            draft_seconds=round(self.counts["draft_seconds"], 3),
+            acceptance_rate=round(self.counts["accepted_tokens"] / proposed, 4) if proposed else 0.0,
+            avg_draft_length=round(proposed / self.counts["proposals"], 2) if self.counts["proposals"] else 0.0,
+            draft_length=self.n_draft,
+        )
+
+class LlamaDraft(SpeculativeDraft):
+    """Greedy proposals from a small GGUF model that shares the target's tokenizer.
+
+    The draft keeps its own KV cache in step with the target's tokens,
+    trimming it back to the common prefix after rejected tokens and after a
+    new prompt, so each call only evaluates what changed.
+    """
+
+    def __init__(self, model_path: str, n_ctx: int, verbose: bool = False, **kwargs: Any):
+        from llama_cpp import Llama
+        from llama_cpp import llama_cpp as llama_lib
+
+        super().__init__(**kwargs)
+        self._lib = llama_lib
+        self.model_path = model_path
+        self.llama = Llama(model_path=model_path, n_ctx=n_ctx, use_mmap=True, logits_all=False, verbose=verbose)
+        self.n_vocab = self.llama.n_vocab()
+        self.eos = self.llama.token_eos()
+
+    def compatible_with(self, target_path: str) -> bool:
+        """Whether the draft's token ids mean the same text as the target's (only the target's vocabulary is read)."""
+        from llama_cpp import Llama
+
+        target = Llama(model_path=target_path, vocab_only=True, verbose=False)
+        try:
+            probe = "def main():\n    print('Hello, world!', 1234)  # ünïcödé".encode("utf-8")
+            return target.n_vocab() == self.n_vocab and target.tokenize(probe) == self.llama.tokenize(probe)
+        finally:
+            target.close()
+
+    def _next_token(self) -> int:
+        pointer = self._lib.llama_get_logits_ith(self.llama._ctx.ctx, -1)
+        logits = np.ctypeslib.as_array(ctypes.cast(pointer, ctypes.POINTER(ctypes.c_float)), shape=(self.n_vocab,))
+        return int(np.argmax(logits))
+
+    def propose(self, input_ids: np.ndarray, n: int) -> np.ndarray:
+        llama = self.llama
+        if len(input_ids) + n > llama.n_ctx():
+            return np.array([], dtype=np.intc)
+        shared = min(llama.n_tokens, len(input_ids))
+        mismatches = np.flatnonzero(llama.input_ids[:shared] != input_ids[:shared])
+        prefix = int(mismatches[0]) if len(mismatches) else shared
+        # Re-evaluate at least the last token so its logits are current
+        llama.n_tokens = min(prefix, len(input_ids) - 1)
+        llama.eval(input_ids[llama.n_tokens:].tolist())
+
+        proposal = []
+        for _ in range(n):
+            token = self._next_token()
+            if token == self.eos:
+                break
+            proposal.append(token)
+            llama.eval([token])
+        return np.array(proposal, dtype=np.intc)
+
+    def close(self):
+        self.llama.close()
+
+def create_draft(config: Any) -> Optional[LlamaDraft]:
+    """The configured draft model, or None when there is none (or its file is missing)."""
+    if not config.draft_model_path:
+        return None
+    if not os.path.exists(config.draft_model_path):
+        logger.warning("Draft model %s not found; '%s' decodes without speculation", config.draft_model_path, config.name)
+        return None
+    logger.info("Loading draft model for '%s' from %s", config.name, config.draft_model_path)
+    draft = LlamaDraft(config.draft_model_path, n_ctx=config.context_window, verbose=LLAMA_VERBOSE, max_draft=config.max_draft_tokens)
+    if not draft.compatible_with(config.model_path):
+        # Token ids from another tokenizer would just be rejected, at the cost of a draft pass each step
+        logger.warning("Draft model %s does not share the tokenizer of '%s'; decoding without speculation", config.draft_model_path, config.name)
+        draft.close()
+        return None
+    return draft
@@ -0,0 +1,88 @@
+import asyncio
+import json
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional
+from langchain_core.callbacks import AsyncCallbackHandler
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Format a single Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+class StreamStats:
+    """Tracks time-to-first-token and decode rate for one streamed response."""
+
+    def __init__(self, started: Optional[float] = None):
+        self.started = started if started is not None else time.perf_counter()
+        self.first_token_at: Optional[float] = None
+        self.tokens = 0
+
+    def record(self, token: str):
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+        self.tokens += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        finished = time.perf_counter()
+        stats = {
+            "tokens": self.tokens,
+            "total_ms": round((finished - self.started) * 1000, 2),
+            "ttft_ms": None,
+            "tokens_per_sec": None,
+        }
+        if self.first_token_at is not None:
+            stats["ttft_ms"] = round((self.first_token_at - self.started) * 1000, 2)
+            decode_time = finished - self.first_token_at
+            if decode_time > 0 and self.tokens > 1:
+                # The first token's latency is prefill, so rate is over the rest
+                stats["tokens_per_sec"] = round((self.tokens - 1) / decode_time, 2)
+        return stats
+
+class FinalAnswerStreamHandler(AsyncCallbackHandler):
+    """Forwards only the agent's final answer tokens to an asyncio queue.
+
+    The conversational ReAct agent writes its reasoning before an ``AI:``
+    prefix; tokens are buffered per LLM call until the prefix shows up and
+    everything after it is streamed. Calls tagged ``answer_tag`` are the
+    answer from their first token.
+    """
+
+    def __init__(self, answer_prefix: str = "AI:", answer_tag: str = "final_answer"):
+        self.answer_prefix = answer_prefix
+        self.answer_tag = answer_tag
+        self.tokens: asyncio.Queue = asyncio.Queue()
+        self._buffer = ""
+        self._answering = False
+        self._emitted = False
+
+    async def on_llm_start(self, serialized: Dict[str, Any], prompts, tags: Optional[List[str]] = None, **kwargs: Any) -> None:
+        self._buffer = ""
+        self._answering = self.answer_tag in (tags or [])
+        self._emitted = False
+
+    async def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
+        if not self._answering:
+            self._buffer += token
+            index = self._buffer.find(self.answer_prefix)
+            if index == -1:
+                return
+            self._answering = True
+            token = self._buffer[index + len(self.answer_prefix):]
+        if not self._emitted:
+            token = token.lstrip()
+            if not token:
+                return
+            self._emitted = True
+        self.tokens.put_nowait(token)
+
+    async def drain(self, task: "asyncio.Task") -> AsyncIterator[str]:
+        """Yield answer tokens until ``task`` completes and the queue is empty."""
+        while True:
+            getter = asyncio.ensure_future(self.tokens.get())
+            done, _ = await asyncio.wait({getter, task}, return_when=asyncio.FIRST_COMPLETED)
+            if getter in done:
+                yield getter.result()
+                continue
+            getter.cancel()
+            while not self.tokens.empty():
+                yield self.tokens.get_nowait()
+            return
@@ -1,21 +1,70 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query as QueryParam, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Iterator, Optional, Tuple
 import os
-import json
-from langchain_community.llms import LlamaCpp
-from langchain.callbacks.manager import CallbackManager
-from langchain.callbacks.streaming_stdout import StreamingStdOutCallbackHandler
+import time
+import asyncio
 from agents.agent_manager import AgentManager
+from inference.scheduler import InferenceScheduler, QueueFullError, QueueTimeoutError
+from inference.scheduled_llm import ScheduledLLM
+from inference.registry import ModelRegistry
+from inference.prefix_cache import PrefixStateCache
+from inference.budget import PROFILES, GenerationUsage, answer_profile, finish_truncated, parse_json_object, route_budget
+from inference.streaming import FinalAnswerStreamHandler, StreamStats, sse_event
+from routing.intents import intent_matcher
+from routing.router import FALLBACK_SOURCE_KEY, QueryRouter, load_classifier
+from cache.response_cache import ResponseCache
+from tools.http_client import http_client
+from rag.store import MAX_SEARCH_RESULTS, UploadTooLargeError, document_store
+from memory.session_store import SessionStore
+from serving.affinity import WORKER_INDEX, new_session_id
 from utils.logger import setup_logger
+from utils.metrics import RequestTrace, current_trace, metrics, observe_stage, timed
 
 # Set up logger
 logger = setup_logger("api")
 
 app = FastAPI()
 
+# Echo each request's trace id and stage timings (Server-Timing) in response headers
+TRACE_HEADERS = os.getenv("TRACE_HEADERS", "1") not in ("0", "false", "no")
+
+HTTP_REQUESTS = metrics.counter("llmagent_http_requests_total", "API requests by route and status.", ["method", "path", "status"])
+HTTP_SECONDS = metrics.histogram("llmagent_http_request_seconds", "API latency until the response headers are sent.", ["path"])
+HTTP_IN_FLIGHT = metrics.gauge("llmagent_http_requests_in_flight", "API requests being handled.")
+STREAMS_IN_FLIGHT = metrics.gauge("llmagent_streams_in_flight", "Server-Sent Event responses still streaming.")
+CHAT_REQUESTS = metrics.counter("llmagent_chat_requests_total", "Chat requests by route taken and response cache outcome.", ["route", "cache"])
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    # Honour an id from an upstream proxy so logs and metrics line up across hops
+    incoming = request.headers.get("x-trace-id") or request.headers.get("x-request-id")
+    trace = RequestTrace(incoming[:128] if incoming else None)
+    current_trace.set(trace)
+    started = time.perf_counter()
+    HTTP_IN_FLIGHT.inc()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        HTTP_IN_FLIGHT.dec()
+        elapsed = time.perf_counter() - started
+        # The route template, not the raw path, so ids in URLs don't explode the label set
+        route = request.scope.get("route")
+        path = getattr(route, "path", "unmatched")
+        HTTP_REQUESTS.inc(method=request.method, path=path, status=status)
+        HTTP_SECONDS.observe(elapsed, path=path)
+    if TRACE_HEADERS:
+        response.headers["X-Trace-Id"] = trace.trace_id
+        trace.stages.append(("total", elapsed))
+        response.headers["Server-Timing"] = trace.server_timing()
+        if trace.wasted_tokens:
+            response.headers["X-Wasted-Tokens"] = str(trace.wasted_tokens)
+    return response
+
 # Enable CORS
 app.add_middleware(
     CORSMiddleware,
@@ -23,43 +72,95 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Trace-Id", "X-Cache", "X-Wasted-Tokens"],
 )
 
 # Initialize LLMs from config
-from models.configs.model_config import AVAILABLE_MODELS, ModelType
-
-callback_manager = CallbackManager([StreamingStdOutCallbackHandler()])
-
-# Initialize general-purpose LLM (Mistral)
-general_llm = LlamaCpp(
-    model_path=AVAILABLE_MODELS[ModelType.GENERAL].model_path,
-    callback_manager=callback_manager,
-    temperature=AVAILABLE_MODELS[ModelType.GENERAL].temperature,
-    max_tokens=AVAILABLE_MODELS[ModelType.GENERAL].max_tokens,
-    n_ctx=4096,  # Set context window to 4096 tokens
-    verbose=True,
+from models.configs.model_config import AVAILABLE_MODELS, IDLE_CHECK_INTERVAL, MODEL_MEMORY_BUDGET_MB, ModelType
+
+# Models are loaded on first use by their scheduler worker and unloaded when idle,
+# so startup does not wait on (or hold) weights for routes nobody is using
+registry = ModelRegistry(
+    AVAILABLE_MODELS,
+    memory_budget_bytes=MODEL_MEMORY_BUDGET_MB * 2**20,
+    # Saved KV state for repeated prompt prefixes, so each agent step skips re-prefilling them
+    prefix_caches={
+        model_type: PrefixStateCache(config.prefix_cache_mb * 2**20, markers=AgentManager.PREFIX_MARKERS)
+        for model_type, config in AVAILABLE_MODELS.items()
+        if config.prefix_cache_mb > 0
+    },
+)
+
+# Each model gets its own executor and bounded admission queue so blocking
+# llama.cpp calls never run on the event loop
+scheduler = InferenceScheduler()
+for model_type, model_config in AVAILABLE_MODELS.items():
+    scheduler.register(
+        model_type.value,
+        # A batching model needs as many calls in flight as it can decode together
+        max_concurrency=max(model_config.max_concurrency, model_config.max_batch_size),
+        max_queue=model_config.max_queue,
+        queue_timeout=model_config.queue_timeout,
+    )
+
+async def summarize_history(prompt: str) -> str:
+    return await scheduler.run(ModelType.GENERAL.value, registry.invoke, ModelType.GENERAL, prompt)
+
+# Conversation memory is per session and token-budgeted, so agent prompts stay the same size
+# however long the server runs; set SESSION_DB to persist sessions in SQLite
+sessions = SessionStore(
+    token_budget=AVAILABLE_MODELS[ModelType.GENERAL].context_window // 4,
+    max_sessions=int(os.getenv("SESSION_MAX", "1000")),
+    idle_ttl=float(os.getenv("SESSION_IDLE_TTL", "3600")),
+    db_path=os.getenv("SESSION_DB"),
+    summarizer=summarize_history,
+)
+
+# Initialize Agent Manager with general-purpose LLM (scheduled on the general worker)
+agent_manager = AgentManager(
+    ScheduledLLM(registry=registry, scheduler=scheduler, model_type=ModelType.GENERAL),
+    sessions,
+    mode=os.getenv("AGENT_MODE", "parallel"),
 )
 
-# Initialize code-specific LLM (CodeLlama)
-code_llm = LlamaCpp(
-    model_path=AVAILABLE_MODELS[ModelType.CODE].model_path,
-    callback_manager=callback_manager,
-    temperature=AVAILABLE_MODELS[ModelType.CODE].temperature,
-    max_tokens=AVAILABLE_MODELS[ModelType.CODE].max_tokens,
-    n_ctx=4096,  # Set context window to 4096 tokens
-    verbose=True,
+# Identical prompts are answered from cache; set RESPONSE_CACHE_DB to keep entries across restarts
+response_cache = ResponseCache(
+    max_entries=int(os.getenv("RESPONSE_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("RESPONSE_CACHE_TTL", "3600")),
+    max_temperature=float(os.getenv("RESPONSE_CACHE_MAX_TEMPERATURE", "0.5")),
+    db_path=os.getenv("RESPONSE_CACHE_DB"),
 )
 
-# Initialize Agent Manager with general-purpose LLM
-agent_manager = AgentManager(general_llm)
+async def unload_idle_models():
+    while True:
+        await asyncio.sleep(IDLE_CHECK_INTERVAL)
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, registry.unload_idle)
+        except Exception as e:
+            logger.error("Error unloading idle models: %s", e)
+
+@app.on_event("startup")
+async def startup():
+    app.state.idle_reaper = asyncio.create_task(unload_idle_models())
+    # Fit the router classifier off the event loop; until it is ready the router defers to the LLM
+    router.classifier = await asyncio.get_running_loop().run_in_executor(None, load_classifier)
+
+@app.on_event("shutdown")
+async def shutdown():
+    app.state.idle_reaper.cancel()
+    await http_client.close()
+    scheduler.shutdown()
+    document_store.close()
 
 class Query(BaseModel):
     text: str
     parameters: Dict[str, Any] = {}
     use_agent: Optional[bool] = None  # Make it optional since we'll determine it automatically
+    stream: bool = False  # Stream tokens back as Server-Sent Events
+    session_id: Optional[str] = None  # Conversation to continue; a new one is started when omitted
 
 async def classify_query(text: str) -> Dict[str, Any]:
-    """Classify the query to determine the best processing method."""
+    """Classify the query with the LLM; the router's fallback when its classifier is unsure."""
     classification_prompt = f"""Analyze the following query and classify it into one of these categories:
     1. CODE - for questions about programming, debugging, or code explanation
     2. TOOL - for questions requiring external tools (weather, calculations, web search, or any real-time data)
@@ -70,93 +171,344 @@ async def classify_query(text: str) -> Dict[str, Any]:
     - reason: brief explanation of the classification
     
     Query: {text}
-    """
+    JSON:"""
     
+    config = AVAILABLE_MODELS[ModelType.GENERAL]
+    # A few dozen tokens of grammar-constrained JSON instead of the general model's full answer budget
+    profile = PROFILES["classification"]
+    params = profile.params(config.temperature)
+    cached, _ = response_cache.get("classification", config.name, params, text)
+    if cached is not None:
+        return cached
+
     try:
-        response = general_llm(classification_prompt)
-        # Clean up the response to ensure valid JSON
-        response = response.strip()
-        if response.startswith("```json"):
-            response = response[7:-3]  # Remove ```json and ```
-        elif response.startswith("{\n"):
-            response = response  # Keep as is
-        return json.loads(response)
+        usage = GenerationUsage()
+        response = await scheduler.run(ModelType.GENERAL.value, registry.invoke, ModelType.GENERAL, classification_prompt, usage=usage, **profile.kwargs())
+        classification = parse_json_object(response, usage)
+        response_cache.set("classification", config.name, params, text, classification)
+        return classification
+    except (QueueFullError, QueueTimeoutError):
+        raise
     except Exception as e:
-        logger.error(f"Error classifying query: {str(e)}")
-        return {"category": "GENERAL", "reason": "Classification failed, defaulting to general"}
-
-def get_greeting_response(text: str) -> Optional[str]:
-    """Return an appropriate greeting response if the input is a greeting, None otherwise."""
-    greetings = {
-        'hi': "Hello! How can I help you today?",
-        'hello': "Hello! How can I help you today?",
-        'hey': "Hi there! How can I assist you?",
-        'good morning': "Good morning! How can I help you today?",
-        'good afternoon': "Good afternoon! How can I assist you?",
-        'good evening': "Good evening! How can I help you?",
-        'hi there': "Hello! How can I help you today?",
-        'greetings': "Hello! How can I assist you today?",
+        logger.error("Error classifying query: %s", e)
+        # Not an LLM decision, so the router neither counts nor logs it as one
+        return {"category": "GENERAL", "reason": "Classification failed, defaulting to general", FALLBACK_SOURCE_KEY: "default"}
+
+# Rules and a local classifier route most queries; the LLM only sees the uncertain ones
+router = QueryRouter(llm_fallback=classify_query)
+
+def select_route(query: Query, classification: Dict[str, Any]) -> str:
+    """Pick the backend for a query: 'agent', 'code' or 'general'."""
+    # Override classification if use_agent is explicitly set
+    if query.use_agent is not None:
+        return "agent" if query.use_agent else "general"
+    if classification['category'] == 'CODE':
+        return "code"
+    if classification['category'] == 'TOOL':
+        return "agent"
+    return "general"
+
+# Routes answered by a single model call; agent answers depend on live tool data and are never cached
+ROUTE_MODELS = {"general": ModelType.GENERAL, "code": ModelType.CODE}
+# Code prompts get their own cache namespace, keyed on the exact text
+CACHE_NAMESPACES = {"general": "generation", "code": "code"}
+
+def sampling_params(route: str, text: str) -> Dict[str, Any]:
+    """Cache key parameters of a route's answer: brief, default and detailed answers never share an entry."""
+    config = AVAILABLE_MODELS[ROUTE_MODELS[route]]
+    profile, max_tokens = answer_profile(route, text, config.max_tokens)
+    return {"temperature": config.temperature, "max_tokens": max_tokens, "profile": profile}
+
+def cached_response(route: str, text: str) -> Tuple[Optional[str], str]:
+    """Look up a cached answer; returns (response, X-Cache status)."""
+    if route not in ROUTE_MODELS:
+        return None, "BYPASS"
+    model_type = ROUTE_MODELS[route]
+    response, outcome = response_cache.get(CACHE_NAMESPACES[route], AVAILABLE_MODELS[model_type].name, sampling_params(route, text), text)
+    return response, outcome.upper()
+
+def store_response(route: str, text: str, response: str):
+    if route in ROUTE_MODELS and response:
+        model_type = ROUTE_MODELS[route]
+        response_cache.set(CACHE_NAMESPACES[route], AVAILABLE_MODELS[model_type].name, sampling_params(route, text), text, response)
+
+def answer_budget(route: str, text: str) -> int:
+    return route_budget(route, text, AVAILABLE_MODELS[ROUTE_MODELS[route]].max_tokens)
+
+async def generate(route: str, text: str, session_id: str) -> Tuple[str, Optional[Dict[str, Any]], Optional[GenerationUsage]]:
+    """Return the response, the per-step timing trace for agent answers, and token usage for model answers."""
+    if route == "agent":
+        logger.info("Using agent for tool-based processing")
+        result = await agent_manager.run(text, session_id)
+        return result.response, result.trace(), None
+    model_type = ROUTE_MODELS[route]
+    logger.info("Using %s LLM for processing", model_type.value)
+    usage = GenerationUsage()
+    response = await scheduler.run(model_type.value, registry.invoke, model_type, text, usage=usage, max_tokens=answer_budget(route, text))
+    return finish_truncated(route, response, usage), None, usage
+
+async def stream_generate(route: str, text: str, session_id: str, classification: Dict[str, Any], started: float):
+    """Yield SSE events: the classification, each token, then the full response with stats."""
+    stats = StreamStats(started)
+    chunks = []
+    trace = None
+    usage = None
+    yield sse_event("classification", classification)
+    STREAMS_IN_FLIGHT.inc()
+    generation_started = time.perf_counter()
+    try:
+        if route == "agent":
+            logger.info("Streaming agent final answer")
+            handler = FinalAnswerStreamHandler()
+            task = asyncio.create_task(agent_manager.run(text, session_id, callbacks=[handler]))
+            try:
+                async for token in handler.drain(task):
+                    stats.record(token)
+                    chunks.append(token)
+                    yield sse_event("token", {"text": token})
+                result = await task
+            finally:
+                task.cancel()
+            response, trace = result.response, result.trace()
+            if not chunks:
+                # Tool output returned verbatim: no LLM tokens to stream, so send it whole
+                stats.record(response)
+                yield sse_event("token", {"text": response})
+        else:
+            model_type = ROUTE_MODELS[route]
+            logger.info("Streaming %s LLM response", model_type.value)
+            usage = GenerationUsage()
+            async for token in scheduler.stream(model_type.value, registry.stream, model_type, text, usage=usage, max_tokens=answer_budget(route, text)):
+                stats.record(token)
+                chunks.append(token)
+                yield sse_event("token", {"text": token})
+            response = "".join(chunks)
+            # Tokens already sent can't be taken back, but an open code fence can still be closed
+            finished = finish_truncated(route, response, usage)
+            if finished.startswith(response) and len(finished) > len(response):
+                closing = finished[len(response):]
+                chunks.append(closing)
+                yield sse_event("token", {"text": closing})
+                response = finished
+            store_response(route, text, response)
+        logger.info("Successfully streamed chat request")
+        done = {"response": response, "session_id": session_id, "stats": stats.to_dict()}
+        if trace is not None:
+            done["agent"] = trace
+        if usage is not None:
+            done["generation"] = usage.to_dict()
+        yield sse_event("done", done)
+    except QueueFullError as e:
+        logger.warning("Rejecting streamed chat request: %s", e)
+        yield sse_event("error", {"status": 429, "detail": str(e)})
+    except QueueTimeoutError as e:
+        logger.warning("Streamed chat request timed out in queue: %s", e)
+        yield sse_event("error", {"status": 503, "detail": str(e)})
+    except Exception as e:
+        logger.error("Error streaming chat request: %s", e, exc_info=True)
+        yield sse_event("error", {"status": 500, "detail": str(e)})
+    finally:
+        STREAMS_IN_FLIGHT.dec()
+        # Headers went out before generation, so this stage only reaches the histogram
+        observe_stage("generation", time.perf_counter() - generation_started)
+
+async def stream_canned(response: str, session_id: str, classification: Dict[str, Any], started: float):
+    """Stream an already-known answer (canned reply or cache hit) as a single token."""
+    stats = StreamStats(started)
+    stats.record(response)
+    yield sse_event("classification", classification)
+    yield sse_event("token", {"text": response})
+    yield sse_event("done", {"response": response, "session_id": session_id, "stats": stats.to_dict()})
+
+def reply(query: Query, response: str, classification: Dict[str, Any], started: float, headers: Optional[Dict[str, str]] = None):
+    if query.stream:
+        return StreamingResponse(stream_canned(response, query.session_id, classification, started), media_type="text/event-stream", headers=headers)
+    body = {
+        "response": response,
+        "classification": classification,
+        "session_id": query.session_id
     }
-    
-    text = text.lower().strip()
-    for greeting in greetings:
-        if text.startswith(greeting):
-            return greetings[greeting]
-    return None
+    return JSONResponse(body, headers=headers) if headers else body
 
 @app.post("/api/chat")
-async def chat(query: Query):
-    logger.info(f"Received chat request: {query.text[:100]}...")
+async def chat(query: Query, http_response: Response):
+    logger.info("Received chat request: %.100s...", query.text)
+    started = time.perf_counter()
+    if not query.session_id:
+        # Minted so that the multi-worker proxy routes the rest of the conversation back here
+        query.session_id = new_session_id()
     try:
-        lower_text = query.text.lower().strip()
-        
-        # Check for thank you messages first
-        if any(phrase in lower_text for phrase in ['thank you', 'thanks', 'thx', 'thank u']):
-            response = "You're welcome! Let me know if you need anything else."
-            return {
-                "response": response,
-                "classification": {"category": "GENERAL", "reason": "Thank you acknowledgment"}
-            }
-            
-        # Check for greetings
-        greeting_response = get_greeting_response(lower_text)
-        if greeting_response:
-            return {
-                "response": greeting_response,
-                "classification": {"category": "GENERAL", "reason": "Greeting"}
-            }
+        # Greetings, thanks and other canned messages skip the router and the models
+        with timed("intent"):
+            intent = intent_matcher.match(query.text)
+        if intent is not None:
+            CHAT_REQUESTS.inc(route="canned", cache="BYPASS")
+            classification = {"category": "GENERAL", "reason": f"Canned intent '{intent.name}'", "source": "intent"}
+            return reply(query, intent.response, classification, started)
 
         # Classify other queries
-        classification = await classify_query(query.text)
-        logger.info(f"Query classified as: {classification['category']} - {classification['reason']}")
-        
-        # Override classification if use_agent is explicitly set
-        if query.use_agent is not None:
-            if query.use_agent:
-                response = await agent_manager.process_message(query.text)
-            else:
-                response = general_llm(query.text)
-        else:
-            # Route based on classification
-            if classification['category'] == 'CODE':
-                logger.info("Using code LLM for processing")
-                response = code_llm(query.text)
-            elif classification['category'] == 'TOOL':
-                logger.info("Using agent for tool-based processing")
-                response = await agent_manager.process_message(query.text)
-            else:  # GENERAL
-                logger.info("Using general LLM for processing")
-                response = general_llm(query.text)
+        with timed("classification"):
+            classification = await router.route(query.text)
+        logger.info("Query classified as: %s via %s - %s", classification['category'], classification['source'], classification['reason'])
+        route = select_route(query, classification)
+
+        with timed("cache"):
+            response, cache_status = cached_response(route, query.text)
+        CHAT_REQUESTS.inc(route=route, cache=cache_status)
+        if response is not None:
+            logger.info("Serving %s response from cache", route)
+            return reply(query, response, classification, started, headers={"X-Cache": cache_status})
+
+        if query.stream:
+            return StreamingResponse(
+                stream_generate(route, query.text, query.session_id, classification, started),
+                media_type="text/event-stream",
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "X-Cache": cache_status},
+            )
+
+        with timed("generation"):
+            response, trace, usage = await generate(route, query.text, query.session_id)
+        store_response(route, query.text, response)
+        http_response.headers["X-Cache"] = cache_status
                 
         logger.info("Successfully processed chat request")
-        return {
+        body = {
             "response": response,
-            "classification": classification  # Include classification in response for transparency
+            "classification": classification,  # Include classification in response for transparency
+            "session_id": query.session_id
         }
+        if trace is not None:
+            body["agent"] = trace  # Mode and per-step timing (plan, each tool call, answer)
+        if usage is not None:
+            body["generation"] = usage.to_dict()  # Token budget, prompt trimming, truncation and wasted tokens
+        return body
+    except QueueFullError as e:
+        logger.warning("Rejecting chat request: %s", e)
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"})
+    except QueueTimeoutError as e:
+        logger.warning("Chat request timed out in queue: %s", e)
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
     except Exception as e:
-        logger.error(f"Error processing chat request: {str(e)}", exc_info=True)
+        logger.error("Error processing chat request: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/health")
 async def health_check():
-    return {"status": "healthy"}
\ No newline at end of file
+    return {"status": "healthy", "worker": WORKER_INDEX, "queues": scheduler.stats(), "intents": intent_matcher.stats(), "router": router.stats(), "cache": response_cache.stats(), "tools_http": http_client.stats(), "sessions": sessions.stats(), "documents": document_store.stats()}
+
+def component_metrics() -> Iterator[Tuple[str, str, str, Dict[str, Any], Any]]:
+    """Gauges and counters read from each component's own stats() at scrape time."""
+    for model, queue in scheduler.stats().items():
+        yield "llmagent_queue_depth", "gauge", "Model calls waiting for a worker slot.", {"model": model}, queue["queue_depth"]
+        yield "llmagent_llm_in_flight", "gauge", "Model calls running on the worker.", {"model": model}, queue["running"]
+        for outcome in ("completed", "failed", "rejected", "timed_out"):
+            yield "llmagent_queue_calls_total", "counter", "Model calls leaving the admission queue by outcome.", {"model": model, "outcome": outcome}, queue[outcome]
+
+    models = registry.stats()
+    for model, info in models["models"].items():
+        yield "llmagent_model_loaded", "gauge", "1 if the model's weights are resident.", {"model": model}, int(info["loaded"])
+        yield "llmagent_model_resident_bytes", "gauge", "Estimated resident size of each loaded model.", {"model": model}, info["resident_bytes"]
+        prefix = info["prefix_cache"]
+        if prefix:
+            ratio = prefix["hits"] / prefix["requests"] if prefix["requests"] else 0.0
+            yield "llmagent_prefix_cache_hit_ratio", "gauge", "Share of model calls that restored a saved KV prefix.", {"model": model}, ratio
+            yield "llmagent_prefix_cache_tokens_saved_total", "counter", "Prompt tokens not re-prefilled thanks to the prefix cache.", {"model": model}, prefix["prefill_tokens_saved"]
+        speculative = info["speculative"]
+        if speculative:
+            yield "llmagent_speculative_acceptance_ratio", "gauge", "Share of draft-model tokens the target model accepted.", {"model": model}, speculative["acceptance_rate"]
+            yield "llmagent_speculative_draft_length", "gauge", "Current adaptive draft length.", {"model": model}, speculative["draft_length"]
+            yield "llmagent_speculative_accepted_tokens_total", "counter", "Draft tokens accepted by the target model.", {"model": model}, speculative["accepted_tokens"]
+        batching = info["batching"]
+        if batching:
+            yield "llmagent_batch_active", "gauge", "Sequences decoding together in the batch engine.", {"model": model}, batching["active"]
+            yield "llmagent_batch_pending", "gauge", "Sequences waiting to join the batch.", {"model": model}, batching["pending"]
+    yield "llmagent_process_rss_bytes", "gauge", "Resident memory of the API process.", {}, models["process_rss_bytes"]
+
+    for namespace, counts in response_cache.stats()["namespaces"].items():
+        yield "llmagent_response_cache_hit_ratio", "gauge", "Response cache hits over lookups.", {"namespace": namespace}, counts["hit_ratio"]
+        for outcome in ("hit", "miss", "bypass"):
+            yield "llmagent_response_cache_lookups_total", "counter", "Response cache lookups by outcome.", {"namespace": namespace, "outcome": outcome}, counts[outcome]
+
+    intents = intent_matcher.stats()
+    for name, count in intents["by_intent"].items():
+        yield "llmagent_intent_hits_total", "counter", "Chat messages answered by a canned fast-path intent.", {"intent": name}, count
+    yield "llmagent_intent_checks_total", "counter", "Chat messages checked against the fast-path intents.", {}, intents["checks"]
+    yield "llmagent_intent_hit_ratio", "gauge", "Fast-path intent hits over checks.", {}, intents["hit_rate"]
+
+    for source, count in router.stats()["by_source"].items():
+        yield "llmagent_router_decisions_total", "counter", "Queries routed by the deciding stage (rules, classifier, llm).", {"source": source}, count
+
+    tools_http = http_client.stats()
+    yield "llmagent_tool_http_cache_hits_total", "counter", "Tool HTTP responses served from the client cache.", {}, tools_http["cache_hits"]
+    yield "llmagent_tool_http_retries_total", "counter", "Tool HTTP retries.", {}, tools_http["retries"]
+
+    yield "llmagent_sessions_active", "gauge", "Conversation sessions held in memory.", {}, sessions.stats()["active_sessions"]
+    documents = document_store.stats()
+    yield "llmagent_documents_searches_total", "counter", "Document searches.", {}, documents["searches"]
+    yield "llmagent_documents_chunks_ingested_total", "counter", "Document chunks embedded and indexed.", {}, documents["chunks_ingested"]
+
+metrics.add_collector(component_metrics)
+
+@app.get("/api/metrics")
+async def prometheus_metrics():
+    """Prometheus text exposition of request, model, tool and cache metrics."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/models")
+async def list_models():
+    return registry.stats()
+
+def find_model(name: str) -> ModelType:
+    try:
+        return ModelType(name)
+    except ValueError:
+        raise HTTPException(status_code=404, detail=f"Unknown model '{name}'")
+
+@app.post("/api/models/{name}/load")
+async def load_model(name: str):
+    model_type = find_model(name)
+    # Load on the model's own worker so it never races a generation
+    await scheduler.run(model_type.value, registry.load, model_type)
+    return registry.stats()["models"][name]
+
+@app.post("/api/models/{name}/unload")
+async def unload_model(name: str):
+    model_type = find_model(name)
+    freed = await asyncio.get_running_loop().run_in_executor(None, registry.unload, model_type)
+    if freed is None and registry.is_loaded(model_type):
+        raise HTTPException(status_code=409, detail=f"Model '{name}' is in use")
+    return registry.stats()["models"][name]
+
+@app.delete("/api/sessions/{session_id}")
+async def clear_session(session_id: str):
+    sessions.clear(session_id)
+    return {"session_id": session_id, "cleared": True}
+
+@app.post("/api/documents")
+async def upload_document(request: Request, name: str = "document"):
+    """Ingest the raw request body (plain text, Markdown or HTML), chunking and embedding it as it streams in."""
+    try:
+        return await document_store.ingest(name, request.stream(), request.headers.get("content-type", "text/plain"))
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        # Undecodable or otherwise unusable content
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error("Error ingesting document '%s': %s", name, e, exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/documents")
+async def list_documents():
+    return {"documents": await document_store.documents(), "stats": document_store.stats()}
+
+@app.get("/api/documents/search")
+async def search_documents(q: str, k: int = QueryParam(4, ge=1, le=MAX_SEARCH_RESULTS)):
+    return {"results": await document_store.search(q, k)}
+
+@app.delete("/api/documents/{doc_id}")
+async def delete_document(doc_id: str):
+    removed = await document_store.delete(doc_id)
+    if not removed:
+        raise HTTPException(status_code=404, detail=f"Unknown document '{doc_id}'")
+    return {"doc_id": doc_id, "chunks_removed": removed}
@@ -0,0 +1,24 @@
+from typing import Any, Dict, List
+from langchain_core.memory import BaseMemory
+
+class SessionMemory(BaseMemory):
+    """LangChain memory view onto one session in a ``SessionStore``."""
+
+    store: Any
+    session_id: str
+    memory_key: str = "chat_history"
+    input_key: str = "input"
+    output_key: str = "output"
+
+    @property
+    def memory_variables(self) -> List[str]:
+        return [self.memory_key]
+
+    def load_memory_variables(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        return {self.memory_key: self.store.render(self.session_id)}
+
+    def save_context(self, inputs: Dict[str, Any], outputs: Dict[str, str]) -> None:
+        self.store.append(self.session_id, inputs[self.input_key], outputs[self.output_key])
+
+    def clear(self) -> None:
+        self.store.clear(self.session_id)
@@ -0,0 +1,189 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from utils.logger import setup_logger
+
+logger = setup_logger("sessions")
+
+SUMMARY_PROMPT = """Progressively summarize the conversation, adding onto the previous summary. Keep names, numbers and decisions. Respond with the new summary only.
+
+Previous summary:
+{summary}
+
+New lines of conversation:
+{lines}
+
+New summary:"""
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token) that needs no loaded model."""
+    return len(text) // 4 + 1
+
+def format_turn(human: str, ai: str) -> str:
+    return f"Human: {human}\nAI: {ai}"
+
+class SessionHistory:
+    """One conversation: a running summary plus the turns not yet folded into it."""
+
+    def __init__(self, session_id: str, summary: str = "", turns: Optional[List[Tuple[str, str]]] = None):
+        self.session_id = session_id
+        self.summary = summary
+        self.turns: List[Tuple[str, str]] = turns or []
+        self.last_active = time.time()
+        self.summarizing = False
+        # Set by ``SessionStore.clear`` so an in-flight summary is not saved back
+        self.cleared = False
+
+class SQLiteSessionBackend:
+    """Write-through persistence so sessions survive restarts and evictions."""
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "session_id TEXT PRIMARY KEY, summary TEXT NOT NULL, turns TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+
+    def load(self, session_id: str) -> Optional[SessionHistory]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT summary, turns FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return SessionHistory(session_id, row[0], [tuple(turn) for turn in json.loads(row[1])])
+
+    def save(self, history: SessionHistory):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions (session_id, summary, turns, updated_at) VALUES (?, ?, ?, ?)",
+                (history.session_id, history.summary, json.dumps(history.turns), time.time()),
+            )
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+class SessionStore:
+    """Per-session conversation memory with a fixed token budget.
+
+    ``render`` returns the running summary plus as many recent turns as fit
+    ``token_budget``; turns that no longer fit are folded into the summary
+    by ``summarize`` (using the LLM passed as ``summarizer``), so the prompt
+    size stays flat however long a conversation or the server runs. Idle
+    sessions are evicted LRU-first from memory; with ``db_path`` they can be
+    reloaded from SQLite later.
+    """
+
+    def __init__(
+        self,
+        token_budget: int,
+        max_sessions: int = 1000,
+        idle_ttl: float = 3600.0,
+        db_path: Optional[str] = None,
+        count_tokens: Callable[[str], int] = estimate_tokens,
+        summarizer: Optional[Callable[[str], Awaitable[str]]] = None,
+    ):
+        self.token_budget = token_budget
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.count_tokens = count_tokens
+        self.summarizer = summarizer
+        self.backend = SQLiteSessionBackend(db_path) if db_path else None
+        self._sessions: "OrderedDict[str, SessionHistory]" = OrderedDict()
+        self.counts = {"evicted": 0, "restored": 0, "summaries": 0, "summary_failures": 0}
+
+    def get(self, session_id: str) -> SessionHistory:
+        history = self._sessions.get(session_id)
+        if history is None:
+            history = self.backend.load(session_id) if self.backend else None
+            if history is not None:
+                self.counts["restored"] += 1
+            else:
+                history = SessionHistory(session_id)
+            self._sessions[session_id] = history
+        self._sessions.move_to_end(session_id)
+        history.last_active = time.time()
+        self._evict()
+        return history
+
+    def _evict(self):
+        now = time.time()
+        while self._sessions:
+            session_id, history = next(iter(self._sessions.items()))
+            if len(self._sessions) <= self.max_sessions and now - history.last_active <= self.idle_ttl:
+                break
+            del self._sessions[session_id]
+            self.counts["evicted"] += 1
+
+    def append(self, session_id: str, human: str, ai: str):
+        history = self.get(session_id)
+        history.turns.append((human, ai))
+        if self.backend:
+            self.backend.save(history)
+
+    def clear(self, session_id: str):
+        history = self._sessions.pop(session_id, None)
+        if history is not None:
+            history.cleared = True
+        if self.backend:
+            self.backend.delete(session_id)
+
+    def _window(self, history: SessionHistory) -> int:
+        """Index of the oldest turn that still fits the budget alongside the summary."""
+        used = self.count_tokens(history.summary) if history.summary else 0
+        start = len(history.turns)
+        for index in range(len(history.turns) - 1, -1, -1):
+            used += self.count_tokens(format_turn(*history.turns[index]))
+            if used > self.token_budget:
+                break
+            start = index
+        return start
+
+    def render(self, session_id: str) -> str:
+        history = self.get(session_id)
+        lines = [format_turn(human, ai) for human, ai in history.turns[self._window(history):]]
+        if history.summary:
+            lines.insert(0, f"Summary of earlier conversation: {history.summary}")
+        return "\n".join(lines)
+
+    def needs_summary(self, session_id: str) -> bool:
+        history = self._sessions.get(session_id)
+        return history is not None and not history.summarizing and self._window(history) > 0
+
+    async def summarize(self, session_id: str):
+        """Fold turns that fell out of the window into the running summary."""
+        history = self._sessions.get(session_id)
+        if history is None or history.summarizing or self.summarizer is None:
+            return
+        overflow = self._window(history)
+        if overflow == 0:
+            return
+        history.summarizing = True
+        try:
+            lines = "\n".join(format_turn(human, ai) for human, ai in history.turns[:overflow])
+            summary = await self.summarizer(SUMMARY_PROMPT.format(summary=history.summary or "(none)", lines=lines))
+            if history.cleared:
+                return
+            history.summary = summary.strip()
+            # Only drop the turns that were summarized; newer ones may have arrived meanwhile
+            history.turns = history.turns[overflow:]
+            self.counts["summaries"] += 1
+            if self.backend:
+                self.backend.save(history)
+        except Exception as e:
+            self.counts["summary_failures"] += 1
+            logger.warning("Could not summarize session %s: %s", session_id, e)
+        finally:
+            history.summarizing = False
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(self.counts, active_sessions=len(self._sessions), token_budget=self.token_budget)
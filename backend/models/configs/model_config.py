@@ -1,3 +1,4 @@
+import os
 from typing import Dict, Any, Optional
 from enum import Enum
 
@@ -13,7 +14,17 @@ class ModelConfig:
         model_type: ModelType,
         temperature: float = 0.3,
         max_tokens: int = 2000,
-        context_window: int = 4096
+        context_window: int = 4096,
+        kv_bytes_per_token: int = 512 * 1024,
+        max_concurrency: int = 1,
+        max_queue: int = 16,
+        queue_timeout: float = 30.0,
+        idle_timeout: Optional[float] = 600.0,
+        prefix_cache_mb: int = 0,
+        max_batch_size: int = 1,
+        batch_window_ms: float = 10.0,
+        draft_model_path: Optional[str] = None,
+        max_draft_tokens: int = 16
     ):
         self.name = name
         self.model_path = model_path
@@ -21,6 +32,46 @@ class ModelConfig:
         self.temperature = temperature
         self.max_tokens = max_tokens
         self.context_window = context_window
+        # f16 K and V for every layer; the default fits a 7B Llama without grouped-query attention
+        self.kv_bytes_per_token = kv_bytes_per_token
+        # Scheduling: concurrent calls allowed on this model and how many may wait
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        # Unload after this many idle seconds (None keeps the model resident once loaded)
+        self.idle_timeout = idle_timeout
+        # Memory for saved KV snapshots of repeated prompt prefixes (0 disables)
+        self.prefix_cache_mb = prefix_cache_mb
+        # Continuous batching: sequences decoded together (1 keeps the serial LangChain path)
+        # and how long an idle model waits for concurrent requests to share the first batch
+        self.max_batch_size = max_batch_size
+        self.batch_window_ms = batch_window_ms
+        # Speculative decoding: a small GGUF with the same tokenizer proposes up to max_draft_tokens
+        # tokens per step for the model to verify in one batch (serial path only, not batched models)
+        self.draft_model_path = draft_model_path
+        self.max_draft_tokens = max_draft_tokens
+
+# Upper bound on weights kept resident across all loaded models; idle models
+# are unloaded (least recently used first) to make room for a new one
+MODEL_MEMORY_BUDGET_MB = 12 * 1024
+
+# How often the registry checks for idle models to unload
+IDLE_CHECK_INTERVAL = 60.0
+
+# llama.cpp's own load and per-call timing output goes straight to stderr, bypassing the log
+# pipeline, and every generated token is echoed to stdout; keep it off outside of debugging
+LLAMA_VERBOSE = os.getenv("LLAMA_VERBOSE", "0") == "1"
+
+# CPU threads per llama.cpp model (unset lets llama.cpp use half the cores); the multi-worker
+# supervisor splits the cores between its workers so they don't oversubscribe the machine
+LLAMA_THREADS = int(os.environ["LLAMA_THREADS"]) if os.getenv("LLAMA_THREADS") else None
+
+# Continuous batching allocates a second context of max_batch_size * context_window tokens
+# (8 GB of KV cache for the code model at 4), so it is opt-in
+CODE_MAX_BATCH_SIZE = int(os.getenv("CODE_MAX_BATCH_SIZE", "1"))
+
+# Local CPU embedding model for document retrieval; without it the index uses hashed n-gram vectors
+EMBEDDING_MODEL_PATH = "./models/all-MiniLM-L6-v2.Q8_0.gguf"
 
 AVAILABLE_MODELS = {
     ModelType.GENERAL: ModelConfig(
@@ -29,6 +80,8 @@ AVAILABLE_MODELS = {
         model_type=ModelType.GENERAL,
         temperature=0.3,
         max_tokens=500,
+        kv_bytes_per_token=128 * 1024,  # grouped-query attention: 8 KV heads of 32
+        prefix_cache_mb=1024,  # serves the agent, whose system prompt and history repeat every call
     ),
     ModelType.CODE: ModelConfig(
         name="codellama-7b-instruct",
@@ -36,5 +89,6 @@ AVAILABLE_MODELS = {
         model_type=ModelType.CODE,
         temperature=0.2,
         max_tokens=4000,
+        max_batch_size=CODE_MAX_BATCH_SIZE,  # direct generation only, so concurrent users can share decode steps
     )
 }
\ No newline at end of file
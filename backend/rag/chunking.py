@@ -0,0 +1,45 @@
+import codecs
+from typing import List
+
+class StreamingChunker:
+    """Splits text arriving in arbitrary pieces into overlapping chunks.
+
+    Only about one chunk of text is ever buffered, so uploads of any size are
+    chunked as they stream in. Cuts prefer paragraph breaks, then sentence
+    ends, then whitespace.
+    """
+
+    def __init__(self, chunk_chars: int = 1000, overlap: int = 150):
+        self.chunk_chars = chunk_chars
+        self.overlap = overlap
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._buffer = ""
+
+    def _cut(self) -> int:
+        window = self._buffer[:self.chunk_chars]
+        floor = self.chunk_chars // 2
+        for separator in ("\n\n", ". ", "\n", " "):
+            index = window.rfind(separator, floor)
+            if index != -1:
+                return index + len(separator)
+        return self.chunk_chars
+
+    def feed(self, data: bytes) -> List[str]:
+        """Add raw bytes; returns the chunks completed by them."""
+        self._buffer += self._decoder.decode(data)
+        chunks = []
+        while len(self._buffer) >= self.chunk_chars:
+            cut = self._cut()
+            chunk = self._buffer[:cut].strip()
+            if chunk:
+                chunks.append(chunk)
+            # Carry the tail over (from a word boundary) so context spans the cut
+            tail_start = max(0, cut - self.overlap)
+            space = self._buffer.find(" ", tail_start, cut)
+            self._buffer = self._buffer[space + 1 if space != -1 else cut:]
+        return chunks
+
+    def flush(self) -> List[str]:
+        self._buffer += self._decoder.decode(b"", final=True)
+        chunk, self._buffer = self._buffer.strip(), ""
+        return [chunk] if chunk else []
@@ -0,0 +1,54 @@
+import os
+from pathlib import Path
+from typing import Any, Sequence
+import numpy as np
+from routing.classifier import HashedFeaturizer
+from utils.logger import setup_logger
+
+logger = setup_logger("rag.embedder")
+
+class LlamaEmbedder:
+    """Sentence embeddings from a GGUF embedding model, run on CPU by llama.cpp."""
+
+    def __init__(self, model_path: str, n_ctx: int = 512, batch_size: int = 32):
+        from llama_cpp import Llama
+
+        # One decode batch holds several chunks, so each call embeds a whole batch at once
+        self.llm = Llama(
+            model_path=model_path,
+            embedding=True,
+            n_ctx=n_ctx,
+            n_batch=n_ctx * batch_size,
+            n_ubatch=n_ctx * batch_size,
+            use_mmap=True,
+            verbose=False,
+        )
+        self.name = Path(model_path).stem
+        self.dim = self.llm.n_embd()
+        self.batch_size = batch_size
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        return np.asarray(self.llm.embed(list(texts), normalize=True, truncate=True), dtype=np.float32)
+
+class HashingEmbedder:
+    """Lexical fallback: hashed word and character n-grams folded into a dense vector.
+
+    Needs no model file, so retrieval works (as keyword-ish search) before an
+    embedding model has been downloaded.
+    """
+
+    def __init__(self, dim: int = 384):
+        self.featurizer = HashedFeaturizer(dim)
+        self.name = f"hashing-{dim}"
+        self.dim = dim
+        self.batch_size = 256
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        return self.featurizer.transform(texts)
+
+def create_embedder(model_path: str) -> Any:
+    if os.path.exists(model_path):
+        logger.info("Loading embedding model from %s", model_path)
+        return LlamaEmbedder(model_path)
+    logger.warning("No embedding model at %s; falling back to hashed n-gram embeddings", model_path)
+    return HashingEmbedder()
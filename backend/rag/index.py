@@ -0,0 +1,303 @@
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from utils.logger import setup_logger
+
+logger = setup_logger("rag.index")
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+def kmeans(sample: np.ndarray, n_clusters: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """Spherical k-means on normalised vectors; returns unit-length centroids."""
+    rng = np.random.default_rng(seed)
+    centroids = sample[rng.choice(len(sample), n_clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, sample)
+        empty = np.bincount(assignment, minlength=n_clusters) == 0
+        # Reseed empty clusters from random points so no list stays unused
+        sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+        centroids = _normalize(sums)
+    return centroids
+
+class _GrowableMap:
+    """A memory-mapped array file whose first dimension grows by doubling."""
+
+    def __init__(self, path: Path, dtype: Any, row_shape: Tuple[int, ...], fill: int = 0):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.row_shape = row_shape
+        self.fill = fill
+        self.row_bytes = self.dtype.itemsize * int(np.prod(row_shape, dtype=np.int64))
+        self.array: Optional[np.memmap] = None
+        if not path.exists():
+            path.touch()
+        existing = path.stat().st_size // self.row_bytes
+        self._map(max(1, existing), existing)
+
+    @property
+    def capacity(self) -> int:
+        return self.array.shape[0]
+
+    def _map(self, capacity: int, old: int):
+        if self.array is not None:
+            self.array.flush()
+            del self.array
+        with open(self.path, "r+b") as f:
+            f.truncate(capacity * self.row_bytes)
+        self.array = np.memmap(self.path, dtype=self.dtype, mode="r+", shape=(capacity,) + self.row_shape)
+        if self.fill and capacity > old:
+            self.array[old:] = self.fill
+
+    def reserve(self, rows: int):
+        if rows > self.capacity:
+            capacity = self.capacity
+            while capacity < rows:
+                capacity *= 2
+            self._map(capacity, self.capacity)
+
+    def flush(self):
+        self.array.flush()
+
+class VectorIndex:
+    """Disk-backed ANN index: float16 vectors in a memory map, searched through an IVF.
+
+    Vectors are appended to ``vectors.f16`` and never rewritten, so the OS
+    pages them in on demand and the resident set stays small even at
+    millions of chunks. Once enough vectors exist, k-means centroids split
+    them into inverted lists; a query scores the centroids and then only the
+    vectors of the ``nprobe`` closest lists. New vectors join their nearest
+    list on insert and deletes are tombstones, so neither needs a rebuild.
+    Centroids are retrained when the index has grown ``retrain_growth``-fold
+    since the last training, which keeps lists balanced at amortised cost.
+    Chunk text and document metadata live alongside in SQLite.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        dim: int,
+        embedder_name: str = "",
+        train_after: int = 4096,
+        retrain_growth: int = 8,
+        nprobe: Optional[int] = None,
+    ):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.train_after = train_after
+        self.retrain_growth = retrain_growth
+        self.default_nprobe = nprobe
+        self._lock = threading.RLock()
+
+        meta_path = self.path / "meta.json"
+        meta = json.loads(meta_path.read_text()) if meta_path.exists() else {"dim": dim, "embedder": embedder_name, "count": 0, "trained_at": 0}
+        if meta["dim"] != dim or (embedder_name and meta.get("embedder") not in ("", embedder_name)):
+            raise ValueError(
+                f"Index at {self.path} was built with {meta.get('embedder') or 'another embedder'} ({meta['dim']} dims); "
+                f"remove it to re-ingest with {embedder_name} ({dim} dims)"
+            )
+        self.meta = dict(meta, embedder=embedder_name or meta.get("embedder", ""))
+        self.dim = dim
+
+        self.vectors = _GrowableMap(self.path / "vectors.f16", np.float16, (dim,))
+        self.lists = _GrowableMap(self.path / "lists.i32", np.int32, (), fill=-1)
+        self.deleted = _GrowableMap(self.path / "deleted.u8", np.uint8, ())
+        centroids_path = self.path / "centroids.npy"
+        self.centroids: Optional[np.ndarray] = np.load(centroids_path) if centroids_path.exists() else None
+        self._members: List[np.ndarray] = []
+        self._pending: List[List[int]] = []
+        if self.centroids is not None:
+            self._build_lists()
+        # Tombstoned rows, kept as a counter so ``stats`` never has to scan or take the lock
+        self._deleted_count = int(self.deleted.array[:self.count].sum())
+        self._stats: Dict[str, Any] = {}
+        self._publish_stats()
+
+        self._db = sqlite3.connect(self.path / "chunks.sqlite", check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS chunks (row INTEGER PRIMARY KEY, doc_id TEXT NOT NULL, position INTEGER NOT NULL, text TEXT NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS chunks_doc ON chunks (doc_id)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS documents (doc_id TEXT PRIMARY KEY, name TEXT NOT NULL, chunks INTEGER NOT NULL, added_at REAL NOT NULL)"
+        )
+
+    @property
+    def count(self) -> int:
+        return self.meta["count"]
+
+    def live_count(self) -> int:
+        return self.count - self._deleted_count
+
+    def _publish_stats(self):
+        # Called with the lock held after every change; readers on the event loop take the
+        # snapshot without the lock, which ``add`` may hold for seconds while it retrains
+        self._stats = {
+            "vectors": self.count,
+            "live": self.live_count(),
+            "dim": self.dim,
+            "embedder": self.meta.get("embedder"),
+            "ivf_lists": len(self.centroids) if self.centroids is not None else 0,
+            "index_bytes": self.count * self.dim * 2,
+        }
+
+    def _save_meta(self):
+        (self.path / "meta.json").write_text(json.dumps(self.meta))
+
+    def _build_lists(self):
+        assignment = np.asarray(self.lists.array[:self.count])
+        order = np.argsort(assignment, kind="stable").astype(np.int64)
+        bounds = np.searchsorted(assignment[order], np.arange(len(self.centroids) + 1))
+        # Rows not yet assigned (-1) sort first and are skipped by the bounds
+        self._members = [order[bounds[i]:bounds[i + 1]] for i in range(len(self.centroids))]
+        self._pending = [[] for _ in self.centroids]
+
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+        return np.argmax(vectors @ self.centroids.T, axis=1).astype(np.int32)
+
+    def train(self, sample_size: Optional[int] = None):
+        """(Re)train IVF centroids on a sample of the stored vectors and reassign every row."""
+        with self._lock:
+            live = np.flatnonzero(self.deleted.array[:self.count] == 0)
+            if len(live) == 0:
+                return
+            started = time.perf_counter()
+            n_lists = int(np.clip(np.sqrt(len(live)), 16, 4096))
+            n_lists = min(n_lists, len(live))
+            rng = np.random.default_rng(0)
+            sample_rows = np.sort(rng.choice(live, min(len(live), sample_size or n_lists * 32), replace=False))
+            sample = _normalize(self.vectors.array[sample_rows])
+            self.centroids = kmeans(sample, n_lists)
+            for start in range(0, self.count, 65536):
+                stop = min(self.count, start + 65536)
+                self.lists.array[start:stop] = self._assign(np.asarray(self.vectors.array[start:stop], dtype=np.float32))
+            self.lists.flush()
+            np.save(self.path / "centroids.npy", self.centroids)
+            self.meta["trained_at"] = len(live)
+            self._save_meta()
+            self._build_lists()
+            self._publish_stats()
+            logger.info("Trained %d IVF lists over %d vectors in %.2fs", n_lists, len(live), time.perf_counter() - started)
+
+    def add(self, vectors: np.ndarray, doc_id: str, texts: Sequence[str], first_position: int = 0) -> List[int]:
+        """Append vectors (with their chunk text) for ``doc_id``; returns their rows."""
+        vectors = _normalize(vectors)
+        with self._lock:
+            start = self.count
+            stop = start + len(vectors)
+            self.vectors.reserve(stop)
+            self.lists.reserve(stop)
+            self.deleted.reserve(stop)
+            self.vectors.array[start:stop] = vectors
+            self.deleted.array[start:stop] = 0
+            if self.centroids is not None:
+                assignment = self._assign(vectors)
+                self.lists.array[start:stop] = assignment
+                for row, list_id in zip(range(start, stop), assignment.tolist()):
+                    self._pending[list_id].append(row)
+            self._db.executemany(
+                "INSERT INTO chunks (row, doc_id, position, text) VALUES (?, ?, ?, ?)",
+                [(row, doc_id, first_position + i, text) for i, (row, text) in enumerate(zip(range(start, stop), texts))],
+            )
+            self.meta["count"] = stop
+            self._save_meta()
+            self._publish_stats()
+
+            trained_at = self.meta["trained_at"]
+            if (self.centroids is None and stop >= self.train_after) or (trained_at and stop >= trained_at * self.retrain_growth):
+                self.train()
+            return list(range(start, stop))
+
+    def register_document(self, doc_id: str, name: str, chunks: int):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO documents (doc_id, name, chunks, added_at) VALUES (?, ?, ?, ?)",
+                (doc_id, name, chunks, time.time()),
+            )
+
+    def delete(self, doc_id: str) -> int:
+        """Tombstone every chunk of ``doc_id``; returns how many were removed."""
+        with self._lock:
+            rows = [row for (row,) in self._db.execute("SELECT row FROM chunks WHERE doc_id = ?", (doc_id,))]
+            if rows:
+                self._deleted_count += len(rows) - int(self.deleted.array[rows].sum())
+                self.deleted.array[rows] = 1
+                self.deleted.flush()
+                self._publish_stats()
+            self._db.execute("DELETE FROM chunks WHERE doc_id = ?", (doc_id,))
+            self._db.execute("DELETE FROM documents WHERE doc_id = ?", (doc_id,))
+            return len(rows)
+
+    def _candidates(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        if self.centroids is None:
+            return np.arange(self.count)
+        probes = np.argsort(self.centroids @ query)[::-1][:nprobe]
+        parts = []
+        for list_id in probes:
+            if self._pending[list_id]:
+                self._members[list_id] = np.concatenate([self._members[list_id], np.asarray(self._pending[list_id], dtype=np.int64)])
+                self._pending[list_id] = []
+            parts.append(self._members[list_id])
+        return np.sort(np.concatenate(parts)) if parts else np.zeros(0, dtype=np.int64)
+
+    def search(self, query: np.ndarray, k: int = 5, nprobe: Optional[int] = None) -> List[Tuple[int, float]]:
+        """Top-``k`` (row, cosine similarity) pairs for one query vector."""
+        query = _normalize(query.reshape(-1))
+        with self._lock:
+            if self.count == 0:
+                return []
+            if nprobe is None:
+                n_lists = len(self.centroids) if self.centroids is not None else 1
+                nprobe = self.default_nprobe or max(8, n_lists // 16)
+            rows = self._candidates(query, nprobe)
+            rows = rows[self.deleted.array[rows] == 0]
+            if len(rows) == 0:
+                return []
+            scores = np.empty(len(rows), dtype=np.float32)
+            # Score in slices so a brute-force scan never materialises the whole index in float32
+            for start in range(0, len(rows), 65536):
+                block = rows[start:start + 65536]
+                scores[start:start + len(block)] = np.asarray(self.vectors.array[block], dtype=np.float32) @ query
+            top = np.argpartition(-scores, min(k, len(scores)) - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [(int(rows[i]), float(scores[i])) for i in top]
+
+    def chunks(self, rows: Sequence[int]) -> Dict[int, Dict[str, Any]]:
+        if not rows:
+            return {}
+        with self._lock:
+            placeholders = ",".join("?" * len(rows))
+            result = self._db.execute(
+                "SELECT c.row, c.doc_id, c.position, c.text, d.name FROM chunks c LEFT JOIN documents d ON d.doc_id = c.doc_id "
+                f"WHERE c.row IN ({placeholders})",
+                list(rows),
+            ).fetchall()
+        return {row: {"doc_id": doc_id, "position": position, "text": text, "name": name} for row, doc_id, position, text, name in result}
+
+    def documents(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            result = self._db.execute("SELECT doc_id, name, chunks, added_at FROM documents ORDER BY added_at").fetchall()
+        return [{"doc_id": doc_id, "name": name, "chunks": chunks, "added_at": added_at} for doc_id, name, chunks, added_at in result]
+
+    def flush(self):
+        with self._lock:
+            self.vectors.flush()
+            self.lists.flush()
+            self.deleted.flush()
+
+    def close(self):
+        self.flush()
+        self._db.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(self._stats)
@@ -0,0 +1,164 @@
+import asyncio
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+from bs4 import BeautifulSoup
+from models.configs.model_config import EMBEDDING_MODEL_PATH
+from rag.chunking import StreamingChunker
+from rag.embedder import create_embedder
+from rag.index import VectorIndex
+from tools.http_client import http_client
+from utils.logger import setup_logger
+
+logger = setup_logger("rag.store")
+
+# Every upload is capped; ones that have to be parsed whole (HTML) are held in memory, so tighter still
+MAX_UPLOAD_BYTES = int(os.getenv("RAG_MAX_UPLOAD_MB", "50")) * 2**20
+MAX_BUFFERED_UPLOAD_BYTES = min(20 * 2**20, MAX_UPLOAD_BYTES)
+
+# Most passages a search returns
+MAX_SEARCH_RESULTS = 50
+
+class UploadTooLargeError(ValueError):
+    """Raised when an upload exceeds its size limit."""
+
+class DocumentStore:
+    """Ingests documents into a ``VectorIndex`` and answers similarity searches.
+
+    The embedder and index are opened on first use. All embedding and index
+    work runs on one dedicated thread: llama.cpp contexts are not
+    thread-safe, and it keeps CPU-heavy work off the event loop.
+
+    The index has a single writer. When ``search_url`` is set (the other
+    workers of a multi-worker deployment), searches are sent to the worker
+    that owns the index instead of opening it here.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        embedder_factory: Callable[[], Any] = lambda: create_embedder(EMBEDDING_MODEL_PATH),
+        chunk_chars: int = 1000,
+        overlap: int = 150,
+        search_url: Optional[str] = None,
+    ):
+        self.path = path
+        self.search_url = search_url
+        self.embedder_factory = embedder_factory
+        self.chunk_chars = chunk_chars
+        self.overlap = overlap
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rag")
+        self.embedder: Optional[Any] = None
+        self.index: Optional[VectorIndex] = None
+        self.counts = {"documents": 0, "chunks": 0, "ingest_seconds": 0.0, "searches": 0, "search_seconds": 0.0}
+
+    def _open(self):
+        if self.index is None:
+            self.embedder = self.embedder_factory()
+            self.index = VectorIndex(self.path, self.embedder.dim, self.embedder.name)
+
+    async def _run(self, fn: Callable[..., Any], *args) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    def _add_batch(self, doc_id: str, texts: List[str], position: int):
+        self._open()
+        self.index.add(self.embedder.embed(texts), doc_id, texts, position)
+
+    async def ingest(self, name: str, stream: AsyncIterator[bytes], content_type: str = "text/plain") -> Dict[str, Any]:
+        """Chunk and embed a document as it streams in; returns its id and chunk count."""
+        started = time.perf_counter()
+        await self._run(self._open)
+        doc_id = uuid.uuid4().hex
+        chunker = StreamingChunker(self.chunk_chars, self.overlap)
+        batch: List[str] = []
+        total = 0
+
+        async def limited(limit: int, kind: str) -> AsyncIterator[bytes]:
+            received = 0
+            async for data in stream:
+                received += len(data)
+                if received > limit:
+                    raise UploadTooLargeError(f"{kind} are limited to {limit // 2**20} MB")
+                yield data
+
+        async def pieces() -> AsyncIterator[bytes]:
+            if "html" not in content_type:
+                async for data in limited(MAX_UPLOAD_BYTES, "Uploads"):
+                    yield data
+                return
+            # HTML needs the whole document to extract text
+            body = bytearray()
+            async for data in limited(MAX_BUFFERED_UPLOAD_BYTES, "HTML uploads"):
+                body += data
+            yield BeautifulSoup(bytes(body), "html.parser").get_text("\n").encode("utf-8")
+
+        try:
+            async for data in pieces():
+                batch.extend(chunker.feed(data))
+                while len(batch) >= self.embedder.batch_size:
+                    await self._run(self._add_batch, doc_id, batch[:self.embedder.batch_size], total)
+                    total += self.embedder.batch_size
+                    batch = batch[self.embedder.batch_size:]
+            batch.extend(chunker.flush())
+            if batch:
+                await self._run(self._add_batch, doc_id, batch, total)
+                total += len(batch)
+        except Exception:
+            # Don't leave half a document searchable
+            await self._run(self.index.delete, doc_id)
+            raise
+        await self._run(self.index.register_document, doc_id, name, total)
+        await self._run(self.index.flush)
+
+        elapsed = time.perf_counter() - started
+        self.counts["documents"] += 1
+        self.counts["chunks"] += total
+        self.counts["ingest_seconds"] += elapsed
+        logger.info("Ingested '%s' as %s: %d chunks in %.2fs", name, doc_id, total, elapsed)
+        return {"doc_id": doc_id, "name": name, "chunks": total, "seconds": round(elapsed, 3)}
+
+    def _search(self, query: str, k: int) -> List[Dict[str, Any]]:
+        self._open()
+        hits = self.index.search(self.embedder.embed([query])[0], k)
+        chunks = self.index.chunks([row for row, _ in hits])
+        return [dict(chunks[row], score=round(score, 4)) for row, score in hits if row in chunks]
+
+    async def search(self, query: str, k: int = 4) -> List[Dict[str, Any]]:
+        started = time.perf_counter()
+        k = max(1, min(k, MAX_SEARCH_RESULTS))
+        if self.search_url:
+            results = (await http_client.get_json(self.search_url, params={"q": query, "k": str(k)}))["results"]
+        else:
+            results = await self._run(self._search, query, k)
+        self.counts["searches"] += 1
+        self.counts["search_seconds"] += time.perf_counter() - started
+        return results
+
+    async def delete(self, doc_id: str) -> int:
+        await self._run(self._open)
+        return await self._run(self.index.delete, doc_id)
+
+    async def documents(self) -> List[Dict[str, Any]]:
+        await self._run(self._open)
+        return await self._run(self.index.documents)
+
+    def close(self):
+        if self.index is not None:
+            self.executor.submit(self.index.close).result()
+        self.executor.shutdown(wait=False)
+
+    def stats(self) -> Dict[str, Any]:
+        searches = self.counts["searches"]
+        return {
+            "documents_ingested": self.counts["documents"],
+            "chunks_ingested": self.counts["chunks"],
+            "ingest_chunks_per_sec": round(self.counts["chunks"] / self.counts["ingest_seconds"], 1) if self.counts["ingest_seconds"] else 0.0,
+            "searches": searches,
+            "avg_search_ms": round(self.counts["search_seconds"] / searches * 1000, 2) if searches else 0.0,
+            "index": self.index.stats() if self.index is not None else None,
+        }
+
+# Shared by the document search tool and the upload endpoints; closed on application shutdown
+document_store = DocumentStore(os.getenv("RAG_DIR", "./data/rag"), search_url=os.getenv("DOCUMENT_SEARCH_URL"))
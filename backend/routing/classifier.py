@@ -0,0 +1,140 @@
+import json
+import re
+import zlib
+from pathlib import Path
+from typing import Dict, Iterable, List, Sequence, Tuple
+import numpy as np
+
+CATEGORIES = ["CODE", "TOOL", "GENERAL"]
+
+_WORD_RE = re.compile(r"[a-z0-9_+#.]+|[^\sa-z0-9]")
+
+class HashedFeaturizer:
+    """Maps text to a sparse hashed bag of word n-grams and character trigrams.
+
+    Hashing keeps the vocabulary open (new words need no refit) and uses crc32
+    so feature indices are stable across processes, unlike ``hash()``.
+    """
+
+    def __init__(self, n_features: int = 2 ** 14):
+        self.n_features = n_features
+
+    def tokens(self, text: str) -> List[str]:
+        words = _WORD_RE.findall(text.lower())
+        features = [f"w:{w}" for w in words]
+        features += [f"b:{a} {b}" for a, b in zip(words, words[1:])]
+        for word in words:
+            padded = f"<{word}>"
+            features += [f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2)]
+        return features
+
+    def transform_one(self, text: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (indices, values) of the L2-normalised log-TF vector."""
+        counts: Dict[int, int] = {}
+        for feature in self.tokens(text):
+            index = zlib.crc32(feature.encode("utf-8")) % self.n_features
+            counts[index] = counts.get(index, 0) + 1
+        if not counts:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        indices = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+        values = np.log1p(np.fromiter(counts.values(), dtype=np.float32, count=len(counts)))
+        values /= np.linalg.norm(values)
+        return indices, values
+
+    def transform(self, texts: Sequence[str]) -> np.ndarray:
+        """Dense feature matrix for a batch of texts."""
+        matrix = np.zeros((len(texts), self.n_features), dtype=np.float32)
+        for row, text in enumerate(texts):
+            indices, values = self.transform_one(text)
+            matrix[row, indices] = values
+        return matrix
+
+class LinearRouterClassifier:
+    """Multinomial logistic regression over hashed features, in NumPy."""
+
+    def __init__(self, n_features: int = 2 ** 14, categories: Sequence[str] = CATEGORIES):
+        self.featurizer = HashedFeaturizer(n_features)
+        self.categories = list(categories)
+        self.weights = np.zeros((n_features, len(self.categories)), dtype=np.float32)
+        self.bias = np.zeros(len(self.categories), dtype=np.float32)
+        self.trained = False
+
+    def fit(
+        self,
+        texts: Sequence[str],
+        labels: Sequence[str],
+        epochs: int = 100,
+        learning_rate: float = 1.0,
+        l2: float = 1e-4,
+        batch_size: int = 32,
+        seed: int = 0,
+    ) -> "LinearRouterClassifier":
+        targets = np.array([self.categories.index(label) for label in labels])
+        rng = np.random.default_rng(seed)
+        order = np.arange(len(texts))
+        for _ in range(epochs):
+            rng.shuffle(order)
+            # Dense mini-batches keep memory bounded for large query logs
+            for start in range(0, len(order), batch_size):
+                batch = order[start:start + batch_size]
+                features = self.featurizer.transform([texts[i] for i in batch])
+                probs = self._softmax(features @ self.weights + self.bias)
+                probs[np.arange(len(batch)), targets[batch]] -= 1.0
+                probs /= len(batch)
+                self.weights -= learning_rate * (features.T @ probs + l2 * self.weights)
+                self.bias -= learning_rate * probs.sum(axis=0)
+        self.trained = True
+        return self
+
+    def predict_proba(self, text: str) -> Dict[str, float]:
+        indices, values = self.featurizer.transform_one(text)
+        logits = values @ self.weights[indices] + self.bias
+        probs = self._softmax(logits[np.newaxis, :])[0]
+        return {category: float(p) for category, p in zip(self.categories, probs)}
+
+    def predict(self, text: str) -> Tuple[str, float]:
+        probs = self.predict_proba(text)
+        category = max(probs, key=probs.get)
+        return category, probs[category]
+
+    def save(self, path: Path):
+        np.savez_compressed(
+            path,
+            weights=self.weights,
+            bias=self.bias,
+            categories=np.array(self.categories),
+            n_features=self.featurizer.n_features,
+        )
+
+    @classmethod
+    def load(cls, path: Path) -> "LinearRouterClassifier":
+        data = np.load(path)
+        model = cls(int(data["n_features"]), [str(c) for c in data["categories"]])
+        model.weights = data["weights"]
+        model.bias = data["bias"]
+        model.trained = True
+        return model
+
+    @staticmethod
+    def _softmax(logits: np.ndarray) -> np.ndarray:
+        logits = logits - logits.max(axis=1, keepdims=True)
+        exp = np.exp(logits)
+        return exp / exp.sum(axis=1, keepdims=True)
+
+def load_examples(paths: Iterable[Path]) -> Tuple[List[str], List[str]]:
+    """Read labelled ``{"text", "category"}`` JSON lines from one or more files."""
+    texts, labels = [], []
+    for path in paths:
+        path = Path(path)
+        if not path.exists():
+            continue
+        with path.open(encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                record = json.loads(line)
+                if record.get("category") in CATEGORIES and record.get("text"):
+                    texts.append(record["text"])
+                    labels.append(record["category"])
+    return texts, labels
@@ -0,0 +1,108 @@
+import json
+import os
+import re
+import time
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Pattern
+from utils.logger import setup_logger
+
+logger = setup_logger("intents")
+
+INTENTS_PATH = Path(os.getenv("INTENTS_PATH", Path(__file__).parent / "data" / "intents.json"))
+
+# Longer messages are never canned, so they skip the scan entirely
+MAX_LENGTH = 80
+# "hi, thanks!" is two segments; a canned message is a handful at most
+MAX_SEGMENTS = 4
+
+SEPARATORS = r"[\s,.!?;:~()\-]*"
+WORD_END = r"(?![\w'’])"
+
+class Intent(NamedTuple):
+    name: str
+    response: str
+
+def _phrase(text: str) -> str:
+    """Regex for a configured phrase: case and spacing are free, and either apostrophe is accepted."""
+    return r"\s+".join(re.escape(word).replace("'", "['’]") for word in text.split())
+
+def _alternation(phrases: List[str]) -> str:
+    # Longest first, so "hi there" is not cut short at "hi"
+    return "|".join(_phrase(p) for p in sorted(phrases, key=len, reverse=True))
+
+class IntentMatcher:
+    """Answers canned messages (greetings, thanks, goodbyes) without the router or a model.
+
+    Every intent's phrases are compiled into one case-insensitive regex,
+    with a named group per intent and a word boundary after each phrase. A
+    message is canned only when it consists entirely of such phrases, each
+    optionally followed by one of the intent's suffixes ("thanks so much") or
+    an addressee ("hi there"), separated by punctuation. So "hi!" and
+    "thanks, bye" match, while "history of Thailand" and "thanks, now
+    explain X" go on to the router. When several intents appear, the one
+    listed first in the config answers.
+    """
+
+    def __init__(self, intents: List[Dict[str, Any]], addressees: Optional[List[str]] = None):
+        if not intents:
+            raise ValueError("No intents configured")
+        self.intents: List[Intent] = []
+        groups = []
+        for index, spec in enumerate(intents):
+            if not spec.get("name") or not spec.get("patterns") or not spec.get("response"):
+                raise ValueError(f"Intent #{index} needs a name, patterns and a response")
+            self.intents.append(Intent(spec["name"], spec["response"]))
+            body = f"(?:{_alternation(spec['patterns'])}){WORD_END}"
+            if spec.get("suffixes"):
+                body += rf"(?:\s+(?:{_alternation(spec['suffixes'])}){WORD_END})?"
+            groups.append(f"(?P<i{index}>{body})")
+        tail = rf"(?:\s+(?:{_alternation(addressees)}){WORD_END})?" if addressees else ""
+        self.pattern: Pattern = re.compile(f"{SEPARATORS}(?:{'|'.join(groups)}){tail}{SEPARATORS}", re.IGNORECASE)
+        self.checks = 0
+        self.seconds = 0.0
+        self.hits: Dict[str, int] = {intent.name: 0 for intent in self.intents}
+
+    @classmethod
+    def load(cls, path: Path = INTENTS_PATH) -> "IntentMatcher":
+        with open(path, encoding="utf-8") as f:
+            config = json.load(f)
+        matcher = cls(config.get("intents", []), config.get("addressees"))
+        logger.info("Loaded %d fast-path intents from %s", len(matcher.intents), path)
+        return matcher
+
+    def _scan(self, text: str) -> Optional[Intent]:
+        if len(text) > MAX_LENGTH:
+            return None
+        position, best = 0, None
+        for _ in range(MAX_SEGMENTS):
+            match = self.pattern.match(text, position)
+            if match is None:
+                return None
+            index = int(match.lastgroup[1:])
+            best = index if best is None else min(best, index)
+            position = match.end()
+            if position == len(text):
+                return self.intents[best]
+        return None
+
+    def match(self, text: str) -> Optional[Intent]:
+        """The intent ``text`` consists of, or None if it needs the router."""
+        started = time.perf_counter()
+        intent = self._scan(text.strip())
+        self.seconds += time.perf_counter() - started
+        self.checks += 1
+        if intent is not None:
+            self.hits[intent.name] += 1
+        return intent
+
+    def stats(self) -> Dict[str, Any]:
+        hits = sum(self.hits.values())
+        return {
+            "checks": self.checks,
+            "hits": hits,
+            "hit_rate": round(hits / self.checks, 4) if self.checks else 0.0,
+            "by_intent": dict(self.hits),
+            "avg_latency_us": round(self.seconds / self.checks * 1e6, 2) if self.checks else 0.0,
+        }
+
+intent_matcher = IntentMatcher.load()
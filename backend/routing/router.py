@@ -0,0 +1,114 @@
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional
+from routing.classifier import LinearRouterClassifier, load_examples
+from routing.rules import match_rules
+from utils.logger import setup_logger, setup_record_logger
+
+logger = setup_logger("router")
+
+DATA_DIR = Path(__file__).parent / "data"
+SEED_QUERIES = DATA_DIR / "seed_queries.jsonl"
+MODEL_PATH = DATA_DIR / "router_model.npz"
+QUERY_LOG = Path(__file__).parent.parent / "logs" / "routing_queries.jsonl"
+# The query log holds raw user text, so it is only written when enabled; it rotates at QUERY_LOG_MAX_BYTES
+QUERY_LOG_ENABLED = os.getenv("ROUTING_QUERY_LOG", "0") == "1"
+QUERY_LOG_MAX_BYTES = int(os.getenv("ROUTING_QUERY_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+QUERY_LOG_BACKUPS = 3
+
+# Below this probability the classifier defers to the LLM
+CONFIDENCE_THRESHOLD = 0.6
+
+# Set on a fallback result by the failure path only, when there was no LLM decision
+FALLBACK_SOURCE_KEY = "_fallback_source"
+
+# Decisions from these sources are trustworthy enough to train on; "default" (nothing decided) never is
+TRAINABLE_SOURCES = ("rules", "llm")
+
+def load_classifier(model_path: Path = MODEL_PATH, training_files: Iterable[Path] = (SEED_QUERIES,)) -> LinearRouterClassifier:
+    """Load saved weights, or fit on the labelled files if none exist yet."""
+    if Path(model_path).exists():
+        logger.info("Loading router classifier from %s", model_path)
+        return LinearRouterClassifier.load(model_path)
+    texts, labels = load_examples(training_files)
+    logger.info("Training router classifier on %d examples", len(texts))
+    return LinearRouterClassifier().fit(texts, labels)
+
+class QueryRouter:
+    """Decides CODE / TOOL / GENERAL without an LLM call whenever it safely can.
+
+    Stages, cheapest first: regex rules, the hashed linear classifier, and
+    only when the classifier is unsure, the LLM classifier passed in as
+    ``llm_fallback``. A fallback result marks itself with
+    ``FALLBACK_SOURCE_KEY: "default"`` when the LLM gave no usable answer.
+    """
+
+    def __init__(
+        self,
+        classifier: Optional[LinearRouterClassifier] = None,
+        llm_fallback: Optional[Callable[[str], Awaitable[Dict[str, Any]]]] = None,
+        threshold: float = CONFIDENCE_THRESHOLD,
+        query_log: Optional[Path] = QUERY_LOG if QUERY_LOG_ENABLED else None,
+    ):
+        self.classifier = classifier
+        self.llm_fallback = llm_fallback
+        self.threshold = threshold
+        self.query_log = query_log
+        self.query_logger = setup_record_logger(f"router.queries.{query_log}", query_log, QUERY_LOG_MAX_BYTES, QUERY_LOG_BACKUPS) if query_log else None
+        self.counts: Dict[str, int] = {"rules": 0, "classifier": 0, "llm": 0, "default": 0}
+        self.latency: Dict[str, float] = {source: 0.0 for source in self.counts}
+
+    def route_local(self, text: str) -> Dict[str, Any]:
+        """Route with rules and the classifier only; ``confident`` says whether to trust it."""
+        rule = match_rules(text)
+        if rule is not None:
+            category, reason = rule
+            return {"category": category, "reason": reason, "confidence": 1.0, "source": "rules", "confident": True}
+        if self.classifier is None:
+            return {"category": "GENERAL", "reason": "No classifier loaded", "confidence": 0.0, "source": "default", "confident": False}
+        category, confidence = self.classifier.predict(text)
+        return {
+            "category": category,
+            "reason": f"Classifier prediction ({confidence:.2f})",
+            "confidence": round(confidence, 4),
+            "source": "classifier",
+            "confident": confidence >= self.threshold,
+        }
+
+    async def route(self, text: str) -> Dict[str, Any]:
+        started = time.perf_counter()
+        decision = self.route_local(text)
+        if not decision.pop("confident") and self.llm_fallback is not None:
+            result = await self.llm_fallback(text)
+            source = result.get(FALLBACK_SOURCE_KEY, "llm")
+            decision = {
+                "category": result.get("category", "GENERAL"),
+                "reason": result.get("reason", ""),
+                "confidence": None,
+                "source": source if source in self.counts else "llm",
+            }
+        source = decision["source"]
+        self.counts[source] += 1
+        self.latency[source] += time.perf_counter() - started
+        self._log(text, decision)
+        return decision
+
+    def _log(self, text: str, decision: Dict[str, Any]):
+        """Queue trustworthy decisions for the query log used for retraining."""
+        if self.query_logger is None or decision["source"] not in TRAINABLE_SOURCES:
+            return
+        self.query_logger.info(json.dumps({"text": text, "category": decision["category"], "source": decision["source"]}))
+
+    def stats(self) -> Dict[str, Any]:
+        total = sum(self.counts.values())
+        return {
+            "total": total,
+            "by_source": dict(self.counts),
+            "llm_fallback_rate": round(self.counts["llm"] / total, 4) if total else 0.0,
+            "avg_latency_ms": {
+                source: round(self.latency[source] / count * 1000, 3) if count else 0.0
+                for source, count in self.counts.items()
+            },
+        }
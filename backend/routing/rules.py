@@ -0,0 +1,32 @@
+import re
+from typing import List, Optional, Pattern, Tuple
+
+# High-precision patterns only: anything ambiguous is left to the classifier.
+# Each entry is (category, reason, pattern); the first match wins.
+RULES: List[Tuple[str, str, Pattern]] = [
+    ("CODE", "Contains a code block", re.compile(r"```")),
+    ("CODE", "Contains a stack trace or compiler error", re.compile(
+        r"traceback \(most recent call last\)|\b\w+(error|exception): |\bsegmentation fault\b", re.I)),
+    ("CODE", "Contains source code", re.compile(
+        r"\bdef \w+\s*\(|\bclass \w+\s*[(:{]|\bfunction\s*\w*\s*\(|\b(const|let|var) \w+\s*=|#include\s*<"
+        r"|\bpublic static void\b|=>\s*\{|\bSELECT\b.+\bFROM\b")),
+    ("CODE", "Asks for a program or code change", re.compile(
+        r"\b(write|fix|debug|refactor|optimi[sz]e|implement)\b.{0,40}\b(code|function|script|class|method|regex|program|bug)\b", re.I)),
+    ("TOOL", "Asks about the weather", re.compile(
+        r"\b(weather|forecast)\b|\bis it (raining|snowing)\b", re.I)),
+    ("TOOL", "Asks for a calculation", re.compile(
+        r"^\s*[\d.(][\d\s.+\-*/^%()]*[+\-*/^%][\d\s.+\-*/^%()]*\??\s*$"
+        r"|\b(calculate|compute|evaluate)\b"
+        r"|\bwhat(?:'s| is)\s+[\d.(][\d\s.+\-*/^%()]*[+\-*/^%]\s*[\d(]", re.I)),
+    ("TOOL", "Asks for API documentation", re.compile(
+        r"\b(openapi|swagger)\b|https?://\S+\.(json|ya?ml)\b", re.I)),
+    ("TOOL", "Asks to look something up", re.compile(
+        r"\b(search (the web|online|wikipedia|for)|look up|latest news|on wikipedia)\b", re.I)),
+]
+
+def match_rules(text: str) -> Optional[Tuple[str, str]]:
+    """Return (category, reason) for the first matching rule, or None."""
+    for category, reason, pattern in RULES:
+        if pattern.search(text):
+            return category, reason
+    return None
@@ -0,0 +1,34 @@
+"""Retrain the router classifier from the seed set plus logged routing decisions.
+
+Usage (from ``backend/``):
+    python -m routing.train [--log logs/routing_queries.jsonl] [--out routing/data/router_model.npz]
+"""
+import argparse
+from pathlib import Path
+from routing.classifier import LinearRouterClassifier, load_examples
+from routing.router import MODEL_PATH, QUERY_LOG, SEED_QUERIES
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seed", type=Path, default=SEED_QUERIES, help="Hand-labelled seed queries")
+    parser.add_argument("--log", type=Path, action="append", help="Logged routing decisions (repeatable)")
+    parser.add_argument("--out", type=Path, default=MODEL_PATH, help="Where to write the weights")
+    parser.add_argument("--epochs", type=int, default=100)
+    args = parser.parse_args()
+
+    # The query log and its rotated backups (routing_queries.jsonl.1, ...)
+    files = [args.seed] + (args.log or sorted(QUERY_LOG.parent.glob(QUERY_LOG.name + "*")))
+    texts, labels = load_examples(files)
+    if not texts:
+        raise SystemExit("No training examples found")
+    counts = {label: labels.count(label) for label in sorted(set(labels))}
+    print(f"Training on {len(texts)} examples: {counts}")
+
+    model = LinearRouterClassifier().fit(texts, labels, epochs=args.epochs)
+    correct = sum(model.predict(text)[0] == label for text, label in zip(texts, labels))
+    print(f"Training accuracy: {correct / len(texts):.3f}")
+    model.save(args.out)
+    print(f"Saved weights to {args.out}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+import os
+import uuid
+import zlib
+
+# Set by the supervisor for each worker process; a single uvicorn process is worker 0 of 1
+WORKER_INDEX = int(os.getenv("WORKER_INDEX", "0"))
+WORKER_COUNT = int(os.getenv("WORKER_COUNT", "1"))
+
+def worker_for(session_id: str, count: int) -> int:
+    """The worker that owns a session: a stable hash, so every process agrees without coordination."""
+    return zlib.crc32(session_id.encode("utf-8")) % count
+
+def new_session_id() -> str:
+    """A fresh session id that routes back to this worker.
+
+    The first request of a conversation can land on any worker; minting an
+    id that hashes here keeps the rest of the conversation (its memory and
+    KV prefix snapshots) on the worker that already holds it. Takes
+    ``WORKER_COUNT`` tries on average.
+    """
+    while True:
+        session_id = uuid.uuid4().hex
+        if WORKER_COUNT <= 1 or worker_for(session_id, WORKER_COUNT) == WORKER_INDEX:
+            return session_id
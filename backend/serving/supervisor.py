@@ -0,0 +1,323 @@
+"""Multi-worker deployment: N uvicorn processes behind a session-sticky proxy.
+
+Each worker is a full copy of the API on its own local port. The workers share:
+- the model weights: GGUF files are memory-mapped read-only, so the OS keeps one copy in the page cache
+- the session store and response cache, through SQLite files (``SESSION_DB``, ``RESPONSE_CACHE_DB``)
+
+The proxy on ``--port`` routes by session id, so a conversation's memory and
+its KV prefix snapshots stay on the worker that built them. New
+conversations go to the least busy worker, which mints a session id that
+hashes back to itself. Document uploads go to worker 0, the index's only
+writer; the other workers send their document searches there.
+
+Workers start one at a time: each one is started, waits until it is
+healthy, optionally warms its models (``--preload``), and only then does
+the next one start, so N workers never read weights at the same moment.
+A worker that exits is restarted the same way.
+
+Usage (from ``backend/``):
+    python -m serving.supervisor [--workers 4] [--port 8000] [--preload general] [--stagger 2]
+"""
+import argparse
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import aiohttp
+from aiohttp import web
+from serving.affinity import worker_for
+from utils.logger import setup_logger
+
+logger = setup_logger("supervisor")
+
+BACKEND_DIR = Path(__file__).parent.parent
+
+# Per-connection headers that must not be forwarded by a proxy
+HOP_HEADERS = {"connection", "keep-alive", "proxy-authenticate", "proxy-authorization", "te", "trailer", "transfer-encoding", "upgrade", "host", "content-length"}
+
+class Worker:
+    def __init__(self, index: int, port: int):
+        self.index = index
+        self.port = port
+        self.process: Optional[subprocess.Popen] = None
+        self.ready = False
+        self.in_flight = 0
+        self.requests = 0
+        self.restarts = 0
+        self.started_at: Optional[float] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "index": self.index,
+            "port": self.port,
+            "pid": self.process.pid if self.process else None,
+            "ready": self.ready,
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "restarts": self.restarts,
+            "uptime_seconds": round(time.time() - self.started_at, 1) if self.started_at and self.ready else None,
+        }
+
+class Supervisor:
+    """Starts, health-checks and restarts the workers, and proxies requests to them."""
+
+    def __init__(
+        self,
+        app: str,
+        workers: int,
+        base_port: int,
+        preload: List[str],
+        stagger: float,
+        ready_timeout: float = 300.0,
+        allow_pinning: bool = False,
+    ):
+        self.app = app
+        self.workers = [Worker(index, base_port + index) for index in range(workers)]
+        self.preload = preload
+        self.stagger = stagger
+        self.ready_timeout = ready_timeout
+        # Honour a client's X-Worker header; for debugging only, since it bypasses session affinity
+        self.allow_pinning = allow_pinning
+        # Serializes (re)starts, which is what staggers them
+        self._starting = asyncio.Lock()
+        self._client: Optional[aiohttp.ClientSession] = None
+
+    def _env(self, worker: Worker) -> Dict[str, str]:
+        env = dict(os.environ, WORKER_INDEX=str(worker.index), WORKER_COUNT=str(len(self.workers)), LOG_FILE=f"app.worker{worker.index}.log")
+        # Split the cores instead of every worker's llama.cpp taking half the machine
+        env.setdefault("LLAMA_THREADS", str(max(1, (os.cpu_count() or 1) // len(self.workers))))
+        if worker.index != 0:
+            env["DOCUMENT_SEARCH_URL"] = f"{self.workers[0].url}/api/documents/search"
+        return env
+
+    async def _start(self, worker: Worker):
+        async with self._starting:
+            logger.info("Starting worker %d on port %d", worker.index, worker.port)
+            worker.process = subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", self.app, "--host", "127.0.0.1", "--port", str(worker.port), "--log-level", "warning"],
+                cwd=BACKEND_DIR,
+                env=self._env(worker),
+            )
+            worker.started_at = time.time()
+            if not await self._wait_healthy(worker):
+                logger.error("Worker %d did not become healthy within %.0fs", worker.index, self.ready_timeout)
+                worker.process.terminate()
+                return
+            for name in self.preload:
+                await self._preload(worker, name)
+            worker.ready = True
+            logger.info("Worker %d ready in %.1fs", worker.index, time.time() - worker.started_at)
+            await asyncio.sleep(self.stagger)
+
+    async def _wait_healthy(self, worker: Worker) -> bool:
+        deadline = time.monotonic() + self.ready_timeout
+        while time.monotonic() < deadline:
+            if worker.process.poll() is not None:
+                return False
+            try:
+                async with self._client.get(f"{worker.url}/api/health", timeout=aiohttp.ClientTimeout(total=2)) as response:
+                    if response.status == 200:
+                        return True
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                pass
+            await asyncio.sleep(0.25)
+        return False
+
+    async def _preload(self, worker: Worker, name: str):
+        try:
+            async with self._client.post(f"{worker.url}/api/models/{name}/load", timeout=aiohttp.ClientTimeout(total=self.ready_timeout)) as response:
+                if response.status != 200:
+                    logger.warning("Worker %d could not preload '%s': HTTP %d", worker.index, name, response.status)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.warning("Worker %d could not preload '%s': %s", worker.index, name, e)
+
+    async def _monitor(self):
+        while True:
+            await asyncio.sleep(1.0)
+            for worker in self.workers:
+                if worker.process is not None and worker.process.poll() is not None:
+                    worker.ready = False
+                    worker.restarts += 1
+                    # Back off so a worker that crashes on startup doesn't spin
+                    delay = min(30.0, 2.0 ** min(worker.restarts, 5))
+                    logger.warning("Worker %d exited with code %s; restarting in %.0fs", worker.index, worker.process.returncode, delay)
+                    await asyncio.sleep(delay)
+                    await self._start(worker)
+
+    async def run(self):
+        self._client = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=0),
+            # Streams last as long as generation does; only connecting is bounded
+            timeout=aiohttp.ClientTimeout(total=None, sock_connect=5),
+            auto_decompress=False,
+        )
+        for worker in self.workers:
+            await self._start(worker)
+        await self._monitor()
+
+    async def stop(self):
+        for worker in self.workers:
+            worker.ready = False
+            if worker.process is not None and worker.process.poll() is None:
+                worker.process.terminate()
+        for worker in self.workers:
+            if worker.process is not None:
+                try:
+                    worker.process.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    worker.process.kill()
+        if self._client is not None:
+            await self._client.close()
+
+    def pick(self, path: str, session_id: Optional[str], pinned: Optional[str]) -> Optional[Worker]:
+        ready = [worker for worker in self.workers if worker.ready]
+        if not ready:
+            return None
+        if self.allow_pinning and pinned is not None and pinned.isdigit() and int(pinned) < len(self.workers):
+            return self.workers[int(pinned)] if self.workers[int(pinned)].ready else None
+        if path.startswith("/api/documents") and not path.startswith("/api/documents/search"):
+            # Single writer for the document index
+            return self.workers[0] if self.workers[0].ready else None
+        if session_id:
+            owner = self.workers[worker_for(session_id, len(self.workers))]
+            if owner.ready:
+                return owner
+            # Owner is restarting: any worker can pick the session up from SESSION_DB
+        return min(ready, key=lambda worker: (worker.in_flight, worker.requests))
+
+    async def proxy(self, request: web.Request) -> web.StreamResponse:
+        body: Any = None
+        session_id = request.headers.get("X-Session-Id")
+        if request.path == "/api/chat" and request.method == "POST":
+            body = await request.read()
+            try:
+                session_id = (await request.json()).get("session_id") or session_id
+            except (ValueError, AttributeError):
+                pass  # The worker reports the malformed body
+        elif request.path.startswith("/api/sessions/"):
+            session_id = request.match_info.get("tail", "").rsplit("/", 1)[-1] or session_id
+        elif request.body_exists:
+            body = request.content  # Uploads stream through without buffering
+
+        worker = self.pick(request.path, session_id, request.headers.get("X-Worker"))
+        if worker is None:
+            return web.json_response({"detail": "No worker is ready"}, status=503, headers={"Retry-After": "5"})
+
+        headers = {name: value for name, value in request.headers.items() if name.lower() not in HOP_HEADERS}
+        worker.in_flight += 1
+        worker.requests += 1
+        try:
+            async with self._client.request(request.method, worker.url + request.path_qs, headers=headers, data=body, allow_redirects=False) as upstream:
+                response = web.StreamResponse(status=upstream.status, headers={
+                    name: value for name, value in upstream.headers.items() if name.lower() not in HOP_HEADERS
+                })
+                response.headers["X-Worker"] = str(worker.index)
+                await response.prepare(request)
+                async for chunk in upstream.content.iter_any():
+                    await response.write(chunk)
+                await response.write_eof()
+                return response
+        except (aiohttp.ClientError, ConnectionError) as e:
+            logger.warning("Worker %d failed to answer %s %s: %s", worker.index, request.method, request.path, e)
+            return web.json_response({"detail": f"Worker {worker.index} is unavailable"}, status=502)
+        finally:
+            worker.in_flight -= 1
+
+    async def health(self, request: web.Request) -> web.Response:
+        ready = sum(worker.ready for worker in self.workers)
+        status = "healthy" if ready == len(self.workers) else "degraded" if ready else "starting"
+        return web.json_response({"status": status, "workers": [worker.stats() for worker in self.workers]})
+
+    async def metrics(self, request: web.Request) -> web.Response:
+        """Every worker's metrics in one scrape, each sample labelled with its worker."""
+        families: Dict[str, Dict[str, List[str]]] = {}
+        for worker in self.workers:
+            if not worker.ready:
+                continue
+            try:
+                async with self._client.get(f"{worker.url}/api/metrics") as response:
+                    text = await response.text()
+            except aiohttp.ClientError:
+                continue
+            family = None
+            for line in text.splitlines():
+                if line.startswith("# HELP "):
+                    family = line.split()[2]
+                    families.setdefault(family, {"meta": [], "samples": []})
+                    if not families[family]["meta"]:
+                        families[family]["meta"].append(line)
+                elif line.startswith("# TYPE ") and family is not None:
+                    if len(families[family]["meta"]) < 2:
+                        families[family]["meta"].append(line)
+                elif line and family is not None:
+                    name, _, rest = line.partition(" ")
+                    label = f'worker="{worker.index}"'
+                    name = name.replace("{", "{" + label + ",", 1) if "{" in name else f"{name}{{{label}}}"
+                    families[family]["samples"].append(f"{name} {rest}")
+        lines = [line for family in families.values() for line in family["meta"] + family["samples"]]
+        return web.Response(text="\n".join(lines) + "\n", content_type="text/plain", charset="utf-8")
+
+def build_app(supervisor: Supervisor) -> web.Application:
+    app = web.Application(client_max_size=0)
+    app.router.add_get("/api/health", supervisor.health)
+    app.router.add_get("/api/metrics", supervisor.metrics)
+    app.router.add_route("*", "/{tail:.*}", supervisor.proxy)
+    return app
+
+async def serve(args: argparse.Namespace):
+    supervisor = Supervisor(
+        args.app, args.workers, args.worker_port or args.port + 1, [name for name in args.preload.split(",") if name], args.stagger,
+        allow_pinning=args.allow_worker_header,
+    )
+    runner = web.AppRunner(build_app(supervisor), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, args.host, args.port).start()
+    logger.info("Proxy listening on http://%s:%d for %d workers", args.host, args.port, args.workers)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            pass  # Windows: Ctrl+C arrives as KeyboardInterrupt instead
+    workers = asyncio.create_task(supervisor.run())
+    try:
+        await stop.wait()
+    finally:
+        workers.cancel()
+        await supervisor.stop()
+        await runner.cleanup()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 4) // 4))
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000, help="Public port of the proxy")
+    parser.add_argument("--worker-port", type=int, help="Port of worker 0; the others follow (default: --port + 1)")
+    parser.add_argument("--app", default="main:app", help="ASGI app each worker serves")
+    parser.add_argument("--preload", default="general", help="Comma-separated models each worker loads before taking traffic")
+    parser.add_argument("--stagger", type=float, default=2.0, help="Seconds between one worker becoming ready and the next starting")
+    parser.add_argument("--allow-worker-header", action="store_true", help="Debugging: route requests with an X-Worker: <N> header to that worker")
+    args = parser.parse_args()
+
+    # Conversations and cached answers must be visible to every worker (and survive restarts)
+    data_dir = BACKEND_DIR / "data"
+    data_dir.mkdir(exist_ok=True)
+    os.environ.setdefault("SESSION_DB", str(data_dir / "sessions.sqlite"))
+    os.environ.setdefault("RESPONSE_CACHE_DB", str(data_dir / "response_cache.sqlite"))
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The backend's modules import each other from the backend directory (``from utils.metrics import ...``)
+sys.path.insert(0, str(Path(__file__).parent.parent))
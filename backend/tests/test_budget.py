@@ -0,0 +1,105 @@
+import pytest
+from inference.budget import PROFILES, GenerationUsage, answer_profile, finish_truncated, parse_json_object, route_budget
+from inference.registry import MIN_REPLY_TOKENS, ModelRegistry
+from models.configs.model_config import ModelConfig, ModelType
+
+@pytest.mark.parametrize("route, text, budget", [
+    ("general", "What is the capital of Peru?", 320),
+    ("general", "Briefly, what is a black hole?", 128),
+    ("general", "Explain black holes in detail", 500),
+    ("code", "How do I read a file in Python?", 1024),
+    ("code", "Give me a one line answer: how do I reverse a list?", 384),
+    ("code", "Write a full implementation of a trie", 4000),
+    ("code", "Why does this fail?\n```py\nx = [1\n```", 4000),
+])
+def test_route_budget(route, text, budget):
+    assert route_budget(route, text, 4000) == budget
+
+def test_route_budget_is_capped_by_the_model():
+    assert route_budget("code", "Write a full implementation of a trie", 2000) == 2000
+    assert route_budget("agent", "anything", 700) == 700
+
+@pytest.mark.parametrize("text, profile", [
+    ("What is a black hole?", "default"),
+    ("Briefly, what is a black hole?", "brief"),
+    ("Explain black holes in detail", "detailed"),
+])
+def test_answer_profile_names_the_budget(text, profile):
+    assert answer_profile("general", text, 4000)[0] == profile
+
+def test_parse_json_object_counts_trailing_chatter_as_waste():
+    usage = GenerationUsage()
+    usage.completion_tokens = 40
+    text = '```json\n{"category": "CODE", "reason": "code"}\n```\nThis query is about programming.'
+    assert parse_json_object(text, usage) == {"category": "CODE", "reason": "code"}
+    assert usage.wasted_tokens > 0
+
+@pytest.mark.parametrize("text", ["CODE", "[1, 2]", '{"category": "CODE"'])
+def test_parse_json_object_rejects_non_objects(text):
+    with pytest.raises(ValueError):
+        parse_json_object(text)
+
+def truncated_usage(completion_tokens: int = 100) -> GenerationUsage:
+    usage = GenerationUsage()
+    usage.truncated = True
+    usage.completion_tokens = completion_tokens
+    return usage
+
+def test_finish_truncated_leaves_complete_answers_alone():
+    assert finish_truncated("general", "An unfinished thought", GenerationUsage()) == "An unfinished thought"
+
+def test_finish_truncated_drops_the_unfinished_sentence():
+    usage = truncated_usage()
+    text = "Rome was founded in 753 BC. It grew into an empire that spanned the Mediterranean. Its fall came in"
+    assert finish_truncated("general", text, usage) == "Rome was founded in 753 BC. It grew into an empire that spanned the Mediterranean."
+    assert usage.wasted_tokens > 0
+
+def test_finish_truncated_keeps_a_fragment_when_most_would_be_lost():
+    text = "Short. Then a very long sentence that ran out of budget before it could reach its end"
+    assert finish_truncated("general", text, truncated_usage()) == text
+
+def test_finish_truncated_closes_an_open_code_fence():
+    text = "Here it is:\n```python\ndef f():\n    return 1"
+    assert finish_truncated("code", text, truncated_usage()) == text + "\n```"
+
+def test_classification_profile_kwargs():
+    kwargs = PROFILES["classification"].kwargs()
+    assert kwargs["max_tokens"] == 64 and kwargs["temperature"] == 0.0
+    assert "grammar" in kwargs
+
+class RecordingLLM:
+    """A model without a tokenizer, so the registry sizes prompts by characters."""
+
+    def __init__(self):
+        self.calls = []
+
+    def invoke(self, prompt, **kwargs):
+        self.calls.append((prompt, kwargs))
+        return "ok"
+
+def registry_with(context_window: int, max_tokens: int = 500):
+    llm = RecordingLLM()
+    config = ModelConfig("test", "/nonexistent.gguf", ModelType.GENERAL, max_tokens=max_tokens, context_window=context_window, idle_timeout=None)
+    registry = ModelRegistry({ModelType.GENERAL: config}, memory_budget_bytes=2**40, llm_factory=lambda config: llm, engine_factory=lambda config, llm: None)
+    return registry, llm
+
+def test_answer_budget_shrinks_to_the_room_left():
+    registry, llm = registry_with(context_window=512)
+    usage = GenerationUsage()
+    registry.invoke(ModelType.GENERAL, "x" * 4 * 400, usage=usage, max_tokens=300)
+    prompt, kwargs = llm.calls[0]
+    assert prompt == "x" * 1600
+    assert usage.prompt_trimmed_tokens == 0
+    assert kwargs["max_tokens"] == usage.max_tokens == 512 - 400
+
+def test_oversized_prompt_is_cut_from_the_middle():
+    registry, llm = registry_with(context_window=512)
+    usage = GenerationUsage()
+    prompt = "INSTRUCTIONS " + "history " * 1000 + "QUESTION?"
+    registry.invoke(ModelType.GENERAL, prompt, usage=usage, max_tokens=300)
+    sent, kwargs = llm.calls[0]
+    assert sent.startswith("INSTRUCTIONS") and sent.endswith("QUESTION?")
+    assert "\n...\n" in sent
+    assert usage.prompt_trimmed_tokens > 0
+    assert kwargs["max_tokens"] >= MIN_REPLY_TOKENS
+    assert usage.prompt_tokens + usage.max_tokens <= 512
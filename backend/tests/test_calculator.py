@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+from tools.calculator import MAX_SERIES_LENGTH, Budget, CalculationError, evaluate, format_result
+
+@pytest.mark.parametrize("expression, expected", [
+    ("2**10 / 4", "256"),
+    ("sqrt(2) * sqrt(2)", "2"),
+    ("3 ^ 2", "9"),
+    ("10 ÷ 4 =", "2.5"),
+    ("`factorial(5)`", "120"),
+    ("sum(range(1, 101))", "5050"),
+    ("mean([3, 5, 8]) * 3", "16"),
+    ("max(3, 7, 5)", "7"),
+    ("[1, 2, 3] * 2", "[2, 4, 6]"),
+    ("len(range(50)) ", "50"),
+])
+def test_evaluates(expression, expected):
+    assert format_result(evaluate(expression)) == expected
+
+def test_long_series_are_abbreviated():
+    assert format_result(evaluate("range(100)")).endswith("(100 values)")
+
+@pytest.mark.parametrize("expression", [
+    "__import__('os')",
+    "open('/etc/passwd')",
+    "(1).__class__",
+    "[x for x in range(3)]",
+    "lambda: 1",
+    "x",
+    "sum(values=1)",
+    "'text'",
+])
+def test_rejects_unsupported_syntax(expression):
+    with pytest.raises(CalculationError):
+        evaluate(expression)
+
+@pytest.mark.parametrize("expression", [
+    "9 ** 100000",
+    "2 ** 100 ** 100",
+    "factorial(100000)",
+    "comb(5000, 2500)",
+    "10 ** 5000 * 10 ** 5000",
+    f"range({MAX_SERIES_LENGTH + 1})",
+    f"linspace(0, 1, {MAX_SERIES_LENGTH + 1})",
+    "+".join(["1"] * 300),
+    "(" * 1000 + "1" + ")" * 1000,
+])
+def test_rejects_oversized_work(expression):
+    with pytest.raises(CalculationError):
+        evaluate(expression)
+
+@pytest.mark.parametrize("expression", [
+    "sum([range(1000000)] * 120)",
+    "sum([range(1000000), range(1000000)])",
+    "sum([range(9) * 2, 1])",
+    "[1, [2, 3]]",
+])
+def test_list_items_must_be_numbers(expression):
+    with pytest.raises(CalculationError, match="not series"):
+        evaluate(expression)
+
+def test_total_series_values_are_capped():
+    expression = " + ".join(["sum(range(1000000))"] * 5)
+    with pytest.raises(CalculationError, match="series values"):
+        evaluate(expression)
+    # A single series under the cap is fine
+    assert evaluate("sum(range(1000000))") == 499999500000
+
+def test_budget_charges_series_results():
+    budget = Budget(time_limit=1.0, max_elements=10)
+    budget.track(np.zeros(6))
+    budget.track(3.0)
+    with pytest.raises(CalculationError):
+        budget.track(np.zeros(6))
+
+def test_time_limit():
+    budget = Budget(time_limit=0.0)
+    with pytest.raises(CalculationError, match="longer than"):
+        budget.check()
@@ -0,0 +1,69 @@
+import pytest
+from routing.intents import MAX_LENGTH, IntentMatcher
+
+@pytest.fixture(scope="module")
+def matcher():
+    return IntentMatcher.load()
+
+@pytest.mark.parametrize("text, intent", [
+    ("hi", "greeting"),
+    ("Hello!", "greeting"),
+    ("  hey there  ", "greeting"),
+    ("HI BOT", "greeting"),
+    ("thanks", "thanks"),
+    ("Thank you so much!", "thanks"),
+    ("thx, bye", "thanks"),
+    ("bye bye", "goodbye"),
+    ("how's it going?", "how_are_you"),
+    ("how’s it going", "how_are_you"),
+    ("Good morning!", "good_morning"),
+    ("hello, good evening", "good_evening"),
+])
+def test_canned_messages(matcher, text, intent):
+    match = matcher.match(text)
+    assert match is not None
+    assert match.name == intent
+
+@pytest.mark.parametrize("text", [
+    "history of Thailand",
+    "hiking trails near Denver",
+    "hey, what's the weather in Oslo?",
+    "thanks, now explain recursion",
+    "they said hello",
+    "hi'",
+    "byebye",
+    "yoga for beginners",
+    "",
+    "hi " * (MAX_LENGTH // 3 + 1),
+])
+def test_everything_else_goes_to_the_router(matcher, text):
+    assert matcher.match(text) is None
+
+def test_more_than_max_segments_is_not_canned(matcher):
+    assert matcher.match("hi, hi, hi, hi") is not None
+    assert matcher.match("hi, hi, hi, hi, hi") is None
+
+def test_config_order_decides_between_intents():
+    matcher = IntentMatcher([
+        {"name": "first", "patterns": ["hello"], "response": "1"},
+        {"name": "second", "patterns": ["bye"], "response": "2"},
+    ])
+    assert matcher.match("bye, hello").name == "first"
+
+def test_stats_count_checks_and_hits():
+    matcher = IntentMatcher([{"name": "greeting", "patterns": ["hi"], "response": "Hello!"}])
+    matcher.match("hi")
+    matcher.match("history")
+    stats = matcher.stats()
+    assert stats["checks"] == 2 and stats["hits"] == 1
+    assert stats["hit_rate"] == 0.5
+    assert stats["by_intent"] == {"greeting": 1}
+
+@pytest.mark.parametrize("intents", [
+    [],
+    [{"name": "greeting", "patterns": [], "response": "Hello!"}],
+    [{"name": "greeting", "patterns": ["hi"]}],
+])
+def test_rejects_incomplete_config(intents):
+    with pytest.raises(ValueError):
+        IntentMatcher(intents)
@@ -0,0 +1,87 @@
+import asyncio
+import time
+import pytest
+from langchain.tools import BaseTool
+from agents.parallel import MAX_CALLS, ParallelToolAgent, ToolCall, parse_plan
+
+TOOLS = ["calculator", "weather_search", "web_search"]
+
+def test_parse_plan_reads_calls():
+    calls = parse_plan('{"calls": [{"tool": "weather_search", "input": "Paris"}, {"tool": "weather_search", "input": " Rome "}]}', TOOLS)
+    assert [(call.tool, call.input) for call in calls] == [("weather_search", "Paris"), ("weather_search", "Rome")]
+
+def test_parse_plan_skips_chatter_and_fences():
+    text = 'Sure! ```json\n{"calls": [{"tool": "calculator", "input": "2+2"}]}\n``` Hope that helps {not json'
+    calls = parse_plan(text, TOOLS)
+    assert [(call.tool, call.input) for call in calls] == [("calculator", "2+2")]
+
+def test_parse_plan_empty_plan_means_no_tools():
+    assert parse_plan('{"calls": []}', TOOLS) == []
+
+def test_parse_plan_drops_repeated_calls():
+    text = '{"calls": [{"tool": "calculator", "input": "2+2"}, {"tool": "calculator", "input": "2+2 "}]}'
+    assert len(parse_plan(text, TOOLS)) == 1
+
+def test_parse_plan_caps_the_number_of_calls():
+    calls = ", ".join(f'{{"tool": "calculator", "input": "{n}+1"}}' for n in range(MAX_CALLS + 3))
+    assert len(parse_plan(f'{{"calls": [{calls}]}}', TOOLS)) == MAX_CALLS
+
+@pytest.mark.parametrize("text", [
+    "I don't need any tools",
+    '{"calls": [{"tool": "shell", "input": "rm -rf /"}]}',
+    '{"calls": "calculator"}',
+    '{"tools": []}',
+    '{"calls": [["calculator", "2+2"]]}',
+    '{"calls": [{"tool": "calculator", "input": "2+2"}',
+])
+def test_parse_plan_rejects_unusable_output(text):
+    assert parse_plan(text, TOOLS) is None
+
+class EchoTool(BaseTool):
+    name: str = "echo"
+    description: str = "Echoes its input"
+    return_direct: bool = True
+
+    async def _arun(self, query: str) -> str:
+        return query
+
+    def _run(self, query: str) -> str:
+        return query
+
+class LookupTool(EchoTool):
+    name: str = "lookup"
+    return_direct: bool = False
+
+class SlowTool(EchoTool):
+    name: str = "slow"
+
+    async def _arun(self, query: str) -> str:
+        await asyncio.sleep(1)
+        return query
+
+def run_calls(agent, *calls):
+    calls = [ToolCall(tool, tool_input) for tool, tool_input in calls]
+    asyncio.run(agent.execute(calls, time.perf_counter()))
+    return calls
+
+def test_direct_answer_when_every_tool_answers_directly():
+    agent = ParallelToolAgent(None, [EchoTool(), LookupTool()])
+    calls = run_calls(agent, ("echo", "Sunny, 21°C"), ("echo", "Rainy, 12°C"))
+    assert agent.direct_answer(calls) == "Sunny, 21°C\n\nRainy, 12°C"
+
+def test_error_output_is_a_failed_call():
+    agent = ParallelToolAgent(None, [EchoTool()])
+    calls = run_calls(agent, ("echo", "Error fetching weather: timeout"))
+    assert calls[0].status == "error"
+    assert agent.direct_answer(calls) is None
+
+def test_synthesis_needed_for_non_direct_tools():
+    agent = ParallelToolAgent(None, [EchoTool(), LookupTool()])
+    calls = run_calls(agent, ("echo", "42"), ("lookup", "Rome was founded in 753 BC"))
+    assert agent.direct_answer(calls) is None
+
+def test_timed_out_call_is_reported():
+    agent = ParallelToolAgent(None, [SlowTool()], timeouts={"slow": 0.01})
+    calls = run_calls(agent, ("slow", "late"))
+    assert calls[0].status == "timeout"
+    assert agent.direct_answer(calls) is None
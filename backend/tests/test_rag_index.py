@@ -0,0 +1,47 @@
+import threading
+import numpy as np
+from rag.index import VectorIndex
+
+def vectors(n: int, dim: int = 8, seed: int = 0) -> np.ndarray:
+    return np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+
+def test_stats_track_adds_and_deletes(tmp_path):
+    index = VectorIndex(str(tmp_path), dim=8, train_after=64)
+    index.add(vectors(40), "a", [f"a{i}" for i in range(40)])
+    index.add(vectors(40, seed=1), "b", [f"b{i}" for i in range(40)])
+    assert index.stats()["ivf_lists"] > 0
+    assert index.delete("a") == 40
+    assert index.delete("a") == 0
+    stats = index.stats()
+    assert stats["vectors"] == 80 and stats["live"] == 40
+    index.close()
+
+    reopened = VectorIndex(str(tmp_path), dim=8)
+    assert reopened.live_count() == 40
+    reopened.close()
+
+def test_stats_do_not_wait_for_the_index_lock(tmp_path):
+    index = VectorIndex(str(tmp_path), dim=8)
+    index.add(vectors(10), "a", [str(i) for i in range(10)])
+    held, release = threading.Event(), threading.Event()
+
+    def hold_lock():
+        # Stands in for a long IVF retrain inside ``add``
+        with index._lock:
+            held.set()
+            release.wait(5)
+
+    holder = threading.Thread(target=hold_lock)
+    holder.start()
+    held.wait(5)
+    try:
+        result = {}
+        reader = threading.Thread(target=lambda: result.update(index.stats()))
+        reader.start()
+        reader.join(1)
+        assert not reader.is_alive()
+        assert result["live"] == 10
+    finally:
+        release.set()
+        holder.join()
+        index.close()
@@ -0,0 +1,28 @@
+from cache.response_cache import ResponseCache, SQLiteBackend, make_key, normalize_prompt
+
+def test_normalize_folds_case_spacing_and_trailing_punctuation():
+    assert normalize_prompt("  What is   the Capital of PERU?? ") == "what is the capital of peru"
+
+def test_code_keys_keep_case_and_indentation():
+    params = {"temperature": 0.2, "max_tokens": 1024}
+    indented = "def f(x):\n    if x:\n        return X\n    return x"
+    flattened = "def f(x):\n    if x:\n    return X\n    return x"
+    assert make_key("code", "m", params, indented) != make_key("code", "m", params, flattened)
+    assert make_key("code", "m", params, "Return X") != make_key("code", "m", params, "return x")
+    assert make_key("code", "m", params, indented + "\n") == make_key("code", "m", params, indented)
+    assert make_key("generation", "m", params, "Return X") == make_key("generation", "m", params, "return   x?")
+
+def test_cache_round_trip_and_bypass():
+    cache = ResponseCache(max_entries=8, max_temperature=0.5)
+    cache.set("generation", "m", {"temperature": 0.2}, "Hello there", "Hi!")
+    assert cache.get("generation", "m", {"temperature": 0.2}, "hello there!") == ("Hi!", "hit")
+    assert cache.get("generation", "m", {"temperature": 0.9}, "hello there") == (None, "bypass")
+
+def test_sqlite_backend_prunes_least_recently_used(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / "cache.sqlite"), max_entries=10)
+    backend.PRUNE_EVERY = 5
+    for i in range(23):
+        backend.set(f"k{i}", i, ttl=60)
+    # Pruned at the 20th insert; three more arrived since
+    assert len(backend) == 13
+    assert backend.get("k0") is None and backend.get("k22") == 22
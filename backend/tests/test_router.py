@@ -0,0 +1,104 @@
+import asyncio
+import json
+import time
+import pytest
+from routing.router import FALLBACK_SOURCE_KEY, QueryRouter, load_classifier
+from routing.rules import match_rules
+
+@pytest.mark.parametrize("text, category", [
+    ("```python\nprint('hi')\n```", "CODE"),
+    ("Traceback (most recent call last):\n  File \"x.py\"", "CODE"),
+    ("why does def parse(line): return None", "CODE"),
+    ("Please fix the bug in my sorting function", "CODE"),
+    ("What's the weather in Paris?", "TOOL"),
+    ("is it raining in London", "TOOL"),
+    ("12 * (3 + 4)", "TOOL"),
+    ("what is 2^10 + 5", "TOOL"),
+    ("calculate the compound interest", "TOOL"),
+    ("summarize https://example.com/openapi.json", "TOOL"),
+    ("look up the population of Peru", "TOOL"),
+])
+def test_rules_match(text, category):
+    rule = match_rules(text)
+    assert rule is not None
+    assert rule[0] == category
+
+@pytest.mark.parametrize("text", [
+    "Tell me about the history of Rome",
+    "What is the meaning of life?",
+    "Write a poem about autumn",
+    "What is 2024 known for?",
+])
+def test_rules_leave_ambiguous_queries_alone(text):
+    assert match_rules(text) is None
+
+def test_rules_win_over_fallback(tmp_path):
+    async def fallback(text):
+        raise AssertionError("the LLM should not be consulted")
+
+    router = QueryRouter(classifier=None, llm_fallback=fallback, query_log=tmp_path / "queries.jsonl")
+    decision = asyncio.run(router.route("What's the weather in Oslo?"))
+    assert decision["category"] == "TOOL" and decision["source"] == "rules"
+
+def test_confident_classifier_skips_fallback():
+    async def fallback(text):
+        raise AssertionError("the LLM should not be consulted")
+
+    router = QueryRouter(classifier=load_classifier(), llm_fallback=fallback, threshold=0.0, query_log=None)
+    decision = asyncio.run(router.route("How do I reverse a linked list in Python?"))
+    assert decision["source"] == "classifier"
+    assert decision["category"] == "CODE"
+
+def test_unsure_classifier_defers_to_llm():
+    async def fallback(text):
+        return {"category": "GENERAL", "reason": "Small talk"}
+
+    router = QueryRouter(classifier=load_classifier(), llm_fallback=fallback, threshold=1.01, query_log=None)
+    decision = asyncio.run(router.route("Tell me about the history of Rome"))
+    assert decision == {"category": "GENERAL", "reason": "Small talk", "confidence": None, "source": "llm"}
+    assert router.stats()["llm_fallback_rate"] == 1.0
+
+def read_log(path, timeout=2.0):
+    # The query log is written by a background thread
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if path.exists() and path.read_text():
+            time.sleep(0.05)
+            break
+        time.sleep(0.01)
+    return [json.loads(line) for line in path.read_text().splitlines()] if path.exists() else []
+
+def test_failed_llm_classification_is_not_logged_for_training(tmp_path):
+    async def fallback(text):
+        return {"category": "GENERAL", "reason": "Classification failed", FALLBACK_SOURCE_KEY: "default"}
+
+    async def labelled(text):
+        return {"category": "CODE", "reason": "Asks about code"}
+
+    log = tmp_path / "queries.jsonl"
+    failing = QueryRouter(classifier=None, llm_fallback=fallback, query_log=log)
+    decision = asyncio.run(failing.route("Tell me about the history of Rome"))
+    assert decision["source"] == "default"
+    assert failing.stats()["by_source"]["llm"] == 0
+
+    working = QueryRouter(classifier=None, llm_fallback=labelled, query_log=log)
+    asyncio.run(working.route("how do closures capture variables"))
+    assert read_log(log) == [{"text": "how do closures capture variables", "category": "CODE", "source": "llm"}]
+
+@pytest.mark.parametrize("source", ["bogus", "default", "rules"])
+def test_source_in_model_output_is_ignored(source):
+    async def fallback(text):
+        # What a model without grammar support might emit
+        return {"category": "CODE", "reason": "Asks about code", "source": source}
+
+    router = QueryRouter(classifier=None, llm_fallback=fallback, query_log=None)
+    decision = asyncio.run(router.route("how do closures capture variables"))
+    assert decision["source"] == "llm"
+    assert router.stats()["by_source"]["llm"] == 1
+
+def test_unknown_fallback_marker_counts_as_llm():
+    async def fallback(text):
+        return {"category": "GENERAL", "reason": "x", FALLBACK_SOURCE_KEY: "bogus"}
+
+    router = QueryRouter(classifier=None, llm_fallback=fallback, query_log=None)
+    assert asyncio.run(router.route("tell me a story"))["source"] == "llm"
@@ -0,0 +1,79 @@
+import asyncio
+import threading
+import pytest
+from inference.scheduler import InferenceScheduler, QueueFullError, QueueTimeoutError
+
+def blocking(release: threading.Event) -> str:
+    release.wait(5)
+    return "done"
+
+def test_run_returns_result_and_counts():
+    async def scenario():
+        scheduler = InferenceScheduler()
+        scheduler.register("model", max_concurrency=1, max_queue=2, queue_timeout=1.0)
+        result = await scheduler.run("model", lambda x: x * 2, 21)
+        return result, scheduler.stats("model")
+
+    result, stats = asyncio.run(scenario())
+    assert result == 42
+    assert stats["completed"] == 1 and stats["failed"] == 0 and stats["running"] == 0
+
+def test_queue_full_rejects_past_max_queue():
+    async def scenario():
+        scheduler = InferenceScheduler()
+        scheduler.register("model", max_concurrency=1, max_queue=1, queue_timeout=5.0)
+        release = threading.Event()
+        running = asyncio.ensure_future(scheduler.run("model", blocking, release))
+        await asyncio.sleep(0.05)
+        waiting = asyncio.ensure_future(scheduler.run("model", blocking, release))
+        await asyncio.sleep(0.05)
+        with pytest.raises(QueueFullError) as excinfo:
+            await scheduler.run("model", blocking, release)
+        release.set()
+        results = await asyncio.gather(running, waiting)
+        return excinfo.value, results, scheduler.stats("model")
+
+    error, results, stats = asyncio.run(scenario())
+    assert error.model == "model" and error.depth == 1
+    assert results == ["done", "done"]
+    assert stats["rejected"] == 1
+    assert stats["completed"] == 2
+    assert stats["queue_depth"] == 0
+
+def test_queue_timeout_when_no_slot_frees_up():
+    async def scenario():
+        scheduler = InferenceScheduler()
+        scheduler.register("model", max_concurrency=1, max_queue=4, queue_timeout=0.05)
+        release = threading.Event()
+        running = asyncio.ensure_future(scheduler.run("model", blocking, release))
+        await asyncio.sleep(0.02)
+        with pytest.raises(QueueTimeoutError) as excinfo:
+            await scheduler.run("model", blocking, release)
+        release.set()
+        await running
+        return excinfo.value, scheduler.stats("model")
+
+    error, stats = asyncio.run(scenario())
+    assert error.waited >= 0.05
+    assert stats["timed_out"] == 1
+    assert stats["queue_depth"] == 0
+    assert stats["completed"] == 1
+
+def test_failed_call_releases_its_slot():
+    def boom():
+        raise RuntimeError("model crashed")
+
+    async def scenario():
+        scheduler = InferenceScheduler()
+        scheduler.register("model", max_concurrency=1, max_queue=1, queue_timeout=1.0)
+        with pytest.raises(RuntimeError):
+            await scheduler.run("model", boom)
+        return await scheduler.run("model", lambda: "ok"), scheduler.stats("model")
+
+    result, stats = asyncio.run(scenario())
+    assert result == "ok"
+    assert stats["failed"] == 1 and stats["completed"] == 1
+
+def test_unknown_model_raises_key_error():
+    with pytest.raises(KeyError):
+        InferenceScheduler().worker("missing")
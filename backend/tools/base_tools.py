@@ -1,14 +1,30 @@
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Tuple
+from uuid import UUID
 from langchain.tools import BaseTool
-import requests
-from bs4 import BeautifulSoup
-import json
-import aiohttp
-from datetime import datetime
+from langchain_core.callbacks import BaseCallbackHandler
+import asyncio
+import os
+import time
+from rag.store import document_store
+from tools.calculator import evaluate, format_result
+from tools.http_client import ToolHTTPError, http_client
+from utils.metrics import metrics, observe_stage
+
+# Upstream endpoints; override to point the tools at local stub servers
+NOMINATIM_URL = os.getenv("NOMINATIM_URL", "https://nominatim.openstreetmap.org/search")
+OPEN_METEO_URL = os.getenv("OPEN_METEO_URL", "https://api.open-meteo.com/v1/forecast")
+WIKIPEDIA_API_URL = os.getenv("WIKIPEDIA_API_URL", "https://en.wikipedia.org/w/api.php")
+
+# How long each kind of upstream result stays fresh
+GEOCODE_TTL = 7 * 24 * 3600  # place coordinates practically never change
+WEATHER_TTL = 10 * 60  # Open-Meteo refreshes current conditions every 15 minutes
+WIKIPEDIA_TTL = 6 * 3600
 
 class WeatherTool(BaseTool):
     name: str = "weather_search"
     description: str = "Search for current weather information using OpenMeteo API"
+    # Output answers the question as-is, so agents skip the synthesis step
+    return_direct: bool = True
 
     async def _arun(self, query: str) -> str:
         # Using free OpenMeteo API and Nominatim for geocoding
@@ -21,41 +37,46 @@ class WeatherTool(BaseTool):
                 location = "New York"
             else:
                 # Use Nominatim geocoding
-                async with aiohttp.ClientSession() as session:
-                    geocode_url = f"https://nominatim.openstreetmap.org/search?q={location}&format=json&limit=1"
-                    headers = {'User-Agent': 'LLMandAgent/1.0'}
-                    async with session.get(geocode_url, headers=headers) as geocode_response:
-                        geocode_data = await geocode_response.json()
-                        if not geocode_data:
-                            return f"Could not find location: {location}"
-                        lat = float(geocode_data[0]['lat'])
-                        lon = float(geocode_data[0]['lon'])
+                geocode_data = await http_client.get_json(
+                    NOMINATIM_URL,
+                    params={'q': location, 'format': 'json', 'limit': '1'},
+                    cache_ttl=GEOCODE_TTL,
+                )
+                if not geocode_data:
+                    return f"Could not find location: {location}"
+                lat = float(geocode_data[0]['lat'])
+                lon = float(geocode_data[0]['lon'])
             
-            # Get weather data
-            async with aiohttp.ClientSession() as session:
-                url = f"https://api.open-meteo.com/v1/forecast?latitude={lat}&longitude={lon}&current=temperature_2m,relative_humidity_2m,apparent_temperature,precipitation,weather_code,wind_speed_10m,wind_direction_10m"
-                async with session.get(url) as response:
-                    data = await response.json()
-                    current = data.get('current', {})
-                    
-                    # Convert weather code to description
-                    weather_codes = {
-                        0: "Clear sky", 1: "Mainly clear", 2: "Partly cloudy", 3: "Overcast",
-                        45: "Foggy", 48: "Depositing rime fog",
-                        51: "Light drizzle", 53: "Moderate drizzle", 55: "Dense drizzle",
-                        61: "Slight rain", 63: "Moderate rain", 65: "Heavy rain",
-                        71: "Slight snow", 73: "Moderate snow", 75: "Heavy snow",
-                        77: "Snow grains", 85: "Snow showers", 86: "Heavy snow showers",
-                        95: "Thunderstorm", 96: "Thunderstorm with hail", 99: "Thunderstorm with heavy hail"
-                    }
-                    weather_desc = weather_codes.get(current.get('weather_code'), "Unknown conditions")
-                    
-                    return (f"Current weather in {location}:\n"
-                           f"• Conditions: {weather_desc}\n"
-                           f"• Temperature: {current.get('temperature_2m')}°C (Feels like: {current.get('apparent_temperature')}°C)\n"
-                           f"• Humidity: {current.get('relative_humidity_2m')}%\n"
-                           f"• Wind: {current.get('wind_speed_10m')} km/h from {current.get('wind_direction_10m')}°\n"
-                           f"• Precipitation: {current.get('precipitation')} mm")
+            # Get weather data, rounding coordinates so nearby lookups share a cache entry
+            data = await http_client.get_json(
+                OPEN_METEO_URL,
+                params={
+                    'latitude': f"{lat:.2f}",
+                    'longitude': f"{lon:.2f}",
+                    'current': 'temperature_2m,relative_humidity_2m,apparent_temperature,precipitation,weather_code,wind_speed_10m,wind_direction_10m',
+                },
+                cache_ttl=WEATHER_TTL,
+            )
+            current = data.get('current', {})
+            
+            # Convert weather code to description
+            weather_codes = {
+                0: "Clear sky", 1: "Mainly clear", 2: "Partly cloudy", 3: "Overcast",
+                45: "Foggy", 48: "Depositing rime fog",
+                51: "Light drizzle", 53: "Moderate drizzle", 55: "Dense drizzle",
+                61: "Slight rain", 63: "Moderate rain", 65: "Heavy rain",
+                71: "Slight snow", 73: "Moderate snow", 75: "Heavy snow",
+                77: "Snow grains", 85: "Snow showers", 86: "Heavy snow showers",
+                95: "Thunderstorm", 96: "Thunderstorm with hail", 99: "Thunderstorm with heavy hail"
+            }
+            weather_desc = weather_codes.get(current.get('weather_code'), "Unknown conditions")
+            
+            return (f"Current weather in {location}:\n"
+                   f"• Conditions: {weather_desc}\n"
+                   f"• Temperature: {current.get('temperature_2m')}°C (Feels like: {current.get('apparent_temperature')}°C)\n"
+                   f"• Humidity: {current.get('relative_humidity_2m')}%\n"
+                   f"• Wind: {current.get('wind_speed_10m')} km/h from {current.get('wind_direction_10m')}°\n"
+                   f"• Precipitation: {current.get('precipitation')} mm")
         except Exception as e:
             return f"Error fetching weather: {str(e)}"
 
@@ -69,69 +90,58 @@ class WebSearchTool(BaseTool):
     async def _arun(self, query: str) -> str:
         # Using Wikipedia API as a free source of information
         try:
-            # Add proper user agent and headers for Wikipedia API
-            headers = {
-                'User-Agent': 'LLMandAgent/1.0 (https://github.com/donadley/LLMandAgent; info@llmandagent.com) Python/3.9',
-                'Accept': 'application/json'
+            # First search for articles
+            params = {
+                'action': 'query',
+                'format': 'json',
+                'list': 'search',
+                'srsearch': str(query),
+                'utf8': '1',  # Changed to string
+                'srlimit': '3'  # Changed to string
             }
             
-            async with aiohttp.ClientSession(headers=headers) as session:
-                # First search for articles
-                params = {
-                    'action': 'query',
-                    'format': 'json',
-                    'list': 'search',
-                    'srsearch': str(query),
-                    'utf8': '1',  # Changed to string
-                    'srlimit': '3'  # Changed to string
-                }
+            try:
+                data = await http_client.get_json(WIKIPEDIA_API_URL, params=params, cache_ttl=WIKIPEDIA_TTL)
+            except ToolHTTPError as e:
+                return f"Error: Could not search Wikipedia (Status: {e.status}). {e.text}"
+            except ValueError as e:
+                return f"Error: Could not parse Wikipedia response. {str(e)}"
                 
-                async with session.get('https://en.wikipedia.org/w/api.php', params=params) as response:
-                    if response.status != 200:
-                        error_text = await response.text()
-                        return f"Error: Could not search Wikipedia (Status: {response.status}). {error_text}"
-                        
-                    try:
-                        data = await response.json()
-                    except Exception as e:
-                        return f"Error: Could not parse Wikipedia response. {str(e)}"
-                        
-                    results = data.get('query', {}).get('search', [])
-                    if not results:
-                        return "No results found for your query."
-                    
-                    # Get extracts for top results
-                    titles = [result['title'] for result in results[:3]]
-                    extract_params = {
-                        'action': 'query',
-                        'format': 'json',
-                        'prop': 'extracts',
-                        'exintro': '1',  # Changed to string
-                        'explaintext': '1',  # Changed to string
-                        'titles': '|'.join(titles)
-                    }
-                    
-                    async with session.get('https://en.wikipedia.org/w/api.php', params=extract_params) as extract_response:
-                        if extract_response.status != 200:
-                            return f"Error: Could not fetch article details (Status: {extract_response.status})"
-                            
-                        extract_data = await extract_response.json()
-                        pages = extract_data.get('query', {}).get('pages', {})
-                        
-                        # Combine information from multiple results
-                        summaries = []
-                        for page in pages.values():
-                            title = page.get('title', '')
-                            extract = page.get('extract', '')
-                            if extract:
-                                # Limit extract length and add to summaries
-                                summary = f"\n• {title}:\n{extract[:500]}..."
-                                summaries.append(summary)
-                        
-                        if summaries:
-                            return "Here's what I found:" + ''.join(summaries)
-                        else:
-                            return "Found articles but couldn't get detailed information."
+            results = data.get('query', {}).get('search', [])
+            if not results:
+                return "No results found for your query."
+            
+            # Get extracts for top results
+            titles = [result['title'] for result in results[:3]]
+            extract_params = {
+                'action': 'query',
+                'format': 'json',
+                'prop': 'extracts',
+                'exintro': '1',  # Changed to string
+                'explaintext': '1',  # Changed to string
+                'titles': '|'.join(titles)
+            }
+            
+            try:
+                extract_data = await http_client.get_json(WIKIPEDIA_API_URL, params=extract_params, cache_ttl=WIKIPEDIA_TTL)
+            except ToolHTTPError as e:
+                return f"Error: Could not fetch article details (Status: {e.status})"
+            pages = extract_data.get('query', {}).get('pages', {})
+            
+            # Combine information from multiple results
+            summaries = []
+            for page in pages.values():
+                title = page.get('title', '')
+                extract = page.get('extract', '')
+                if extract:
+                    # Limit extract length and add to summaries
+                    summary = f"\n• {title}:\n{extract[:500]}..."
+                    summaries.append(summary)
+            
+            if summaries:
+                return "Here's what I found:" + ''.join(summaries)
+            else:
+                return "Found articles but couldn't get detailed information."
         except Exception as e:
             return f"Error searching web: {str(e)}"
 
@@ -144,29 +154,29 @@ class APIDocTool(BaseTool):
 
     async def _arun(self, url: str) -> str:
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        # Parse OpenAPI spec
-                        info = data.get('info', {})
-                        paths = data.get('paths', {})
-                        
-                        # Create summary
-                        summary = [
-                            f"API Name: {info.get('title')}",
-                            f"Version: {info.get('version')}",
-                            f"Description: {info.get('description')}",
-                            "\nEndpoints:",
-                        ]
-                        
-                        for path, methods in paths.items():
-                            for method, details in methods.items():
-                                summary.append(f"\n{method.upper()} {path}")
-                                summary.append(f"Description: {details.get('description', 'No description')}")
-                                
-                        return "\n".join(summary)
-                    return f"Error: Could not fetch API documentation (Status: {response.status})"
+            try:
+                # Specs rarely change: keep them and revalidate with the server's ETag
+                data = await http_client.get_json(url.strip(), revalidate=True)
+            except ToolHTTPError as e:
+                return f"Error: Could not fetch API documentation (Status: {e.status})"
+            # Parse OpenAPI spec
+            info = data.get('info', {})
+            paths = data.get('paths', {})
+            
+            # Create summary
+            summary = [
+                f"API Name: {info.get('title')}",
+                f"Version: {info.get('version')}",
+                f"Description: {info.get('description')}",
+                "\nEndpoints:",
+            ]
+            
+            for path, methods in paths.items():
+                for method, details in methods.items():
+                    summary.append(f"\n{method.upper()} {path}")
+                    summary.append(f"Description: {details.get('description', 'No description')}")
+                    
+            return "\n".join(summary)
         except Exception as e:
             return f"Error fetching API documentation: {str(e)}"
 
@@ -175,22 +185,86 @@ class APIDocTool(BaseTool):
 
 class CalculatorTool(BaseTool):
     name: str = "calculator"
-    description: str = "Useful for performing mathematical calculations"
+    description: str = (
+        "Useful for performing mathematical calculations. Input is a single math expression, e.g. "
+        "'2**10 / 3' or 'sqrt(2) * pi'. Works on whole series in one call: lists like [3, 5, 8] and "
+        "range(1, 101) support element-wise arithmetic and sum, mean, median, std, min, max, prod, cumsum."
+    )
+    return_direct: bool = True
 
     def _run(self, query: str) -> str:
+        # Evaluated by a whitelisting AST interpreter with size and time limits, never eval()
         try:
-            return str(eval(query))
+            return format_result(evaluate(query))
         except Exception as e:
             return f"Error in calculation: {str(e)}"
 
     async def _arun(self, query: str) -> str:
-        return self._run(query)
+        # Evaluation is CPU-bound (up to TIME_LIMIT), so keep it off the event loop
+        return await asyncio.to_thread(self._run, query)
+
+class DocumentSearchTool(BaseTool):
+    name: str = "document_search"
+    description: str = "Search the documents the user has uploaded. Use this for questions about their files, notes or docs. Input should be a search query."
+
+    async def _arun(self, query: str) -> str:
+        try:
+            hits = await document_store.search(query.strip())
+            if not hits:
+                return "No uploaded documents matched your query."
+            passages = [f"\n• {hit['name'] or hit['doc_id']} (part {hit['position'] + 1}):\n{hit['text'][:800]}" for hit in hits]
+            return "Relevant passages from uploaded documents:" + "".join(passages)
+        except Exception as e:
+            return f"Error searching documents: {str(e)}"
+
+    def _run(self, query: str) -> str:
+        raise NotImplementedError("Use async version")
+
+TOOL_CALLS = metrics.counter("llmagent_tool_calls_total", "Tool calls by tool and outcome (ok, error, timeout).", ["tool", "status"])
+TOOL_SECONDS = metrics.histogram("llmagent_tool_seconds", "Tool call latency.", ["tool"])
+
+class ToolMetricsHandler(BaseCallbackHandler):
+    """Counts and times every tool call, whichever agent made it.
+
+    The tools report failures as text rather than raising, so an output
+    starting with "Error" counts as an error.
+    """
+
+    # Run on the calling task so stage timings land on the current request's trace
+    run_inline = True
+
+    def __init__(self, max_pending: int = 1024):
+        self.max_pending = max_pending
+        self._pending: Dict[UUID, Tuple[str, float]] = {}
+
+    def on_tool_start(self, serialized: Dict[str, Any], input_str: str, *, run_id: UUID, **kwargs: Any) -> None:
+        if len(self._pending) >= self.max_pending:
+            # Calls cancelled mid-flight (timeouts) never report back; drop the oldest
+            self._pending.pop(next(iter(self._pending)))
+        self._pending[run_id] = (serialized.get("name", "unknown"), time.perf_counter())
+
+    def _finish(self, run_id: UUID, status: str):
+        name, started = self._pending.pop(run_id, (None, 0.0))
+        if name is None:
+            return
+        elapsed = time.perf_counter() - started
+        TOOL_CALLS.inc(tool=name, status=status)
+        TOOL_SECONDS.observe(elapsed, tool=name)
+        observe_stage(f"tool.{name}", elapsed)
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._finish(run_id, "error" if str(output).startswith("Error") else "ok")
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._finish(run_id, "error")
 
 def get_tools() -> List[BaseTool]:
     """Returns a list of available tools."""
+    handler = ToolMetricsHandler()
     return [
-        WeatherTool(),
-        WebSearchTool(),
-        APIDocTool(),
-        CalculatorTool(),
+        WeatherTool(callbacks=[handler]),
+        WebSearchTool(callbacks=[handler]),
+        APIDocTool(callbacks=[handler]),
+        CalculatorTool(callbacks=[handler]),
+        DocumentSearchTool(callbacks=[handler]),
     ]
\ No newline at end of file
@@ -0,0 +1,342 @@
+import ast
+import math
+import operator
+import time
+from functools import lru_cache
+from typing import Any, Callable, Dict
+import numpy as np
+
+# Bounds on what a single expression may cost
+MAX_EXPRESSION_LENGTH = 2000
+MAX_OPERANDS = 256  # numbers and names in the expression, including list elements
+MAX_NODES = 1024
+MAX_EXPONENT = 10000
+MAX_INT_BITS = 10000  # ~3000 digits, below Python's int-to-str limit
+MAX_FACTORIAL = 1000
+MAX_SERIES_LENGTH = 1_000_000
+MAX_TOTAL_ELEMENTS = 4 * MAX_SERIES_LENGTH  # series values produced over a whole evaluation
+TIME_LIMIT = 1.0  # seconds of evaluation, checked between operations
+MAX_SHOWN = 20  # series longer than this are shown abbreviated
+
+class CalculationError(ValueError):
+    """Raised for expressions the calculator refuses or cannot evaluate."""
+
+Value = Any
+Compiled = Callable[["Budget"], Value]
+
+class Budget:
+    """Time and memory allowance for one evaluation."""
+
+    def __init__(self, time_limit: float, max_elements: int = MAX_TOTAL_ELEMENTS):
+        self.time_limit = time_limit
+        self.deadline = time.perf_counter() + time_limit
+        self.max_elements = max_elements
+        self.elements = 0
+
+    def check(self):
+        if time.perf_counter() > self.deadline:
+            raise CalculationError(f"calculation took longer than {self.time_limit:g}s")
+
+    def track(self, value: Value) -> Value:
+        """Charge a series result against the element allowance."""
+        if isinstance(value, np.ndarray):
+            self.elements += value.size
+            if self.elements > self.max_elements:
+                raise CalculationError(f"calculation produces more than {self.max_elements} series values")
+        return value
+
+def _is_int(value: Value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def _check_int(value: Value) -> Value:
+    if _is_int(value) and value.bit_length() > MAX_INT_BITS:
+        raise CalculationError("result is too large")
+    return value
+
+def _power(base: Value, exponent: Value) -> Value:
+    if isinstance(base, np.ndarray) or isinstance(exponent, np.ndarray):
+        return np.power(np.asarray(base, dtype=float), exponent)
+    if _is_int(exponent) and abs(exponent) > MAX_EXPONENT:
+        raise CalculationError(f"exponent {exponent} is larger than {MAX_EXPONENT}")
+    if _is_int(base) and _is_int(exponent) and exponent > 0 and base.bit_length() * exponent > MAX_INT_BITS:
+        raise CalculationError("result is too large")
+    try:
+        return base ** exponent
+    except OverflowError:
+        raise CalculationError("result is too large")
+
+def _multiply(left: Value, right: Value) -> Value:
+    if _is_int(left) and _is_int(right) and left.bit_length() + right.bit_length() > MAX_INT_BITS:
+        raise CalculationError("result is too large")
+    return left * right
+
+def _series(values) -> np.ndarray:
+    array = np.asarray(values, dtype=float)
+    if array.ndim != 1:
+        raise CalculationError("only flat lists of numbers are supported")
+    if array.size > MAX_SERIES_LENGTH:
+        raise CalculationError(f"series longer than {MAX_SERIES_LENGTH} values")
+    return array
+
+def _aggregate(reduce: Callable[[np.ndarray], Value]) -> Callable[..., Value]:
+    """Reduce a single series, or the arguments themselves: ``sum(range(10))`` or ``max(3, 7, 5)``."""
+    def apply(*args):
+        if not args:
+            raise CalculationError("expected at least one value")
+        values = args[0] if len(args) == 1 and isinstance(args[0], np.ndarray) else args
+        return reduce(_series(values))
+    return apply
+
+def _scalar_or_ufunc(scalar: Callable[..., Value], ufunc: Callable[..., Value]) -> Callable[..., Value]:
+    # Keep exact integer arithmetic for scalars; use NumPy element-wise for series
+    def apply(value, *args):
+        return ufunc(value, *args) if isinstance(value, np.ndarray) else scalar(value, *args)
+    return apply
+
+def _range(*args) -> np.ndarray:
+    start, stop, step = (0, args[0], 1) if len(args) == 1 else (args + (1,))[:3]
+    if step == 0:
+        raise CalculationError("range step cannot be zero")
+    if max(0, math.ceil((stop - start) / step)) > MAX_SERIES_LENGTH:
+        raise CalculationError(f"series longer than {MAX_SERIES_LENGTH} values")
+    return np.arange(start, stop, step, dtype=float)
+
+def _linspace(start: Value, stop: Value, count: Value) -> np.ndarray:
+    if not _is_int(count) or not 0 < count <= MAX_SERIES_LENGTH:
+        raise CalculationError(f"linspace count must be between 1 and {MAX_SERIES_LENGTH}")
+    return np.linspace(start, stop, count)
+
+def _factorial(n: Value) -> int:
+    if not _is_int(n) or not 0 <= n <= MAX_FACTORIAL:
+        raise CalculationError(f"factorial needs a whole number between 0 and {MAX_FACTORIAL}")
+    return math.factorial(n)
+
+def _combinatoric(fn: Callable[[int, int], int]) -> Callable[[Value, Value], int]:
+    def apply(n, k):
+        if not (_is_int(n) and _is_int(k)) or not 0 <= n <= MAX_FACTORIAL:
+            raise CalculationError(f"needs whole numbers with n between 0 and {MAX_FACTORIAL}")
+        return fn(n, k)
+    return apply
+
+def _elementwise(ufunc: Callable[..., Value]) -> Callable[..., Value]:
+    def apply(*args):
+        return ufunc(*(np.asarray(arg, dtype=float) if isinstance(arg, np.ndarray) or _is_int(arg) else arg for arg in args))
+    return apply
+
+BINARY_OPERATORS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: _multiply,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: _power,
+}
+
+UNARY_OPERATORS = {
+    ast.UAdd: operator.pos,
+    ast.USub: operator.neg,
+}
+
+COMPARISONS = {
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+}
+
+# Functions that return a series, so they cannot be items of a list literal
+SERIES_FUNCTIONS = {"range", "linspace", "cumsum", "diff", "sorted"}
+
+CONSTANTS = {"pi": math.pi, "e": math.e, "tau": math.tau, "inf": math.inf}
+
+FUNCTIONS: Dict[str, Callable[..., Value]] = {
+    # Aggregates over a series (or over the arguments)
+    "sum": _aggregate(np.sum),
+    "mean": _aggregate(np.mean),
+    "avg": _aggregate(np.mean),
+    "median": _aggregate(np.median),
+    "std": _aggregate(np.std),
+    "var": _aggregate(np.var),
+    "min": _aggregate(np.min),
+    "max": _aggregate(np.max),
+    "prod": _aggregate(np.prod),
+    "len": _aggregate(len),
+    "count": _aggregate(len),
+    # Series builders and transforms
+    "range": _range,
+    "linspace": _linspace,
+    "cumsum": lambda values: np.cumsum(_series(values)),
+    "diff": lambda values: np.diff(_series(values)),
+    "sorted": lambda values: np.sort(_series(values)),
+    # Element-wise math, on numbers or series
+    "abs": _scalar_or_ufunc(abs, np.abs),
+    "round": _scalar_or_ufunc(round, np.round),
+    "sqrt": _elementwise(np.sqrt),
+    "cbrt": _elementwise(np.cbrt),
+    "exp": _elementwise(np.exp),
+    "log": _elementwise(lambda x, base=None: np.log(x) if base is None else np.log(x) / np.log(base)),
+    "ln": _elementwise(np.log),
+    "log10": _elementwise(np.log10),
+    "log2": _elementwise(np.log2),
+    "sin": _elementwise(np.sin),
+    "cos": _elementwise(np.cos),
+    "tan": _elementwise(np.tan),
+    "asin": _elementwise(np.arcsin),
+    "acos": _elementwise(np.arccos),
+    "atan": _elementwise(np.arctan),
+    "degrees": _elementwise(np.degrees),
+    "radians": _elementwise(np.radians),
+    "floor": _scalar_or_ufunc(math.floor, np.floor),
+    "ceil": _scalar_or_ufunc(math.ceil, np.ceil),
+    # Integer math
+    "factorial": _factorial,
+    "comb": _combinatoric(math.comb),
+    "perm": _combinatoric(math.perm),
+    "gcd": math.gcd,
+}
+
+class _Compiler:
+    """Turns a whitelisted expression AST into a tree of closures."""
+
+    def __init__(self):
+        self.operands = 0
+        self.nodes = 0
+
+    def compile(self, node: ast.AST) -> Compiled:
+        self.nodes += 1
+        if self.nodes > MAX_NODES:
+            raise CalculationError("expression is too complex")
+        handler = getattr(self, f"_{type(node).__name__}", None)
+        if handler is None:
+            raise CalculationError(f"unsupported syntax: {type(node).__name__}")
+        return handler(node)
+
+    def _operand(self):
+        self.operands += 1
+        if self.operands > MAX_OPERANDS:
+            raise CalculationError(f"more than {MAX_OPERANDS} operands")
+
+    def _Expression(self, node: ast.Expression) -> Compiled:
+        return self.compile(node.body)
+
+    def _Constant(self, node: ast.Constant) -> Compiled:
+        if not isinstance(node.value, (int, float)) or isinstance(node.value, bool):
+            raise CalculationError(f"unsupported value: {node.value!r}")
+        self._operand()
+        value = node.value
+        return lambda budget: value
+
+    def _Name(self, node: ast.Name) -> Compiled:
+        if node.id not in CONSTANTS:
+            raise CalculationError(f"unknown name: {node.id}")
+        self._operand()
+        value = CONSTANTS[node.id]
+        return lambda budget: value
+
+    def _BinOp(self, node: ast.BinOp) -> Compiled:
+        op = BINARY_OPERATORS.get(type(node.op))
+        if op is None:
+            raise CalculationError(f"unsupported operator: {type(node.op).__name__}")
+        left, right = self.compile(node.left), self.compile(node.right)
+
+        def evaluate(budget: Budget) -> Value:
+            a, b = left(budget), right(budget)
+            budget.check()
+            return budget.track(_check_int(op(a, b)))
+        return evaluate
+
+    def _UnaryOp(self, node: ast.UnaryOp) -> Compiled:
+        op = UNARY_OPERATORS.get(type(node.op))
+        if op is None:
+            raise CalculationError(f"unsupported operator: {type(node.op).__name__}")
+        operand = self.compile(node.operand)
+        return lambda budget: budget.track(op(operand(budget)))
+
+    def _Compare(self, node: ast.Compare) -> Compiled:
+        if len(node.ops) != 1 or type(node.ops[0]) not in COMPARISONS:
+            raise CalculationError("only single comparisons are supported")
+        op = COMPARISONS[type(node.ops[0])]
+        left, right = self.compile(node.left), self.compile(node.comparators[0])
+        return lambda budget: budget.track(op(left(budget), right(budget)))
+
+    def _List(self, node: ast.List) -> Compiled:
+        for element in node.elts:
+            series_call = isinstance(element, ast.Call) and isinstance(element.func, ast.Name) and element.func.id in SERIES_FUNCTIONS
+            if series_call or isinstance(element, (ast.List, ast.Tuple)):
+                raise CalculationError("list items must be numbers, not series")
+        items = [self.compile(element) for element in node.elts]
+
+        def evaluate(budget: Budget) -> Value:
+            values = []
+            for item in items:
+                value = item(budget)
+                # Series built by arithmetic ("range(9) * 2") are only known once evaluated
+                if isinstance(value, np.ndarray):
+                    raise CalculationError("list items must be numbers, not series")
+                values.append(value)
+            return budget.track(_series(values))
+        return evaluate
+
+    _Tuple = _List
+
+    def _Call(self, node: ast.Call) -> Compiled:
+        if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS:
+            name = node.func.id if isinstance(node.func, ast.Name) else type(node.func).__name__
+            raise CalculationError(f"unknown function: {name}")
+        if node.keywords:
+            raise CalculationError("keyword arguments are not supported")
+        fn = FUNCTIONS[node.func.id]
+        args = [self.compile(arg) for arg in node.args]
+
+        def evaluate(budget: Budget) -> Value:
+            values = [arg(budget) for arg in args]
+            budget.check()
+            try:
+                return budget.track(_check_int(fn(*values)))
+            except TypeError as e:
+                raise CalculationError(f"{node.func.id}: {str(e)}")
+        return evaluate
+
+@lru_cache(maxsize=512)
+def compile_expression(expression: str) -> Compiled:
+    """Parse and validate ``expression`` once; the agent often repeats a calculation."""
+    if len(expression) > MAX_EXPRESSION_LENGTH:
+        raise CalculationError(f"expression longer than {MAX_EXPRESSION_LENGTH} characters")
+    try:
+        tree = ast.parse(expression, mode="eval")
+    except SyntaxError:
+        raise CalculationError(f"could not parse '{expression}'")
+    return _Compiler().compile(tree)
+
+def normalize_expression(query: str) -> str:
+    """Tidy what the agent tends to send: code fences, a trailing '=', '^' for powers."""
+    expression = query.strip().strip("`").strip()
+    if expression.endswith("="):
+        expression = expression[:-1]
+    return expression.replace("^", "**").replace("×", "*").replace("÷", "/")
+
+def evaluate(query: str, time_limit: float = TIME_LIMIT) -> Value:
+    compiled = compile_expression(normalize_expression(query))
+    with np.errstate(all="ignore"):
+        result = compiled(Budget(time_limit))
+    return result.item() if isinstance(result, np.generic) else result
+
+def format_number(value: Value) -> str:
+    if isinstance(value, float):
+        if value.is_integer() and abs(value) < 2**53:
+            return str(int(value))
+        return f"{value:.12g}"
+    return str(value)
+
+def format_result(value: Value) -> str:
+    if isinstance(value, np.ndarray):
+        values = value.tolist()
+        if len(values) <= MAX_SHOWN:
+            return "[" + ", ".join(format_number(v) for v in values) + "]"
+        half = MAX_SHOWN // 2
+        shown = [format_number(v) for v in values[:half]] + ["..."] + [format_number(v) for v in values[-half:]]
+        return "[" + ", ".join(shown) + f"] ({len(values)} values)"
+    return format_number(value)
@@ -0,0 +1,137 @@
+import asyncio
+import json
+import random
+import time
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+import aiohttp
+from cache.response_cache import MemoryBackend
+from utils.logger import setup_logger
+from utils.metrics import metrics
+
+logger = setup_logger("tools.http")
+
+UPSTREAM_SECONDS = metrics.histogram("llmagent_tool_upstream_seconds", "Latency of tool HTTP requests by upstream host and status.", ["host", "status"])
+
+USER_AGENT = 'LLMandAgent/1.0 (https://github.com/donadley/LLMandAgent; info@llmandagent.com) Python/3.9'
+
+# Statuses worth retrying: rate limiting and transient upstream failures
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+class ToolHTTPError(Exception):
+    """Raised when an upstream API answers with a non-success status."""
+
+    def __init__(self, status: int, text: str):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+        self.text = text
+
+class ToolHTTPClient:
+    """Application-lifetime HTTP client shared by all tools.
+
+    One pooled ``aiohttp.ClientSession`` (created lazily on the serving loop)
+    keeps TCP/TLS connections and DNS lookups warm across tool calls. GETs
+    can be cached for a fixed TTL, or revalidated by ETag for documents that
+    rarely change.
+    """
+
+    def __init__(
+        self,
+        limit: int = 100,
+        limit_per_host: int = 10,
+        timeout: float = 10.0,
+        retries: int = 2,
+        backoff: float = 0.5,
+        cache_entries: int = 2048,
+    ):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.cache = MemoryBackend(cache_entries)
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.counts = {"requests": 0, "retries": 0, "cache_hits": 0, "not_modified": 0, "errors": 0}
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.limit, limit_per_host=self.limit_per_host, ttl_dns_cache=300)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=self.timeout,
+                headers={'User-Agent': USER_AGENT, 'Accept': 'application/json'},
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def get_json(
+        self,
+        url: str,
+        params: Optional[Dict[str, str]] = None,
+        headers: Optional[Dict[str, str]] = None,
+        cache_ttl: Optional[float] = None,
+        revalidate: bool = False,
+    ) -> Any:
+        """GET ``url`` and decode JSON, retrying transient failures with jittered backoff.
+
+        With ``cache_ttl`` the decoded body is reused until it expires. With
+        ``revalidate`` the cached body is kept alongside its ETag and each call
+        sends ``If-None-Match``, so unchanged documents cost a 304 only.
+        """
+        key = json.dumps([url, sorted((params or {}).items())])
+        cached = self.cache.get(key) if (cache_ttl or revalidate) else None
+        if cached is not None and not revalidate:
+            self.counts["cache_hits"] += 1
+            return cached
+
+        request_headers = dict(headers or {})
+        if revalidate and cached is not None and cached.get("etag"):
+            request_headers["If-None-Match"] = cached["etag"]
+
+        host = urlsplit(url).hostname or ""
+        for attempt in range(self.retries + 1):
+            self.counts["requests"] += 1
+            started = time.perf_counter()
+            try:
+                async with self.session.get(url, params=params, headers=request_headers) as response:
+                    UPSTREAM_SECONDS.observe(time.perf_counter() - started, host=host, status=response.status)
+                    if response.status == 304 and cached is not None:
+                        self.counts["not_modified"] += 1
+                        return cached["body"]
+                    if response.status in RETRY_STATUSES and attempt < self.retries:
+                        await self._sleep(attempt, response.headers.get("Retry-After"))
+                        continue
+                    if response.status >= 400:
+                        self.counts["errors"] += 1
+                        raise ToolHTTPError(response.status, await response.text())
+                    data = await response.json(content_type=None)
+                    if revalidate:
+                        self.cache.set(key, {"etag": response.headers.get("ETag"), "body": data}, cache_ttl or 86400)
+                    elif cache_ttl:
+                        self.cache.set(key, data, cache_ttl)
+                    return data
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                UPSTREAM_SECONDS.observe(time.perf_counter() - started, host=host, status=type(e).__name__)
+                if attempt >= self.retries:
+                    self.counts["errors"] += 1
+                    raise
+                logger.warning("Retrying %s after %s: %s", url, type(e).__name__, e)
+                await self._sleep(attempt)
+
+    async def _sleep(self, attempt: int, retry_after: Optional[str] = None):
+        self.counts["retries"] += 1
+        delay = self.backoff * (2 ** attempt) * (1 + random.random())
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, float(retry_after))
+        await asyncio.sleep(min(delay, 10.0))
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(self.counts, cached_entries=len(self.cache))
+
+# Shared by every tool; closed on application shutdown
+http_client = ToolHTTPClient()
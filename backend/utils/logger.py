@@ -1,41 +1,177 @@
+import atexit
+import itertools
+import json
 import logging
+import os
+import queue
 import sys
+import threading
+from datetime import datetime, timezone
 from pathlib import Path
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Any, Dict, Optional
+from utils.metrics import current_trace, metrics
 
 # Create logs directory if it doesn't exist
 logs_dir = Path(__file__).parent.parent / "logs"
 logs_dir.mkdir(exist_ok=True)
 
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# "json" writes the console as JSON lines too; the log file is always JSON lines
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+# File under logs/; each worker process of the multi-worker supervisor writes (and rotates) its own
+LOG_FILE = os.getenv("LOG_FILE", "app.log")
+# Records waiting for the writer thread; past this, new records are dropped rather than blocking a request
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# Each DEBUG message template logs its first LOG_SAMPLE_BURST records, then one in LOG_SAMPLE_EVERY
+LOG_SAMPLE_BURST = int(os.getenv("LOG_SAMPLE_BURST", "20"))
+LOG_SAMPLE_EVERY = int(os.getenv("LOG_SAMPLE_EVERY", "100"))
+
+LOG_RECORDS_DROPPED = metrics.counter("llmagent_log_records_dropped_total", "Log records dropped because the log queue was full.")
+
+# Attributes every LogRecord has; anything else was passed via ``extra`` and goes into the JSON line
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "trace_id", "sampled"}
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, trace id and any ``extra`` fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        line: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "trace_id", None):
+            line["trace_id"] = record.trace_id
+        if getattr(record, "sampled", None):
+            line["sampled"] = record.sampled
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                line[key] = value
+        if record.exc_info:
+            line["exc"] = self.formatException(record.exc_info)
+        return json.dumps(line, default=str)
+
+class SamplingFilter(logging.Filter):
+    """Keeps the first ``burst`` records per message template at or below ``level``, then one in ``every``.
+
+    Templates, not formatted messages, are the key, so a hot debug line with
+    changing arguments is sampled as one stream. Kept records past the
+    burst carry ``sampled=every`` so readers can scale counts back up.
+    """
+
+    def __init__(self, level: int = logging.DEBUG, burst: int = LOG_SAMPLE_BURST, every: int = LOG_SAMPLE_EVERY):
+        super().__init__()
+        self.level = level
+        self.burst = burst
+        self.every = max(every, 1)
+        self._counters: Dict[Any, Any] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > self.level:
+            return True
+        key = (record.name, record.msg)
+        counter = self._counters.get(key)
+        if counter is None:
+            counter = self._counters.setdefault(key, itertools.count())
+        seen = next(counter)
+        if seen < self.burst:
+            return True
+        if (seen - self.burst) % self.every:
+            return False
+        record.sampled = self.every
+        return True
+
+class NonBlockingQueueHandler(QueueHandler):
+    """Hands records to the writer thread without formatting them.
+
+    The stock handler formats each message on the calling thread; here the
+    record only gets the current trace id attached, and formatting, JSON
+    encoding and file I/O all happen on the listener thread.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        trace = current_trace.get()
+        record.trace_id = trace.trace_id if trace is not None else None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            if record.levelno >= logging.WARNING:
+                # Warnings and errors are rare and worth a short wait; routine records are not
+                try:
+                    self.queue.put(record, timeout=1.0)
+                    return
+                except queue.Full:
+                    pass
+            LOG_RECORDS_DROPPED.inc()
+
+_lock = threading.Lock()
+_queue_handler: Optional[QueueHandler] = None
+_listener: Optional[QueueListener] = None
+
+def _start_pipeline() -> QueueHandler:
+    global _queue_handler, _listener
+    with _lock:
+        if _queue_handler is not None:
+            return _queue_handler
+
+        text_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
+        console_handler = logging.StreamHandler(sys.stdout)
+        console_handler.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else text_formatter)
+
+        file_handler = RotatingFileHandler(
+            logs_dir / LOG_FILE,
+            maxBytes=10485760,  # 10MB
+            backupCount=5
+        )
+        file_handler.setFormatter(JsonFormatter())
+
+        records: queue.Queue = queue.Queue(LOG_QUEUE_SIZE)
+        handler = NonBlockingQueueHandler(records)
+        handler.addFilter(SamplingFilter())
+        _listener = QueueListener(records, console_handler, file_handler, respect_handler_level=True)
+        _listener.start()
+        # Flush whatever is still queued when the process exits
+        atexit.register(_listener.stop)
+        _queue_handler = handler
+        return handler
+
+def setup_record_logger(name: str, path: Path, max_bytes: int, backup_count: int) -> logging.Logger:
+    """Return a logger that appends bare messages to ``path`` (a JSON lines dataset, say).
+
+    Records go through their own queue and writer thread, like the main
+    pipeline, so callers never touch the file; it rotates at ``max_bytes``.
+    """
+    logger = logging.getLogger(name)
+    with _lock:
+        if logger.handlers:
+            return logger
+        file_handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+        file_handler.setFormatter(logging.Formatter("%(message)s"))
+        records: queue.Queue = queue.Queue(LOG_QUEUE_SIZE)
+        listener = QueueListener(records, file_handler)
+        listener.start()
+        atexit.register(listener.stop)
+        logger.setLevel(logging.INFO)
+        logger.addHandler(NonBlockingQueueHandler(records))
+        logger.propagate = False
+    return logger
+
 # Configure logging
 def setup_logger(name: str) -> logging.Logger:
+    """Return ``name``'s logger, writing through the shared background log pipeline.
+
+    Safe to call any number of times: the handler is attached once, and the
+    logger does not propagate, so nothing is written twice.
+    """
     logger = logging.getLogger(name)
-    logger.setLevel(logging.INFO)
-
-    # Console handler
-    console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setLevel(logging.INFO)
-    console_formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
-    console_handler.setFormatter(console_formatter)
-
-    # File handler
-    file_handler = RotatingFileHandler(
-        logs_dir / f"{name}.log",
-        maxBytes=10485760,  # 10MB
-        backupCount=5
-    )
-    file_handler.setLevel(logging.INFO)
-    file_formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
-    file_handler.setFormatter(file_formatter)
-
-    # Add handlers
-    logger.addHandler(console_handler)
-    logger.addHandler(file_handler)
-
-    return logger
\ No newline at end of file
+    logger.setLevel(LOG_LEVEL)
+    handler = _start_pipeline()
+    if handler not in logger.handlers:
+        logger.addHandler(handler)
+    logger.propagate = False
+    return logger
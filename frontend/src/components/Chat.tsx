@@ -10,17 +10,33 @@ import {
 } from '@chakra-ui/react';
 import { useToaster } from './ui/toaster';
 import { logger } from '../services/logger';
-import axios from 'axios';
 
 interface Message {
   text: string;
   isUser: boolean;
 }
 
+interface StreamEvent {
+  type: string;
+  data: any;
+}
+
+const parseEvent = (raw: string): StreamEvent | null => {
+  let type = 'message';
+  let data = '';
+  for (const line of raw.split('\n')) {
+    if (line.startsWith('event: ')) type = line.slice(7);
+    else if (line.startsWith('data: ')) data += line.slice(6);
+  }
+  return data ? { type, data: JSON.parse(data) } : null;
+};
+
 export const Chat = () => {
   const [messages, setMessages] = useState<Message[]>([]);
   const [input, setInput] = useState('');
   const [isLoading, setIsLoading] = useState(false);
+  // Server-issued conversation id so follow-up messages share memory
+  const [sessionId, setSessionId] = useState<string | null>(null);
   const messagesEndRef = useRef<null | HTMLDivElement>(null);
   const toast = useToaster();
 
@@ -45,14 +61,54 @@ export const Chat = () => {
     setIsLoading(true);
 
     try {
-      const response = await axios.post('http://localhost:8000/api/chat', {
-        text: userMessage,
+      const response = await fetch('http://localhost:8000/api/chat', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ text: userMessage, stream: true, session_id: sessionId }),
       });
+      if (!response.ok || !response.body) {
+        throw new Error(`Server responded with status ${response.status}`);
+      }
 
-      logger.info('Received response from server', { 
-        messageLength: response.data.response.length 
-      });
-      setMessages(prev => [...prev, { text: response.data.response, isUser: false }]);
+      // Add an empty assistant message and fill it in as tokens arrive
+      setMessages(prev => [...prev, { text: '', isUser: false }]);
+      const updateReply = (update: (text: string) => string) => {
+        setMessages(prev => {
+          const next = [...prev];
+          const last = next[next.length - 1];
+          next[next.length - 1] = { ...last, text: update(last.text) };
+          return next;
+        });
+      };
+
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        // SSE events are separated by a blank line
+        const events = buffer.split('\n\n');
+        buffer = events.pop() ?? '';
+        for (const raw of events) {
+          const event = parseEvent(raw);
+          if (!event) continue;
+          if (event.type === 'token') {
+            updateReply(text => text + event.data.text);
+          } else if (event.type === 'done') {
+            logger.info('Received response from server', {
+              messageLength: event.data.response.length,
+              stats: event.data.stats,
+            });
+            updateReply(() => event.data.response);
+            setSessionId(event.data.session_id);
+          } else if (event.type === 'error') {
+            throw new Error(event.data.detail);
+          }
+        }
+      }
     } catch (error) {
       logger.error('Failed to get response from server', { error });
       toast.create({